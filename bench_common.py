@@ -0,0 +1,82 @@
+# --- START OF FILE bench_common.py ---
+import os
+import sys
+import json
+import time
+import logging
+import platform
+import subprocess
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Shared by the bench_*.py scripts: every result is a dict with a unique 'key' (case + stage) plus metric
+# fields, or a 'skipped' reason. Result files from two commits are compared key by key.
+
+
+def _package_version(name):
+    try:
+        from importlib.metadata import version
+        return version(name)
+    except Exception: return None
+
+
+def run_metadata(packages=('numpy', 'pandas')):
+    """Where and on what the numbers were measured, so result files from different commits can be told apart."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except Exception: commit = None
+    return {'commit': commit, 'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+            'platform': platform.platform(), 'processor': platform.processor(), 'cpu_count': os.cpu_count(),
+            'packages': {name: _package_version(name) for name in packages}}
+
+
+def write_results(path, benchmark, results, meta=None):
+    with open(path, 'w') as f:
+        json.dump({'benchmark': benchmark, 'meta': meta or run_metadata(), 'results': results}, f, indent=2)
+    logging.info(f"Wrote {len(results)} results to {os.path.abspath(path)}")
+
+
+def load_results(path):
+    with open(path) as f: return json.load(f)
+
+
+def compare_results(current, baseline, metrics, threshold=0.10, floors=None):
+    """Rows (key, metric, baseline, current, change, regressed) for every key/metric present in both result lists.
+
+    A metric regresses when it grew by more than threshold (relative) and by more than its absolute floor,
+    so noise on sub-millisecond stages does not fail a comparison.
+    """
+    floors = floors or {}
+    base_by_key = {r['key']: r for r in baseline if 'skipped' not in r}
+    rows = []
+    for result in current:
+        base = base_by_key.get(result['key'])
+        if base is None or 'skipped' in result: continue
+        for metric in metrics:
+            old, new = base.get(metric), result.get(metric)
+            if old is None or new is None: continue
+            change = (new - old) / old if old > 0 else 0.0
+            regressed = change > threshold and (new - old) > floors.get(metric, 0.0)
+            rows.append({'key': result['key'], 'metric': metric, 'baseline': old, 'current': new, 'change': change, 'regressed': regressed})
+    return rows
+
+
+def print_comparison(rows, threshold, out=sys.stdout):
+    """Prints the comparison table; returns the number of regressions."""
+    if not rows: print("No comparable results (no common keys).", file=out); return 0
+    width = max(len(r['key']) for r in rows)
+    for r in rows:
+        flag = "REGRESSION" if r['regressed'] else ("faster" if r['change'] < -threshold else "")
+        print(f"{r['key']:<{width}}  {r['metric']:<16} {r['baseline']:>12.4f} -> {r['current']:>12.4f}  {r['change']*100:+7.1f}%  {flag}", file=out)
+    regressions = sum(r['regressed'] for r in rows)
+    print(f"{regressions} regression(s) above {threshold*100:.0f}% out of {len(rows)} comparisons.", file=out)
+    return regressions
+
+
+def percentiles(values, qs=(50, 95, 99)):
+    """{'p50': ..., ...} in the unit of values (nearest-rank on the sorted samples)."""
+    ordered = sorted(values)
+    if not ordered: return {f"p{q}": None for q in qs}
+    return {f"p{q}": ordered[min(len(ordered) - 1, max(0, int(round(q / 100.0 * len(ordered))) - 1))] for q in qs}
+# --- END OF FILE bench_common.py ---
@@ -0,0 +1,163 @@
+# --- START OF FILE bench_data_processing.py ---
+import sys
+import time
+import argparse
+import itertools
+import logging
+import statistics
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+from data_processing import DataProcessor
+from bench_common import run_metadata, write_results, load_results, compare_results, print_comparison
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Size matrix: every combination of teeth x sensors per tooth x duration (s) x sample rate (Hz)
+PRESETS = {
+    'quick': {'teeth': [16], 'sensors': [4, 16], 'durations': [10, 60], 'rates': [10, 50]},
+    'full': {'teeth': [16, 32], 'sensors': [4, 16, 64, 256], 'durations': [10, 60, 600, 3600], 'rates': [10, 50, 200]},
+}
+STAGES = ('clean_data', 'create_force_matrix', 'get_average_force_for_tooth', 'get_all_forces_at_time', 'calculate_cof_trajectory')
+# Rough peak bytes per long-form row (copies + index arrays in clean_data/create_force_matrix) and per float32 matrix cell
+_BYTES_PER_ROW = 240; _BYTES_PER_CELL = 8
+
+
+def synthetic_session(num_teeth, num_sensor_points_per_tooth, duration_s, rate_hz, seed=0):
+    """Deterministic long-form session (timestamp, tooth_id, sensor_point_id, force, contact_time), same shape as simulate_data."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(round(duration_s * rate_hz))) / float(rate_hz)
+    tooth_ids = np.arange(1, num_teeth + 1)
+    shape = (len(t), num_teeth, num_sensor_points_per_tooth)
+    base = rng.uniform(5, 60, shape[:2]) * (0.8 + 0.4 * np.sin(t[:, None] * 0.5 + tooth_ids[None, :] * 0.3))
+    force = np.clip(base[:, :, None] * rng.uniform(0.7, 1.3, shape) + rng.uniform(-10, 10, shape), 0, 100)
+    return pd.DataFrame({
+        'timestamp': np.repeat(t, num_teeth * num_sensor_points_per_tooth),
+        'tooth_id': np.tile(np.repeat(tooth_ids, num_sensor_points_per_tooth), len(t)),
+        'sensor_point_id': np.tile(np.arange(1, num_sensor_points_per_tooth + 1), len(t) * num_teeth),
+        'force': force.ravel(), 'contact_time': rng.uniform(0.01, 0.05, shape).ravel()})
+
+
+def synthetic_cell_layout(tooth_ids):
+    """tooth_cell_definitions-shaped layout (cells on a U-shaped arch) for calculate_cof_trajectory."""
+    angles = np.linspace(np.pi * 0.95, np.pi * 0.05, len(tooth_ids))
+    return {i: {'actual_id': tid, 'center': (float(np.cos(a) * 8.0), float(np.sin(a) * 6.0)), 'width': 1.0, 'height': 1.2}
+            for i, (tid, a) in enumerate(zip(tooth_ids, angles))}
+
+
+def estimate_peak_mb(num_rows, num_timestamps, num_pairs):
+    return (num_rows * _BYTES_PER_ROW + num_timestamps * num_pairs * _BYTES_PER_CELL) / 1e6
+
+
+def _measure(fn, trace_memory):
+    if trace_memory: tracemalloc.reset_peak(); start_bytes = tracemalloc.get_traced_memory()[0]
+    t0 = time.perf_counter(); fn(); seconds = time.perf_counter() - t0
+    return seconds, (tracemalloc.get_traced_memory()[1] - start_bytes if trace_memory else None)
+
+
+def run_stages(data, layout, num_sensor_points_per_tooth, lookup_times, skip=(), trace_memory=False):
+    """One pass over STAGES on a fresh DataProcessor; {stage: (seconds, peak bytes above the stage start or None)}."""
+    processor = DataProcessor(data)
+    def average_all_teeth():
+        for tid in processor.tooth_ids: processor.get_average_force_for_tooth(tid)
+    def lookups():
+        for ts in lookup_times: processor.get_all_forces_at_time(ts)
+    stage_fns = {'clean_data': processor.clean_data, 'create_force_matrix': processor.create_force_matrix,
+                 'get_average_force_for_tooth': average_all_teeth, 'get_all_forces_at_time': lookups,
+                 'calculate_cof_trajectory': lambda: processor.calculate_cof_trajectory(layout, num_sensor_points_per_tooth)}
+    return {stage: _measure(stage_fns[stage], trace_memory) for stage in STAGES if stage not in skip}
+
+
+def case_key(case):
+    return f"{case['teeth']}t_{case['sensors']}s_{case['duration_s']:g}s_{case['rate_hz']:g}hz"
+
+
+def run_case(case, repeat=3, seed=0, trace_memory=True, num_lookups=1000, cof_max_cells=5e6):
+    """Times every stage `repeat` times (min/median) plus one tracemalloc pass for peak memory; returns result dicts."""
+    t0 = time.perf_counter()
+    data = synthetic_session(case['teeth'], case['sensors'], case['duration_s'], case['rate_hz'], seed)
+    case = dict(case, rows=len(data), generate_seconds=time.perf_counter() - t0)
+    num_timestamps = int(round(case['duration_s'] * case['rate_hz'])); num_pairs = case['teeth'] * case['sensors']
+    layout = synthetic_cell_layout(list(range(1, case['teeth'] + 1)))
+    lookup_times = np.random.default_rng(seed + 1).uniform(0, case['duration_s'], num_lookups)
+    skip = {}
+    if num_timestamps * num_pairs > cof_max_cells: skip['calculate_cof_trajectory'] = f"{num_timestamps * num_pairs:.0f} cells > cof_max_cells"
+
+    runs = [run_stages(data, layout, case['sensors'], lookup_times, skip) for _ in range(repeat)]
+    memory = {}
+    if trace_memory:
+        tracemalloc.start()
+        try: memory = run_stages(data, layout, case['sensors'], lookup_times, skip, trace_memory=True)
+        finally: tracemalloc.stop()
+
+    calls = {'get_average_force_for_tooth': case['teeth'], 'get_all_forces_at_time': num_lookups}
+    results = []
+    for stage in STAGES:
+        key = f"{case_key(case)}/{stage}"
+        if stage in skip: results.append({'key': key, 'case': case, 'stage': stage, 'skipped': skip[stage]}); continue
+        seconds = [run[stage][0] for run in runs]
+        result = {'key': key, 'case': case, 'stage': stage, 'repeat': repeat,
+                  'seconds_min': min(seconds), 'seconds_median': statistics.median(seconds),
+                  'peak_mb': memory[stage][1] / 1e6 if stage in memory else None}
+        if stage in calls: result['calls'] = calls[stage]; result['us_per_call'] = result['seconds_median'] / calls[stage] * 1e6
+        results.append(result)
+    return results
+
+
+def build_cases(teeth, sensors, durations, rates):
+    return [{'teeth': t, 'sensors': s, 'duration_s': float(d), 'rate_hz': float(r)}
+            for t, s, d, r in itertools.product(teeth, sensors, durations, rates)]
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Benchmark DataProcessor stages on deterministic synthetic sessions.")
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='quick', help="Size matrix to run (overridden per axis below).")
+    parser.add_argument('--teeth', type=int, nargs='+', default=None, help="Teeth counts.")
+    parser.add_argument('--sensors', type=int, nargs='+', default=None, help="Sensor points per tooth.")
+    parser.add_argument('--durations', type=float, nargs='+', default=None, help="Session durations (s).")
+    parser.add_argument('--rates', type=float, nargs='+', default=None, help="Sample rates (Hz).")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed passes per case (min and median are reported).")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the synthetic data.")
+    parser.add_argument('--lookups', type=int, default=1000, help="get_all_forces_at_time calls per pass.")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the tracemalloc pass (peak_mb is then null).")
+    parser.add_argument('--max-memory-mb', type=float, default=4096.0, help="Skip cases whose estimated peak exceeds this.")
+    parser.add_argument('--cof-max-cells', type=float, default=5e6, help="Skip calculate_cof_trajectory above timestamps x sensors.")
+    parser.add_argument('-o', '--output', default="bench_data_processing.json", help="Result file (JSON).")
+    parser.add_argument('--compare', default=None, help="Baseline result file to compare against.")
+    parser.add_argument('--threshold', type=float, default=0.10, help="Relative increase counted as a regression.")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    logging.getLogger().setLevel(logging.WARNING) # DataProcessor logs every call
+    preset = PRESETS[args.preset]
+    cases = build_cases(args.teeth or preset['teeth'], args.sensors or preset['sensors'],
+                        args.durations or preset['durations'], args.rates or preset['rates'])
+    results = []
+    for i, case in enumerate(cases, 1):
+        num_timestamps = int(round(case['duration_s'] * case['rate_hz'])); num_pairs = case['teeth'] * case['sensors']
+        estimate = estimate_peak_mb(num_timestamps * num_pairs, num_timestamps, num_pairs)
+        if estimate > args.max_memory_mb:
+            print(f"[{i}/{len(cases)}] {case_key(case)}: skipped (estimated {estimate:.0f} MB > {args.max_memory_mb:.0f} MB)")
+            results.extend({'key': f"{case_key(case)}/{stage}", 'case': case, 'stage': stage,
+                            'skipped': f"estimated peak {estimate:.0f} MB > max_memory_mb"} for stage in STAGES)
+            continue
+        case_results = run_case(case, args.repeat, args.seed, not args.no_memory, args.lookups, args.cof_max_cells)
+        results.extend(case_results)
+        summary = ", ".join(f"{r['stage']} {r['seconds_median']*1000:.1f} ms" for r in case_results if 'skipped' not in r)
+        print(f"[{i}/{len(cases)}] {case_key(case)} ({case_results[0]['case']['rows']} rows): {summary}")
+    meta = run_metadata(); meta.update(preset=args.preset, repeat=args.repeat, seed=args.seed)
+    write_results(args.output, 'data_processing', results, meta)
+
+    if args.compare:
+        rows = compare_results(results, load_results(args.compare)['results'], ('seconds_median', 'peak_mb'),
+                               args.threshold, floors={'seconds_median': 0.002, 'peak_mb': 1.0})
+        return 1 if print_comparison(rows, args.threshold) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+# --- END OF FILE bench_data_processing.py ---
@@ -0,0 +1,148 @@
+# --- START OF FILE bench_render.py ---
+import sys
+import gc
+import time
+import argparse
+import logging
+import statistics
+import tracemalloc
+import numpy as np
+
+from bench_common import run_metadata, write_results, load_results, compare_results, print_comparison, percentiles
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Runs headless: vedo renders offscreen and the graph uses a plain Agg canvas (no Qt). On machines without
+# a display or GPU, use a VTK build with OSMesa/EGL offscreen support, or run under xvfb-run.
+
+
+def actor_counts(plotter):
+    """(3D actors, 2D actors) per renderer of the plotter."""
+    return [(r.GetActors().GetNumberOfItems(), r.GetActors2D().GetNumberOfItems()) for r in plotter.renderers]
+
+
+def build_targets(exporter):
+    """{name: fn(timestamp)} for each measured path; '+render' / '+blit' variants include the draw itself."""
+    from video_export import compose_video_frame
+    plotter, grid, bar, graph = exporter.plotter, exporter.grid_visualizer, exporter.bar_visualizer, exporter.graph_visualizer
+    ids = exporter.graph_tooth_ids
+    canvas = np.empty((exporter.canvas_height, exporter.canvas_width, 3), dtype=np.uint8)
+    captured = {}
+    def grid_update(ts): plotter.at(0); grid.render_arch(ts)
+    def bar_update(ts): plotter.at(1); bar.render_display(ts)
+    def graph_update(ts): graph.update_graph_to_timestamp(ts, ids); graph.update_time_indicator(ts)
+    def vedo_screenshot(ts): captured['vedo'] = plotter.screenshot(asarray=True)
+    def graph_capture(ts): captured['graph'] = graph.get_frame_as_array(ts, ids)
+    def compose(ts):
+        if 'vedo' not in captured: vedo_screenshot(ts); graph_capture(ts)
+        compose_video_frame(captured['vedo'], captured['graph'], canvas, exporter.canvas_width, exporter.canvas_height)
+    return {
+        'grid.render_arch': grid_update,
+        'grid.render_arch+render': lambda ts: (grid_update(ts), plotter.render()),
+        'bar.render_display': bar_update,
+        'bar.render_display+render': lambda ts: (bar_update(ts), plotter.render()),
+        'graph.update_graph_to_timestamp': graph_update,
+        'graph.update_graph_to_timestamp+blit': lambda ts: (graph_update(ts), graph.blit_frame()),
+        'capture.vedo_screenshot': vedo_screenshot,
+        'capture.graph_frame': graph_capture,
+        'capture.compose': compose,
+        'frame.full': exporter.render_frame, # Everything the exporter does per video frame
+    }
+
+
+def run_target(fn, timestamps, warmup=10, trace_memory=True):
+    """Per-frame wall times (s) over timestamps after `warmup` untimed frames, plus allocation figures."""
+    for ts in timestamps[:warmup]: fn(ts)
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    times = []
+    for ts in timestamps:
+        t0 = time.perf_counter(); fn(ts); times.append(time.perf_counter() - t0)
+    net_blocks = sys.getallocatedblocks() - blocks_before
+    alloc_peaks = []
+    if trace_memory: # Separate pass: tracemalloc slows Python code down, so it never overlaps the timed loop
+        tracemalloc.start()
+        try:
+            for ts in timestamps:
+                tracemalloc.reset_peak(); start_bytes = tracemalloc.get_traced_memory()[0]
+                fn(ts); alloc_peaks.append(tracemalloc.get_traced_memory()[1] - start_bytes)
+        finally: tracemalloc.stop()
+    return times, net_blocks / max(1, len(timestamps)), alloc_peaks
+
+
+def run_benchmark(processor, frames=200, warmup=10, width=1920, height=1080, graph_tooth_ids=None, trace_memory=True, targets=None):
+    """Results (one per target) for playing `frames` timestamps spread over the whole session."""
+    from video_export import OffscreenVideoExporter
+    exporter = OffscreenVideoExporter(processor, graph_tooth_ids=graph_tooth_ids, canvas_width=width, canvas_height=height)
+    try:
+        ts_all = processor.timestamps_array
+        timestamps = ts_all[np.linspace(0, len(ts_all) - 1, frames).astype(int)]
+        case = {'teeth': len(processor.tooth_ids), 'sensors': len(processor.ordered_tooth_sensor_pairs), 'samples': len(ts_all),
+                'frames': frames, 'size': f"{width}x{height}", 'graph_teeth': len(exporter.graph_tooth_ids)}
+        case_key = f"{case['teeth']}t_{case['sensors']}s_{case['samples']}n_{case['size']}"
+        results = []
+        for name, fn in build_targets(exporter).items():
+            if targets and name not in targets: continue
+            actors_before = actor_counts(exporter.plotter)
+            times, blocks_per_frame, alloc_peaks = run_target(fn, timestamps, warmup, trace_memory)
+            actors_after = actor_counts(exporter.plotter)
+            ms = [t * 1000.0 for t in times]
+            result = {'key': f"{case_key}/{name}", 'case': case, 'target': name,
+                      **{f"{k}_ms": v for k, v in percentiles(ms).items()},
+                      'mean_ms': statistics.fmean(ms), 'max_ms': max(ms), 'fps': 1000.0 / statistics.fmean(ms),
+                      'py_blocks_per_frame': blocks_per_frame,
+                      'alloc_kb_per_frame': statistics.median(alloc_peaks) / 1024.0 if alloc_peaks else None,
+                      'actors_before': actors_before, 'actors_after': actors_after,
+                      'actor_growth': sum(map(sum, actors_after)) - sum(map(sum, actors_before))}
+            results.append(result)
+            print(f"{name:<40} p50 {result['p50_ms']:7.2f}  p95 {result['p95_ms']:7.2f}  p99 {result['p99_ms']:7.2f} ms  "
+                  f"{result['fps']:7.1f} fps  actors {sum(map(sum, actors_after))} ({result['actor_growth']:+d})  "
+                  f"blocks/frame {blocks_per_frame:+.1f}")
+        return results
+    finally:
+        exporter.close()
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Offscreen per-frame benchmark of the grid, 3D bar and graph views and the video capture paths.")
+    parser.add_argument('--frames', type=int, default=200, help="Timed frames per target.")
+    parser.add_argument('--warmup', type=int, default=10, help="Untimed frames before each target.")
+    parser.add_argument('--teeth', type=int, default=16, help="Teeth in the synthetic session.")
+    parser.add_argument('--sensors', type=int, default=4, help="Sensor points per tooth.")
+    parser.add_argument('--duration', type=float, default=60.0, help="Synthetic session length (s).")
+    parser.add_argument('--rate', type=float, default=10.0, help="Synthetic sample rate (Hz).")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the synthetic data.")
+    parser.add_argument('--size', default="1920x1080", help="Composite video size WxH.")
+    parser.add_argument('--graph-teeth', type=int, nargs='*', default=None, help="Tooth ids on the graph (default: first two).")
+    parser.add_argument('--targets', nargs='*', default=None, help="Only run these targets (e.g. grid.render_arch frame.full).")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the tracemalloc pass.")
+    parser.add_argument('-o', '--output', default="bench_render.json", help="Result file (JSON).")
+    parser.add_argument('--compare', default=None, help="Baseline result file to compare against.")
+    parser.add_argument('--threshold', type=float, default=0.15, help="Relative increase counted as a regression.")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    import matplotlib; matplotlib.use('Agg') # No Qt/display for the graph
+    from data_processing import DataProcessor
+    from bench_data_processing import synthetic_session
+    logging.getLogger().setLevel(logging.WARNING) # The visualizers log per frame at INFO/DEBUG
+    width, height = (int(v) for v in args.size.lower().split('x'))
+    processor = DataProcessor(synthetic_session(args.teeth, args.sensors, args.duration, args.rate, args.seed))
+    processor.create_force_matrix()
+    if not processor.timestamps: print("No timestamps in the synthetic session."); return 1
+    results = run_benchmark(processor, args.frames, args.warmup, width, height, args.graph_teeth, not args.no_memory, args.targets)
+    meta = run_metadata(packages=('numpy', 'vtk', 'vedo', 'matplotlib', 'opencv-python'))
+    meta.update(seed=args.seed, duration_s=args.duration, rate_hz=args.rate)
+    write_results(args.output, 'render', results, meta)
+    if args.compare:
+        rows = compare_results(results, load_results(args.compare)['results'], ('p50_ms', 'p95_ms'),
+                               args.threshold, floors={'p50_ms': 0.2, 'p95_ms': 0.5})
+        return 1 if print_comparison(rows, args.threshold) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+# --- END OF FILE bench_render.py ---
@@ -0,0 +1,216 @@
+# --- START OF FILE cached_text_labels.py ---
+import numpy as np
+import logging
+from vedo import Text3D, Mesh
+import vtk
+from vtk.util.numpy_support import vtk_to_numpy, numpy_to_vtk, numpy_to_vtkIdTypeArray
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+PERCENT_LABEL_CHARSET = "0123456789.%-"
+_glyph_caches = {} # charset -> GlyphCache, shared by every visualizer in the process
+_NO_KEY = np.iinfo(np.int64).min # CachedLabelSet: label not set through set_values
+_numeric_tables = {} # (charset, max_chars, fmt, min_value, max_value, step, max_entries) -> NumericLabelTable
+
+
+def get_glyph_cache(charset=PERCENT_LABEL_CHARSET):
+    """Returns the shared GlyphCache for charset, triangulating the glyphs on first use only."""
+    if charset not in _glyph_caches: _glyph_caches[charset] = GlyphCache(charset)
+    return _glyph_caches[charset]
+
+
+class GlyphCache:
+    """Flat, triangulated Text3D geometry for a fixed character set at unit size."""
+    def __init__(self, charset, hspacing=1.15):
+        self.charset = charset
+        self.glyphs = {} # char -> (points (n,3), triangles (m,3), advance)
+        for ch in charset:
+            glyph = Text3D(ch, pos=(0,0,0), s=1.0, justify='bottom-left', depth=0).triangulate()
+            pts = np.asarray(glyph.vertices, dtype=float).reshape(-1, 3)
+            tris = np.asarray([c for c in glyph.cells if len(c) == 3], dtype=np.int32).reshape(-1, 3)
+            advance = (pts[:,0].max() if len(pts) else 0.3) * hspacing
+            self.glyphs[ch] = (pts, tris, max(advance, 0.15))
+        all_pts = [g[0] for g in self.glyphs.values() if len(g[0])]
+        y_all = np.concatenate([p[:,1] for p in all_pts]) if all_pts else np.array([0.0, 1.0])
+        self.v_center = (y_all.min() + y_all.max()) / 2.0 # Vertical centre of the charset, used for 'cc' justification
+        self.max_glyph_points = max((len(g[0]) for g in self.glyphs.values()), default=0)
+        self.max_glyph_triangles = max((len(g[1]) for g in self.glyphs.values()), default=0)
+        logging.info(f"GlyphCache: {len(self.glyphs)} glyphs triangulated for charset '{charset}'.")
+
+    def text_width(self, txt, size=1.0):
+        return sum(self.glyphs[ch][2] for ch in txt if ch in self.glyphs) * size
+
+
+class NumericLabelTable:
+    """Slot-padded glyph geometry (unit size, centred) of fmt.format(v), v snapped to step and clipped to [min_value, max_value].
+
+    A string's geometry (float32 points, int32 triangles) is built the first time a label shows it and kept in a small
+    LRU of max_entries strings, so memory follows the strings on screen rather than the value range. CachedLabelSet.set_values
+    copies the entries of all changed labels at once, so updating N numeric labels is a handful of numpy operations.
+    """
+    def __init__(self, glyph_cache, max_chars, fmt="{:.1f}%", max_value=100.0, step=0.1, min_value=0.0, max_entries=256):
+        self.glyph_cache = glyph_cache; self.max_chars = max_chars; self.fmt = fmt; self.step = step; self.max_entries = max_entries
+        self.min_key = int(round(min_value / step)); self.max_key = int(round(max_value / step))
+        self.slot_points = max_chars * glyph_cache.max_glyph_points; self.slot_triangles = max_chars * glyph_cache.max_glyph_triangles
+        self._entries = {} # key -> (string, points (slot_points, 2), triangles (slot_triangles, 3), width), oldest first
+
+    def keys(self, values):
+        """Integer key of every value (value / step, rounded and clipped); equal keys show the same string."""
+        return np.clip(np.rint(np.asarray(values, dtype=float) / self.step), self.min_key, self.max_key).astype(np.int64)
+
+    def entry(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            if len(self._entries) >= self.max_entries: del self._entries[next(iter(self._entries))]
+            entry = self._build(self.fmt.format(round(key * self.step, 9) + 0.0)[:self.max_chars]) # + 0.0 turns -0.0 into 0.0
+        self._entries[key] = entry # Most recently used last
+        return entry
+
+    def _build(self, txt):
+        gc = self.glyph_cache
+        points = np.zeros((self.slot_points, 2), dtype=np.float32)
+        triangles = np.zeros((self.slot_triangles, 3), dtype=np.int32) # Relative to the slot, 0-padded (degenerate)
+        width = gc.text_width(txt); pen_x = -width / 2.0; n_pts = n_tris = 0
+        for ch in txt:
+            glyph = gc.glyphs.get(ch)
+            if glyph is None: continue
+            g_pts, g_tris, advance = glyph
+            points[n_pts:n_pts+len(g_pts), 0] = pen_x + g_pts[:,0]
+            points[n_pts:n_pts+len(g_pts), 1] = g_pts[:,1] - gc.v_center
+            triangles[n_tris:n_tris+len(g_tris)] = g_tris + n_pts
+            n_pts += len(g_pts); n_tris += len(g_tris); pen_x += advance
+        return txt, points, triangles, width
+
+
+def get_numeric_table(glyph_cache, max_chars, fmt="{:.1f}%", max_value=100.0, step=0.1, min_value=0.0, max_entries=256):
+    key = (glyph_cache.charset, max_chars, fmt, min_value, max_value, step, max_entries)
+    if key not in _numeric_tables: _numeric_tables[key] = NumericLabelTable(glyph_cache, max_chars, fmt, max_value, step, min_value, max_entries)
+    return _numeric_tables[key]
+
+
+def _fixed_triangle_mesh(n_points, n_triangles, c, alpha):
+    """Mesh with preallocated point/triangle buffers; returns (mesh, points view, connectivity view)."""
+    poly = vtk.vtkPolyData()
+    vtk_pts = vtk.vtkPoints(); vtk_pts.SetData(numpy_to_vtk(np.zeros((max(n_points,1),3)), deep=True)); poly.SetPoints(vtk_pts)
+    cells = vtk.vtkCellArray()
+    cells.SetData(numpy_to_vtkIdTypeArray(np.arange(0, 3*n_triangles+1, 3, dtype=np.int64), deep=True),
+                  numpy_to_vtkIdTypeArray(np.zeros(3*n_triangles, dtype=np.int64), deep=True)) # All degenerate until written
+    poly.SetPolys(cells)
+    mesh = Mesh(poly, c=c, alpha=alpha).lighting('off')
+    mesh.actor.PickableOff() # Labels never intercept clicks meant for the shapes underneath
+    # Views are taken from whatever arrays VTK ended up holding, so writes always land in the rendered buffers
+    pts_view = vtk_to_numpy(mesh.dataset.GetPoints().GetData())
+    conn_view = vtk_to_numpy(mesh.dataset.GetPolys().GetConnectivityArray()).reshape(-1, 3)
+    return mesh, pts_view, conn_view
+
+
+def _mark_modified(mesh):
+    poly = mesh.dataset
+    poly.GetPoints().GetData().Modified(); poly.GetPoints().Modified()
+    poly.GetPolys().GetConnectivityArray().Modified(); poly.GetPolys().Modified(); poly.Modified()
+
+
+class CachedLabelSet:
+    """Many short centred labels drawn by one actor (plus one optional background actor).
+
+    Each label owns a fixed slice of a shared point/triangle buffer. set_label copies the cached glyph
+    geometry of the new string into that slice, so an update is a few small array writes, never a
+    triangulation. Unused triangles in a slice are degenerate and draw nothing.
+    """
+    def __init__(self, positions, sizes, c='k', alpha=1.0, max_chars=6, glyph_cache=None,
+                 background_color=None, background_alpha=0.75, background_min_sizes=None, background_pad=0.3):
+        self.glyph_cache = glyph_cache or get_glyph_cache()
+        self.positions = np.array(positions, dtype=float).reshape(-1, 3)
+        self.sizes = np.broadcast_to(np.asarray(sizes, dtype=float), (len(self.positions),)).copy()
+        self.max_chars = max_chars
+        self.texts = np.full(len(self.positions), None, dtype=object)
+        self._value_keys = np.full(len(self.positions), _NO_KEY, dtype=np.int64) # NumericLabelTable key shown by each label
+        self.widths = np.zeros(len(self.positions)) # Measured text width of each label in world units
+        self._slot_points = max_chars * self.glyph_cache.max_glyph_points
+        self._slot_triangles = max_chars * self.glyph_cache.max_glyph_triangles
+        self.text_mesh, self._pts, self._tris = _fixed_triangle_mesh(
+            len(self.positions) * self._slot_points, len(self.positions) * self._slot_triangles, c, alpha)
+
+        self.background_mesh = None
+        if background_color is not None: # One quad (2 triangles) per label, resized to the measured text width
+            self.background_mesh, self._bg_pts, bg_tris = _fixed_triangle_mesh(4*len(self.positions), 2*len(self.positions), background_color, background_alpha)
+            quad_base = 4 * np.arange(len(self.positions), dtype=np.int64)[:, None]
+            bg_tris[0::2] = quad_base + np.array([0, 1, 2]); bg_tris[1::2] = quad_base + np.array([0, 2, 3])
+            self.background_min_sizes = np.array(background_min_sizes if background_min_sizes is not None else [(0.0, 0.0)]*len(self.positions), dtype=float)
+            self.background_pad = background_pad
+            _mark_modified(self.background_mesh)
+
+    @property
+    def actors(self):
+        """vedo objects to add to a renderer (background first so it draws under the text)."""
+        return [m for m in (self.background_mesh, self.text_mesh) if m is not None]
+
+    def set_label(self, idx, txt, pos=None):
+        """Sets label idx to txt (and optionally moves it). Returns False when nothing changed."""
+        moved = pos is not None and not np.allclose(self.positions[idx], pos)
+        if txt == self.texts[idx] and not moved: return False
+        if moved: self.positions[idx] = pos
+        self._write_label(idx, txt or "")
+        self.texts[idx] = txt; self._value_keys[idx] = _NO_KEY
+        _mark_modified(self.text_mesh)
+        if self.background_mesh is not None: _mark_modified(self.background_mesh)
+        return True
+
+    def set_values(self, values, table):
+        """Vectorized set_label for numeric labels: label i shows the table string nearest values[i].
+
+        Only labels whose string changed are rewritten; returns False when none did.
+        """
+        keys = table.keys(values)
+        changed = np.flatnonzero(keys != self._value_keys)
+        if len(changed) == 0: return False
+        self._value_keys[changed] = keys[changed]
+        txts, points, triangles, widths = zip(*[table.entry(k) for k in keys[changed].tolist()])
+        self.texts[changed] = txts; points = np.stack(points)
+        n = len(self.positions); size = self.sizes[changed]; cx, cy, cz = self.positions[changed].T
+        pts = self._pts.reshape(n, self._slot_points, 3)
+        pts[changed, :, 0] = cx[:, None] + points[:, :, 0] * size[:, None]
+        pts[changed, :, 1] = cy[:, None] + points[:, :, 1] * size[:, None]
+        pts[changed, :, 2] = cz[:, None]
+        # int32 slot-relative triangles become vtkIdType here
+        self._tris.reshape(n, self._slot_triangles, 3)[changed] = np.stack(triangles) + (changed * self._slot_points)[:, None, None]
+        self.widths[changed] = width = np.array(widths) * size
+        _mark_modified(self.text_mesh)
+        if self.background_mesh is not None:
+            min_w, min_h = self.background_min_sizes[changed].T
+            half_w = np.maximum(min_w, width + self.background_pad * size) / 2.0; half_h = np.maximum(min_h, size) / 2.0
+            bg = self._bg_pts.reshape(n, 4, 3) # Corner order as in _write_label: BL, BR, TR, TL
+            bg[changed, :, 0] = cx[:, None] + half_w[:, None] * np.array([-1, 1, 1, -1])
+            bg[changed, :, 1] = cy[:, None] + half_h[:, None] * np.array([-1, -1, 1, 1])
+            bg[changed, :, 2] = (cz - 0.02)[:, None]
+            _mark_modified(self.background_mesh)
+        return True
+
+    def _write_label(self, idx, txt):
+        size = self.sizes[idx]; cx, cy, cz = self.positions[idx]
+        pt_base = idx * self._slot_points
+        pts = self._pts[pt_base:pt_base + self._slot_points]
+        tris = self._tris[idx * self._slot_triangles:(idx + 1) * self._slot_triangles]
+        tris[:] = pt_base # Degenerate unless overwritten below
+        txt = txt[:self.max_chars]
+        width = self.glyph_cache.text_width(txt, size)
+        pen_x = cx - width / 2.0; y0 = cy - self.glyph_cache.v_center * size
+        n_pts = n_tris = 0
+        for ch in txt:
+            glyph = self.glyph_cache.glyphs.get(ch)
+            if glyph is None: continue
+            g_pts, g_tris, advance = glyph
+            pts[n_pts:n_pts+len(g_pts), 0] = pen_x + g_pts[:,0] * size
+            pts[n_pts:n_pts+len(g_pts), 1] = y0 + g_pts[:,1] * size
+            pts[n_pts:n_pts+len(g_pts), 2] = cz
+            tris[n_tris:n_tris+len(g_tris)] = g_tris + (pt_base + n_pts)
+            n_pts += len(g_pts); n_tris += len(g_tris); pen_x += advance * size
+        self.widths[idx] = width
+        if self.background_mesh is not None:
+            min_w, min_h = self.background_min_sizes[idx]
+            half_w = max(min_w, width + self.background_pad * size) / 2.0 if txt else 0.0
+            half_h = max(min_h, size) / 2.0 if txt else 0.0
+            bz = cz - 0.02
+            self._bg_pts[4*idx:4*idx+4] = [(cx-half_w, cy-half_h, bz), (cx+half_w, cy-half_h, bz),
+                                           (cx+half_w, cy+half_h, bz), (cx-half_w, cy+half_h, bz)]
+# --- END OF FILE cached_text_labels.py ---
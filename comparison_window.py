@@ -0,0 +1,208 @@
+# --- START OF FILE comparison_window.py ---
+import time
+import sys
+import logging
+import argparse
+
+from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel
+from PyQt5.QtCore import QTimer, Qt
+
+from playback import PlaybackClock
+from perf_instrumentation import PERF
+from main_qt_app import PlaybackWindowMixin, StartupTimer, _preload_view_modules
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Side-by-side comparison of two sessions (e.g. before and after an occlusal adjustment), aligned on bite onset:
+#   row 0: grid A | grid B | difference grid (B - A)     row 1: bars A | bars B | summary
+# Both sessions live in one SessionPairCache; every frame of the pair is one FrameStateProducer item.
+
+
+def load_session_pair(progress, timings, csv_a=None, csv_b=None, labels=('Pre', 'Post'), duration=10, num_teeth=16,
+                      num_sensor_points_per_tooth=4, display_numbering=None):
+    """Worker-thread loader: two recorded sessions (CSV files, or two simulated ones) -> SessionPairCache."""
+    t = time.perf_counter()
+    progress(5, "Loading libraries...")
+    import pandas as pd
+    from data_acquisition import SensorDataReader
+    from data_processing import DataProcessor
+    from session_comparison import SessionPairCache
+    _preload_view_modules()
+    timings['heavy imports'] = time.perf_counter() - t; t = time.perf_counter()
+    processors = []
+    for i, csv_path in enumerate((csv_a, csv_b)):
+        progress(20 + 30*i, f"Loading session {labels[i]}...")
+        if csv_path: data = pd.read_csv(csv_path)
+        else: data = SensorDataReader().simulate_data(duration=duration, num_teeth=num_teeth, num_sensor_points_per_tooth=num_sensor_points_per_tooth)
+        processor = DataProcessor(data); processor.display_numbering = display_numbering; processor.create_force_matrix()
+        processors.append(processor)
+    timings['data'] = time.perf_counter() - t; t = time.perf_counter()
+    progress(80, "Aligning sessions...")
+    cache = SessionPairCache(*processors, labels=labels) # Also resamples both tooth average series for the graph
+    timings['processing'] = time.perf_counter() - t
+    progress(90, "Building views...")
+    return cache
+
+
+class ComparisonMultiViewWidget(QWidget):
+    """One vedo Plotter (2 x 3 renderers) showing both sessions and their difference; a frame is a single Render()."""
+    def __init__(self, cache, parent_main_window):
+        super().__init__(parent_main_window)
+        from vedo import Text2D
+        from qt_views import VedoQtCanvas
+        from dental_arch_grid_visualization_qt import DentalArchGridVisualizerQt, DifferenceGridVisualizerQt
+        from dental_arch_3d_bar_visualization_qt import DentalArch3DBarVisualizerQt
+        self.cache = cache
+        layout = QVBoxLayout(self); layout.setContentsMargins(0,0,0,0)
+        self.vedo_canvas = VedoQtCanvas(self); layout.addWidget(self.vedo_canvas)
+        self.main_plotter = self.vedo_canvas.GetPlotter(shape=(2,3), sharecam=False, title="Session Comparison")
+        self.grid_a = DentalArchGridVisualizerQt(cache.a, self.main_plotter, 0)
+        self.grid_b = DentalArchGridVisualizerQt(cache.b, self.main_plotter, 1)
+        self.grid_diff = DifferenceGridVisualizerQt(cache.a, self.main_plotter, 2)
+        self.bar_a = DentalArch3DBarVisualizerQt(cache.a, self.main_plotter, 3)
+        self.bar_b = DentalArch3DBarVisualizerQt(cache.b, self.main_plotter, 4)
+        self.grids = (self.grid_a, self.grid_b, self.grid_diff); self.bars = (self.bar_a, self.bar_b)
+        for visualizer in self.grids + self.bars:
+            visualizer.main_app_window_ref = parent_main_window
+            visualizer.setup_scene()
+        self.main_plotter.at(5)
+        self.titles = [Text2D(text, pos="top-center", c='k', s=0.8) for text in (cache.labels[0], cache.labels[1], f"{cache.labels[1]} - {cache.labels[0]}")]
+        for i, title in enumerate(self.titles): self.main_plotter.renderers[i].AddActor(title.actor)
+        self.summary_text_actor = Text2D("", pos="top-left", c='k', s=0.8)
+        self.main_plotter.renderers[5].AddActor(self.summary_text_actor.actor); self._summary_text = None
+        self.main_plotter.add_callback('mouse click', self._dispatch_mouse_click)
+        self.Render()
+
+    def _dispatch_mouse_click(self, event):
+        if not event: return
+        clicked = {v.renderer_index: v for v in self.grids + self.bars}.get(getattr(event, 'at', None))
+        if clicked is not None: clicked._on_mouse_click(event) # The window syncs the selection to the other views
+
+    def compute_frame_state(self, time_index):
+        """ComparisonFrame for aligned frame time_index with every view's state filled (runs on the producer thread)."""
+        frame = self.cache.frame(time_index)
+        frame.a.views['grid'] = self.grid_a.compute_frame_state(frame.a); frame.a.views['bar'] = self.bar_a.compute_frame_state(frame.a)
+        frame.b.views['grid'] = self.grid_b.compute_frame_state(frame.b); frame.b.views['bar'] = self.bar_b.compute_frame_state(frame.b)
+        frame.diff.views['grid'] = self.grid_diff.compute_frame_state(frame.diff)
+        return frame
+
+    def _summary(self, frame):
+        labels = self.cache.labels; lines = [f"t = {frame.time:+.2f} s from bite onset",
+                                             f"Onset: {labels[0]} {self.cache.onset_a:.2f} s, {labels[1]} {self.cache.onset_b:.2f} s", ""]
+        for label, state, total in ((labels[0], frame.a, frame.totals[0]), (labels[1], frame.b, frame.totals[1])):
+            grid_state = state.views.get('grid')
+            if grid_state is None: lines.append(f"{label}: no data"); continue
+            lines.append(f"{label}: total {total:.0f} N, L {grid_state['lr'][0]:.0f}% R {grid_state['lr'][1]:.0f}%")
+            if grid_state['balance']: lines.append(f"  {grid_state['balance']}")
+        lines.append(f"Change: {frame.totals[1] - frame.totals[0]:+.0f} N")
+        return "\n".join(lines)
+
+    def update_views(self, frame):
+        with PERF.span('grid.animate'):
+            self.grid_a.animate(frame.a.timestamp, frame.a); self.grid_b.animate(frame.b.timestamp, frame.b)
+            self.grid_diff.animate(frame.time, frame.diff)
+        with PERF.span('bar.animate'):
+            self.bar_a.animate(frame.a.timestamp, frame.a); self.bar_b.animate(frame.b.timestamp, frame.b)
+        summary = self._summary(frame)
+        if summary != self._summary_text: self.summary_text_actor.text(summary); self._summary_text = summary
+        with PERF.span('vtk.render'): self.Render() # One render of all six viewports
+
+    def Render(self): self.vedo_canvas.Render()
+
+
+class ComparisonWindow(PlaybackWindowMixin, QMainWindow):
+    """Synchronized playback of a SessionPairCache: comparison views, both sessions' graph lines and one timeline."""
+    timeline_format = "{:+.1f}s" # Seconds from bite onset
+
+    def __init__(self, cache=None, startup_timer=None):
+        super().__init__()
+        self.cache = cache; self._init_playback(startup_timer); self.views = None
+        self.setWindowTitle("Dental Force Visualization Suite - Session Comparison"); self.setGeometry(50, 50, 1800, 960)
+        self.setStyleSheet("background-color: lightblue;")
+        if cache is not None: self._build_views()
+        else: self._setup_loading_ui()
+
+    @property
+    def playback_timestamps(self): return self.cache.timestamps if self.cache is not None else []
+
+    def _set_loaded_data(self, cache): self.cache = cache
+
+    def _build_views(self):
+        from qt_views import MatplotlibCanvas
+        from graph_visualization_qt import GraphVisualizerQt
+        from session_comparison import ComparisonGraphSource
+        if self.startup_timer: self.startup_timer.mark('view imports')
+        self.playback_clock = PlaybackClock(self.cache.timestamps, speed=1.0, loop=True, frame_budget_s=1.0/self.fps)
+        self.graph_source = ComparisonGraphSource(self.cache)
+        self.graph_qt_canvas = MatplotlibCanvas(self)
+        self.graph_visualizer = GraphVisualizerQt(self.graph_source)
+        self.graph_visualizer.set_figure_axes(self.graph_qt_canvas.fig, self.graph_qt_canvas.axes)
+        self.graph_visualizer.enable_blit(True)
+        self.graph_visualizer.create_graph_figure(); self.graph_visualizer.ax.set_xlabel("Time from bite onset (s)")
+        self.initial_graph_teeth = self.graph_source.series_ids(self.cache.tooth_ids[0]) if self.cache.tooth_ids else []
+        self.currently_graphed_tooth_ids = list(self.initial_graph_teeth)
+        self.graph_visualizer.plot_tooth_lines(self.currently_graphed_tooth_ids)
+
+        self.views = ComparisonMultiViewWidget(self.cache, self)
+        self.detailed_info_label = QLabel("Click on a tooth to compare it in the graph.")
+        self.detailed_info_label.setWordWrap(True); self.detailed_info_label.setAlignment(Qt.AlignTop | Qt.AlignLeft)
+        self.detailed_info_label.setMinimumWidth(200); self.detailed_info_label.setMaximumWidth(300)
+        self._setup_ui()
+        if self.startup_timer: self.startup_timer.mark('scene setup')
+        self._start_frame_producer(self.views.compute_frame_state)
+        self._show_frame(0); self.graph_qt_canvas.draw()
+        QTimer.singleShot(0, lambda: self._show_frame(self.current_timestamp_idx)) # Again once the layout has its final size
+        if self.startup_timer: self.startup_timer.mark('first frame'); self.startup_timer.log()
+
+    def _setup_ui(self):
+        central_widget = QWidget(); self.setCentralWidget(central_widget)
+        main_vertical_layout = QVBoxLayout(central_widget)
+        top_area_layout = QHBoxLayout()
+        top_area_layout.addWidget(self.views, 3); top_area_layout.addWidget(self.detailed_info_label, 1)
+        main_vertical_layout.addLayout(top_area_layout, 3)
+        main_vertical_layout.addWidget(self.graph_qt_canvas, 2)
+        main_vertical_layout.addLayout(self._build_playback_controls())
+        controls_layout = QHBoxLayout()
+        controls_layout.addStretch(1); controls_layout.addWidget(self.play_pause_button); controls_layout.addWidget(self.speed_combo)
+        controls_layout.addWidget(self.render_stats_label); controls_layout.addStretch(1)
+        main_vertical_layout.addLayout(controls_layout)
+
+    def _update_views(self, frame_idx, timestamp, frame): self.views.update_views(frame) # frame: ComparisonFrame from the producer
+
+    def update_graph_on_click(self, sel_tid=None):
+        """A click in any view selects the tooth in all of them and graphs it for both sessions."""
+        for grid in self.views.grids: grid.selected_tooth_id_grid = sel_tid
+        for bar in self.views.bars: bar.selected_tooth_id_3dbar = sel_tid
+        new_ids = self.graph_source.series_ids(sel_tid) if sel_tid is not None else self.initial_graph_teeth
+        if new_ids != self.currently_graphed_tooth_ids:
+            self.graph_visualizer.plot_tooth_lines(new_ids); self.currently_graphed_tooth_ids = new_ids
+            self.graph_qt_canvas.draw_idle()
+
+    def update_detailed_info(self, info_str): self.detailed_info_label.setText(info_str)
+
+    def force_render_vedo_views(self, timestamp): self._show_frame(self.current_timestamp_idx) # Views may show different session times
+
+    def closeEvent(self, event):
+        self._stop_playback()
+        super().closeEvent(event)
+
+
+if __name__ == '__main__':
+    startup_timer = StartupTimer(); startup_timer.mark('import')
+    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="Compare two recorded sessions (e.g. before and after an adjustment), aligned on bite onset.")
+    parser.add_argument('sessions', nargs='*', metavar='CSV', help="Session A and session B as sensor CSV files (two simulated sessions when omitted).")
+    parser.add_argument('--labels', nargs=2, default=('Pre', 'Post'), metavar=('A', 'B'), help="Names of the two sessions.")
+    parser.add_argument('--sensors', type=int, default=4, help="Sensor points per tooth of the simulated sessions.")
+    parser.add_argument('--num-teeth', type=int, default=16, help="Teeth of the simulated sessions.")
+    parser.add_argument('--numbering', choices=('universal', 'fdi'), default=None, help="Tooth numbering of the labels (default: as recorded).")
+    args, _ = parser.parse_known_args(app.arguments()[1:])
+    if len(args.sessions) not in (0, 2): parser.error("give two session CSV files, or none for simulated sessions")
+    csv_a, csv_b = args.sessions if args.sessions else (None, None)
+    load_fn = lambda progress, timings: load_session_pair(progress, timings, csv_a, csv_b, labels=tuple(args.labels), num_teeth=args.num_teeth,
+                                                          num_sensor_points_per_tooth=args.sensors, display_numbering=args.numbering)
+    window = ComparisonWindow(startup_timer=startup_timer)
+    window.show(); startup_timer.mark('window')
+    window.load_data_async(load_fn)
+    sys.exit(app.exec_())
+# --- END OF FILE comparison_window.py ---
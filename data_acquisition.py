@@ -54,28 +54,22 @@ class SensorDataReader:
             self.data = pd.concat([self.data, new_data], ignore_index=True) if not self.data.empty else new_data
         return self.data
 
-    def simulate_data(self, duration=5, num_teeth=16, num_sensor_points_per_tooth=4):
-        timestamps = np.arange(0, duration, 0.1)
-        data_list = []
-        for t in timestamps:
-            for tooth_id in range(1, num_teeth + 1):
-                base_force_on_tooth = np.random.uniform(5, 60) * (0.8 + 0.4 * np.sin(t * 0.5 + tooth_id * 0.3))
-                if 4 <= tooth_id <= 6 or 11 <= tooth_id <= 13: base_force_on_tooth *= np.random.uniform(0.7, 1.3)
-                elif tooth_id <= 3 or tooth_id >= 14: base_force_on_tooth *= np.random.uniform(0.9, 1.5)
-                for sensor_point_idx in range(1, num_sensor_points_per_tooth + 1):
-                    variation_factor = 1.0
-                    if num_sensor_points_per_tooth == 4:
-                        if sensor_point_idx == 1: variation_factor = np.random.uniform(0.7, 1.1)
-                        elif sensor_point_idx == 2: variation_factor = np.random.uniform(0.9, 1.3)
-                        elif sensor_point_idx == 3: variation_factor = np.random.uniform(0.6, 1.0)
-                        elif sensor_point_idx == 4: variation_factor = np.random.uniform(0.8, 1.2)
-                    else: variation_factor = np.random.uniform(0.7, 1.3)
-                    force = base_force_on_tooth * variation_factor + np.random.uniform(-10, 10)
-                    force = max(0, min(100, force)) 
-                    contact_time = np.random.uniform(0.01, 0.05)
-                    data_list.append({'timestamp': t, 'tooth_id': tooth_id, 'sensor_point_id': sensor_point_idx,
-                                      'force': force, 'contact_time': contact_time})
-        sim_data = pd.DataFrame(data_list)
+    def simulate_data(self, duration=5, num_teeth=16, num_sensor_points_per_tooth=4, sample_period=0.1):
+        """Long-form simulated session; generated as whole arrays so dense sensors (e.g. 256 points/tooth) stay fast."""
+        timestamps = np.arange(0, duration, sample_period)
+        tooth_ids = np.arange(1, num_teeth + 1); shape = (len(timestamps), num_teeth, num_sensor_points_per_tooth)
+        base_force = np.random.uniform(5, 60, shape[:2]) * (0.8 + 0.4 * np.sin(timestamps[:, None] * 0.5 + tooth_ids[None, :] * 0.3))
+        premolar = ((tooth_ids >= 4) & (tooth_ids <= 6)) | ((tooth_ids >= 11) & (tooth_ids <= 13)); molar = (tooth_ids <= 3) | (tooth_ids >= 14)
+        base_force *= np.where(premolar, np.random.uniform(0.7, 1.3, shape[:2]), np.where(molar, np.random.uniform(0.9, 1.5, shape[:2]), 1.0))
+        if num_sensor_points_per_tooth == 4: # Per-corner bias of the 2x2 sensor
+            low, high = np.array([0.7, 0.9, 0.6, 0.8]), np.array([1.1, 1.3, 1.0, 1.2])
+            variation = np.random.uniform(low, high, shape)
+        else: variation = np.random.uniform(0.7, 1.3, shape)
+        forces = np.clip(base_force[:, :, None] * variation + np.random.uniform(-10, 10, shape), 0, 100)
+        sim_data = pd.DataFrame({'timestamp': np.repeat(timestamps, num_teeth * num_sensor_points_per_tooth),
+                                 'tooth_id': np.tile(np.repeat(tooth_ids, num_sensor_points_per_tooth), len(timestamps)),
+                                 'sensor_point_id': np.tile(np.arange(1, num_sensor_points_per_tooth + 1), len(timestamps) * num_teeth),
+                                 'force': forces.ravel(), 'contact_time': np.random.uniform(0.01, 0.05, shape).ravel()})
         if not self.data.empty and set(self.data.columns) == set(sim_data.columns):
             self.data = pd.concat([self.data, sim_data], ignore_index=True)
         else:
@@ -84,6 +78,38 @@ class SensorDataReader:
         logging.info(f"Generated simulated data: {len(sim_data)} rows, {num_teeth} teeth, {num_sensor_points_per_tooth} sensor points/tooth.")
         return self.data
 
+    def stream_readings(self, stop_event, sample_period=0.1, num_teeth=16, num_sensor_points_per_tooth=4):
+        """Yields (timestamp, tooth_id, sensor_point_id, force, contact_time) as readings arrive, until stop_event is set.
+
+        Reads the serial port when connected; otherwise simulates readings in real time, one full frame every sample_period.
+        """
+        if self.is_connected:
+            while not stop_event.is_set():
+                try: line = self.serial.readline().decode('utf-8').strip()
+                except serial.SerialException as e: logging.error(f"Serial read error: {e}"); break
+                if not line: continue
+                try: parts = list(map(float, line.split(',')))
+                except ValueError as e: logging.warning(f"Invalid data format: {line}, error: {e}"); continue
+                if len(parts) != 5: logging.warning(f"Invalid data line (expected 5 parts): {line}"); continue
+                timestamp, tooth_id, sensor_point_id, force, contact_time = parts
+                yield timestamp, int(tooth_id), int(sensor_point_id), force, contact_time
+            return
+
+        logging.warning("No sensor connected. Streaming simulated data.")
+        tooth_ids = np.arange(1, num_teeth + 1); start = time.perf_counter(); frame_idx = 0
+        while not stop_event.is_set():
+            t = frame_idx * sample_period
+            delay = start + t - time.perf_counter()
+            if delay > 0: time.sleep(delay)
+            base_force = np.random.uniform(5, 60, num_teeth) * (0.8 + 0.4 * np.sin(t * 0.5 + tooth_ids * 0.3))
+            forces = base_force[:, None] * np.random.uniform(0.7, 1.3, (num_teeth, num_sensor_points_per_tooth))
+            forces = np.clip(forces + np.random.uniform(-10, 10, forces.shape), 0, 100)
+            contact_times = np.random.uniform(0.01, 0.05, forces.shape)
+            for i, tooth_id in enumerate(tooth_ids):
+                for j in range(num_sensor_points_per_tooth):
+                    yield t, int(tooth_id), j + 1, float(forces[i, j]), float(contact_times[i, j])
+            frame_idx += 1
+
     def save_data(self, filename='sensor_data.csv'):
         if not self.data.empty: self.data.to_csv(filename, index=False); logging.info(f"Data saved to {filename}")
     def close(self):
@@ -6,12 +6,39 @@ import pandas as pd
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 class DataProcessor:
-    def __init__(self, data):
+    FORCE_DTYPE = np.float32 # Sensor forces carry ~3 significant digits; halves the matrix (16 teeth x 256 sensors x 200 Hz = 3.3 MB/s)
+    CHUNK_ROWS = 65536 # Row block for whole-matrix reductions, bounds temporaries on dense sessions
+
+    def __init__(self, data, force_matrix_path=None):
         self.data = data 
+        self.force_matrix_path = force_matrix_path # Build the force matrix as an .npy memmap here instead of in RAM (long dense sessions)
+        self.sensor_geometries = {} # Optional {tooth_id: SensorGridGeometry} from the sensor config; default is derived from the sensor count
+        self.tooth_numbering = None; self.display_numbering = None # 'universal'/'fdi' (tooth_numbering); None = detected from the ids / as recorded
+        self.arch_layout = 'auto' # 'auto' (dual arch when both arches have teeth), 'dual' or 'single'
         self.cleaned_data = None; self.force_matrix = None; self.timestamps = None
         self.tooth_ids = None; self.num_sensor_points_per_tooth_map = {} 
         self.ordered_tooth_sensor_pairs = []; self.max_force_overall = 100.0
+        self.tooth_column_starts = np.array([],dtype=np.intp) # First force_matrix column of each tooth (pairs are grouped by tooth)
+        self.timestamps_array = np.array([],dtype=float)
+        self.tooth_average_matrix = None # (T x teeth) per-tooth sensor means, built on first use
         self.cof_trajectory = [] 
+        self.cof_times = np.array([],dtype=float); self.cof_xy = np.empty((0,2),dtype=float) # Array form of cof_trajectory
+
+    @classmethod
+    def from_force_matrix(cls, force_matrix, timestamps, ordered_tooth_sensor_pairs, max_force_overall=100.0):
+        """Processor over an already built force matrix (e.g. a read-only memmap shared by export workers); no cleaning or pivoting."""
+        processor = cls(None)
+        processor.cleaned_data = pd.DataFrame(columns=['timestamp','tooth_id','sensor_point_id','force','contact_time']) # Non-None: cleaning is done
+        processor.ordered_tooth_sensor_pairs = [(int(tid),int(spid)) for tid,spid in ordered_tooth_sensor_pairs]
+        pair_tooth_ids = np.array([tid for tid,_ in processor.ordered_tooth_sensor_pairs],dtype=int)
+        processor.tooth_ids = sorted(set(pair_tooth_ids.tolist()))
+        processor.tooth_column_starts = np.searchsorted(pair_tooth_ids, processor.tooth_ids).astype(np.intp)
+        sensor_counts = np.diff(np.append(processor.tooth_column_starts, len(pair_tooth_ids)))
+        processor.num_sensor_points_per_tooth_map = {tid:int(n) for tid,n in zip(processor.tooth_ids,sensor_counts)}
+        processor.timestamps_array = np.asarray(timestamps,dtype=float); processor.timestamps = processor.timestamps_array.tolist()
+        processor.force_matrix = force_matrix; processor.max_force_overall = max_force_overall
+        logging.info("Processor from force matrix: %s, %d teeth.",force_matrix.shape,len(processor.tooth_ids))
+        return processor
 
     def clean_data(self):
         if not isinstance(self.data, pd.DataFrame): logging.error("Input not DataFrame."); self.cleaned_data=pd.DataFrame(); return self.cleaned_data
@@ -33,9 +60,10 @@ class DataProcessor:
         self.ordered_tooth_sensor_pairs = []
         if not self.cleaned_data.empty:
             self.num_sensor_points_per_tooth_map = self.cleaned_data.groupby('tooth_id')['sensor_point_id'].nunique().to_dict()
-            for tid in self.tooth_ids:
-                sp_ids = sorted(self.cleaned_data[self.cleaned_data['tooth_id']==tid]['sensor_point_id'].unique())
-                for sp_id in sp_ids: self.ordered_tooth_sensor_pairs.append((tid, sp_id))
+            pairs = self.cleaned_data[['tooth_id','sensor_point_id']].drop_duplicates().sort_values(['tooth_id','sensor_point_id']).to_numpy()
+            self.ordered_tooth_sensor_pairs = [(int(tid),int(spid)) for tid,spid in pairs]
+            pair_tooth_ids = pairs[:,0]
+            self.tooth_column_starts = np.searchsorted(pair_tooth_ids, self.tooth_ids).astype(np.intp)
             if 'force' in self.cleaned_data.columns and not self.cleaned_data['force'].empty:
                  valid_forces = self.cleaned_data['force'][self.cleaned_data['force'] > 0]
                  self.max_force_overall = valid_forces.max() if not valid_forces.empty else 100.0
@@ -46,75 +74,107 @@ class DataProcessor:
     def create_force_matrix(self):
         if self.cleaned_data is None or self.cleaned_data.empty: self.clean_data()
         if self.cleaned_data.empty: self.force_matrix=np.array([]); self.timestamps=[]; return self.force_matrix,self.timestamps
-        self.timestamps = sorted(self.cleaned_data['timestamp'].unique())
+        self.timestamps_array = np.unique(self.cleaned_data['timestamp'].to_numpy(dtype=float)); self.tooth_average_matrix = None
+        self.timestamps = self.timestamps_array.tolist()
         if not self.ordered_tooth_sensor_pairs or not self.timestamps: self.force_matrix=np.array([]); return self.force_matrix,self.timestamps
-        self.force_matrix = np.full((len(self.timestamps),len(self.ordered_tooth_sensor_pairs)),np.nan,dtype=float)
-        try:
-            pivot_data = self.cleaned_data[['timestamp','tooth_id','sensor_point_id','force']].copy()
-            pivot_data['force'] = pd.to_numeric(pivot_data['force'],errors='coerce').astype(float)
-            pivot_df = pivot_data.pivot_table(index='timestamp',columns=['tooth_id','sensor_point_id'],values='force')
-            pivot_df.columns = pd.MultiIndex.from_tuples(pivot_df.columns)
-            temp_df = pd.DataFrame(index=self.timestamps,columns=pd.MultiIndex.from_tuples(self.ordered_tooth_sensor_pairs),dtype=float)
-            temp_df.update(pivot_df); self.force_matrix = temp_df.to_numpy(dtype=float)
-        except Exception as e:
-            logging.error(f"Pivot error: {e}. Fallback."); pair_idx={p:i for i,p in enumerate(self.ordered_tooth_sensor_pairs)}
-            for r,t in enumerate(self.timestamps):
-                td=self.cleaned_data[self.cleaned_data['timestamp']==t]
-                for _,dp in td.iterrows(): p=(int(dp['tooth_id']),int(dp['sensor_point_id'])); self.force_matrix[r,pair_idx[p]]=float(dp['force'])
+        ts_values = self.cleaned_data['timestamp'].to_numpy(dtype=float)
+        row_idx = np.searchsorted(self.timestamps_array, ts_values)
+        col_idx = pd.MultiIndex.from_tuples(self.ordered_tooth_sensor_pairs).get_indexer(
+            pd.MultiIndex.from_arrays([self.cleaned_data['tooth_id'].to_numpy(),self.cleaned_data['sensor_point_id'].to_numpy()]))
+        shape = (len(self.timestamps),len(self.ordered_tooth_sensor_pairs))
+        if self.force_matrix_path: self.force_matrix = np.lib.format.open_memmap(self.force_matrix_path,mode='w+',dtype=self.FORCE_DTYPE,shape=shape)
+        else: self.force_matrix = np.empty(shape,dtype=self.FORCE_DTYPE)
+        self.force_matrix[...] = np.nan
+        self.force_matrix[row_idx,col_idx] = self.cleaned_data['force'].to_numpy(dtype=self.FORCE_DTYPE) # Rows are unique per (timestamp, pair) after clean_data
+        if self.force_matrix_path: self.force_matrix.flush()
         logging.info("Force matrix: %s, dtype=%s",self.force_matrix.shape,self.force_matrix.dtype)
         return self.force_matrix,self.timestamps
 
     def get_average_force_for_tooth(self, tooth_id):
+        """(timestamps, read-only column view of the tooth's average series); copy before modifying."""
         if self.force_matrix is None: self.create_force_matrix()
         if self.force_matrix.size==0 or tooth_id not in self.tooth_ids: return self.timestamps or [],np.array([],dtype=float)
-        indices = [i for i,(tid,_) in enumerate(self.ordered_tooth_sensor_pairs) if tid==tooth_id]
-        if not indices: return self.timestamps or [],np.array([],dtype=float)
-        fm_f = self.force_matrix.astype(float) if not np.issubdtype(self.force_matrix.dtype, np.floating) else self.force_matrix
-        avg_f = np.nanmean(fm_f[:,indices],axis=1)
-        return self.timestamps, np.nan_to_num(avg_f,nan=0.0).astype(float)
+        return self.timestamps, self.get_tooth_average_matrix()[:,self.tooth_ids.index(tooth_id)]
+
+    def get_tooth_average_matrix(self):
+        """(T x teeth) NaN-aware per-tooth sensor mean for every timestamp, aligned with self.tooth_ids (all-NaN -> 0). Built once."""
+        if self.force_matrix is None: self.create_force_matrix()
+        if self.tooth_average_matrix is None:
+            n_t = len(self.timestamps or [])
+            if self.force_matrix.size==0 or len(self.tooth_column_starts)==0: self.tooth_average_matrix = np.zeros((n_t,0),dtype=float)
+            else:
+                self.tooth_average_matrix = np.zeros((n_t,len(self.tooth_column_starts)),dtype=float)
+                for r0 in range(0,n_t,self.CHUNK_ROWS): # Blocks keep the float64 temporaries small on dense/long sessions
+                    block = np.asarray(self.force_matrix[r0:r0+self.CHUNK_ROWS],dtype=float); valid = ~np.isnan(block)
+                    sums = np.add.reduceat(np.where(valid,block,0.0),self.tooth_column_starts,axis=1)
+                    counts = np.add.reduceat(valid,self.tooth_column_starts,axis=1,dtype=np.intp)
+                    np.divide(sums,counts,out=self.tooth_average_matrix[r0:r0+len(block)],where=counts>0)
+            self.tooth_average_matrix.flags.writeable = False # Shared by the graph cache, pyramid and comparison; columns are handed out as views
+            logging.info("Tooth average matrix: %s",self.tooth_average_matrix.shape)
+        return self.tooth_average_matrix
         
+    def get_time_index(self, timestamp):
+        """Index of the timestamp nearest to timestamp (binary search over the sorted timestamps)."""
+        n = len(self.timestamps_array)
+        if n == 0: return -1
+        i = int(np.searchsorted(self.timestamps_array, timestamp))
+        if i <= 0: return 0
+        if i >= n: return n-1
+        return i if self.timestamps_array[i]-timestamp < timestamp-self.timestamps_array[i-1] else i-1
+
     def get_all_forces_at_time(self, timestamp):
         if self.force_matrix is None: self.create_force_matrix()
         if self.force_matrix.size==0 or not self.timestamps: return self.ordered_tooth_sensor_pairs,np.array([],dtype=float)
-        ts_arr=np.array(self.timestamps); time_idx=np.argmin(np.abs(ts_arr-timestamp))
+        time_idx=self.get_time_index(timestamp)
         forces = self.force_matrix[time_idx,:]
         return self.ordered_tooth_sensor_pairs,np.nan_to_num(forces,nan=0.0).astype(float)
 
-    def calculate_cof_trajectory(self, tooth_cell_definitions, num_sensor_points_per_cell_layout=4):
+    def get_tooth_totals(self, forces_row):
+        """Per-tooth force sums for a row in ordered_tooth_sensor_pairs order, aligned with self.tooth_ids."""
+        if len(self.tooth_column_starts)==0 or len(forces_row)==0: return np.array([],dtype=float)
+        return np.add.reduceat(forces_row,self.tooth_column_starts)
+
+    def get_tooth_average_forces_at_time(self, timestamp):
+        """Per-tooth sensor mean (NaN-aware, like get_average_force_for_tooth) at the nearest timestamp, aligned with self.tooth_ids."""
+        if self.force_matrix is None: self.create_force_matrix()
+        if self.force_matrix.size==0 or not self.timestamps: return np.array([],dtype=float)
+        row = self.force_matrix[self.get_time_index(timestamp),:]
+        valid = ~np.isnan(row)
+        sums = self.get_tooth_totals(np.where(valid,row,0.0)); counts = self.get_tooth_totals(valid.astype(float))
+        return np.divide(sums,counts,out=np.zeros_like(sums),where=counts>0)
+
+    def calculate_cof_trajectory(self, tooth_cell_definitions, num_sensor_points_per_cell_layout=None):
+        """COF per timestamp from the real sensor positions (sensor_geometry); forces <= 1e-3 and teeth outside the layout are ignored.
+
+        num_sensor_points_per_cell_layout is accepted for older callers; each tooth's grid now comes from its own sensor count
+        (or self.sensor_geometries).
+        """
         if self.force_matrix is None: self.create_force_matrix()
         if self.force_matrix.size == 0 or not tooth_cell_definitions:
-            logging.warning("Force matrix or layout undefined for COF."); self.cof_trajectory=[]; return
-        self.cof_trajectory = []
-        grid_dim = int(np.sqrt(num_sensor_points_per_cell_layout)); grid_dim=max(1,grid_dim)
-
-        # Create a map from actual_tooth_id to its layout properties (center, width, height)
-        layout_map = {props['actual_id']: props for props in tooth_cell_definitions.values()}
-
-        for ts_idx, timestamp in enumerate(self.timestamps):
-            sum_fx, sum_fy, total_f_step = 0.0, 0.0, 0.0
-            current_pairs, current_forces = self.get_all_forces_at_time(timestamp)
-            force_map_ts = {pair: force for pair, force in zip(current_pairs, current_forces)}
-
-            for tooth_id, cell_prop in layout_map.items(): # Iterate through teeth defined in layout
-                cell_cx, cell_cy = cell_prop['center']; cell_w, cell_h = cell_prop['width'], cell_prop['height']
-                sub_w, sub_h = cell_w/grid_dim, cell_h/grid_dim
-                
-                actual_sp_ids = sorted([spid for tid,spid in self.ordered_tooth_sensor_pairs if tid==tooth_id])
-
-                for r_idx in range(grid_dim):
-                    for c_idx in range(grid_dim):
-                        sp_layout_order = r_idx * grid_dim + c_idx
-                        if sp_layout_order < len(actual_sp_ids):
-                            sp_id = actual_sp_ids[sp_layout_order]
-                            force = force_map_ts.get((tooth_id, sp_id), 0.0)
-                            if force > 1e-3:
-                                sp_x = cell_cx - cell_w/2 + sub_w/2 + c_idx * sub_w
-                                sp_y = cell_cy + cell_h/2 - sub_h/2 - r_idx * sub_h # r=0 is top row
-                                sum_fx += force*sp_x; sum_fy += force*sp_y; total_f_step += force
-            if total_f_step > 1e-3: self.cof_trajectory.append((timestamp, sum_fx/total_f_step, sum_fy/total_f_step))
+            logging.warning("Force matrix or layout undefined for COF."); self.cof_trajectory=[]; self._update_cof_arrays(); return
+        from sensor_geometry import sensor_world_positions
+        positions, placed = sensor_world_positions(self, tooth_cell_definitions)
+        weights = np.column_stack((positions, np.ones(len(positions))))[placed] # [x, y, 1]: one matmul gives sum_fx, sum_fy, total
+        moments = np.empty((len(self.timestamps),3),dtype=float)
+        for r0 in range(0,len(moments),self.CHUNK_ROWS):
+            block = np.asarray(self.force_matrix[r0:r0+self.CHUNK_ROWS][:,placed],dtype=float)
+            block[~(block > 1e-3)] = 0.0 # Also zeroes NaN (missing samples)
+            moments[r0:r0+len(block)] = block @ weights
+        keep = moments[:,2] > 1e-3
+        self.cof_times = np.ascontiguousarray(self.timestamps_array[keep])
+        self.cof_xy = np.ascontiguousarray(moments[keep,:2] / moments[keep,2:3])
+        self.cof_trajectory = list(zip(self.cof_times.tolist(), *self.cof_xy.T.tolist()))
         logging.info(f"COF trajectory calculated: {len(self.cof_trajectory)} points.")
 
+    def _update_cof_arrays(self):
+        cof_arr = np.asarray(self.cof_trajectory,dtype=float).reshape(-1,3)
+        self.cof_times = np.ascontiguousarray(cof_arr[:,0]); self.cof_xy = np.ascontiguousarray(cof_arr[:,1:])
+
+    def get_cof_count_up_to_timestamp(self, current_timestamp):
+        """Number of COF points with ts <= current_timestamp (binary search; cof_trajectory is time-ordered)."""
+        return int(np.searchsorted(self.cof_times, current_timestamp + 1e-6, side='right'))
+
     def get_cof_up_to_timestamp(self, current_timestamp):
         if not self.cof_trajectory: return []
-        return [(x,y) for ts,x,y in self.cof_trajectory if ts <= current_timestamp + 1e-6]
+        return [tuple(p) for p in self.cof_xy[:self.get_cof_count_up_to_timestamp(current_timestamp)]]
 # --- END OF FILE data_processing.py ---
\ No newline at end of file
@@ -1,11 +1,20 @@
 # --- START OF FILE dental_arch_3d_bar_visualization_qt.py ---
 import numpy as np
-from vedo import Text2D, Cylinder, Box, Line, Axes, Grid, Plane, Text3D, colors 
+from vedo import Text2D, Cylinder, Line, Axes, Grid, Plane, Text3D, colors 
 import logging
 import vtk 
+from vtk.util.numpy_support import vtk_to_numpy, numpy_to_vtk
+from frame_state import build_frame_state
+from perf_instrumentation import PERF
+from tooth_numbering import processor_arch_config, dual_arch_centers, tooth_label
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Bar colour table indexed by force band (upper bounds in BAR_FORCE_BANDS), last entry is the selection highlight
+BAR_FORCE_BANDS = (0.01, 0.25, 0.5, 0.75, 0.9)
+BAR_COLOR_TABLE = ((0.1,0.1,0.6,0.92), (0.2,0.4,1,0.92), (0.1,0.8,0.4,0.92), (1,0.9,0.1,0.92), (1,0.4,0,0.92), (0.9,0.0,0.2,0.92), (1,1,0,1.0))
+BAR_SELECTED_COLOR_INDEX = len(BAR_COLOR_TABLE) - 1
+
 class DentalArch3DBarVisualizerQt:
     def __init__(self, processor, parent_plotter_instance, renderer_index):
         self.processor = processor
@@ -15,6 +24,8 @@ class DentalArch3DBarVisualizerQt:
 
         if self.processor.cleaned_data is None: self.processor.create_force_matrix()
         self.num_data_teeth = len(self.processor.tooth_ids) if self.processor.tooth_ids else 0
+        self.tooth_numbering, self._tooth_positions, self.dual_arch = processor_arch_config(self.processor)
+        self.display_numbering = getattr(self.processor, 'display_numbering', None)
         
         self.arch_layout_width = 14.0; self.arch_layout_depth = 8.0; self.bar_base_radius = 0.5     
         self.tooth_bar_base_positions = [] 
@@ -24,10 +35,14 @@ class DentalArch3DBarVisualizerQt:
         self.initial_camera_settings = {} 
 
         self.timestamps = self.processor.timestamps; self.current_timestamp_idx = 0; self.last_animated_timestamp = None 
-        self.force_bar_actors = []; self.time_text_actor = None; self.arch_base_line_actor = None; self.tooth_label_actors = []    
+        self.bar_glyph_actor = None; self.time_text_actor = None; self.arch_base_line_actor = None; self.tooth_label_actors = []    
+        self.arch_base_line_actors = [] # One base line per arch (the dual layout has two)
         self.floor_grid_actor = None; self.axes_actor_local = None    
         self.selected_tooth_id_3dbar = None 
         self.main_app_window_ref = None
+        # Instanced bars: one cube source, per-instance scale (w, w, h) and colour index arrays viewed from numpy
+        self._bar_poly = None; self._bar_scale_array = None; self._bar_scale_view = None
+        self._bar_color_array = None; self._bar_color_view = None; self._bar_base_xy = None
 
         if self.num_data_teeth == 0:
             logging.error(f"3DBarVizQt (Renderer {self.renderer_index}): No tooth data."); return
@@ -60,12 +75,16 @@ class DentalArch3DBarVisualizerQt:
 
         self.tooth_bar_base_positions = self._create_bar_base_positions(self.num_data_teeth, self.arch_layout_width, self.arch_layout_depth)
         self._initialize_static_elements() 
+        self._initialize_dynamic_elements()
         
         # if self.parent_plotter and hasattr(self, '_on_mouse_click'):
         #     self.parent_plotter.add_callback('mouse click', self._on_mouse_click)
 
     def _create_bar_base_positions(self, num_teeth, total_width, total_depth):
         if num_teeth == 0: return [] # x_coords not defined here
+        if self.dual_arch: # Maxillary arch at the back, mandibular in front, each tooth in its numbered slot
+            centers = dual_arch_centers(self._tooth_positions, total_width, total_depth*0.45, arch_gap=self.bar_base_radius*4.0)
+            return [np.array([x, y + self.grid_center_y, 0.0]) for x, y in centers]
         positions_3d = []
         if num_teeth == 1: 
             x_coords = np.array([0.0]) # x_coords defined here
@@ -82,65 +101,104 @@ class DentalArch3DBarVisualizerQt:
         if not self.renderer or not self.tooth_bar_base_positions: return
         static_actors_to_add_vedo = [] # Collect Vedo objects
         if len(self.tooth_bar_base_positions)>1:
-            line_pts=[(p[0],p[1],0.01) for p in self.tooth_bar_base_positions]
-            self.arch_base_line_actor=Line(line_pts,c='dimgray',lw=2,alpha=0.7); static_actors_to_add_vedo.append(self.arch_base_line_actor)
+            arch_segments = [list(range(len(self.tooth_bar_base_positions)))]
+            if self.dual_arch: # Along each arch from the patient's right to left
+                arch_segments = [sorted((i for i, p in enumerate(self._tooth_positions) if p.arch == arch), key=lambda i: self.tooth_bar_base_positions[i][0])
+                                 for arch in ('upper', 'lower')]
+            self.arch_base_line_actors = [Line([(self.tooth_bar_base_positions[i][0],self.tooth_bar_base_positions[i][1],0.01) for i in seg],c='dimgray',lw=2,alpha=0.7)
+                                          for seg in arch_segments if len(seg) > 1]
+            self.arch_base_line_actor = self.arch_base_line_actors[0] if self.arch_base_line_actors else None
+            static_actors_to_add_vedo.extend(self.arch_base_line_actors)
             self.tooth_label_actors=[]
             for i,pos in enumerate(self.tooth_bar_base_positions):
                 if i < len(self.processor.tooth_ids):
                     tid=self.processor.tooth_ids[i]
                     lbl_pos=(pos[0],pos[1]-self.bar_base_radius*0.7,-0.1) 
-                    lbl=Text3D(str(tid),pos=lbl_pos,s=0.20,c=(0.2,0.2,0.2),depth=0.01,justify='ct')
+                    lbl=Text3D(tooth_label(tid,self.tooth_numbering,self.display_numbering),pos=lbl_pos,s=0.20,c=(0.2,0.2,0.2),depth=0.01,justify='ct')
                     self.tooth_label_actors.append(lbl); static_actors_to_add_vedo.append(lbl)
         if static_actors_to_add_vedo: 
             for vo in static_actors_to_add_vedo: self.renderer.AddActor(vo.actor) # Add .actor
 
-    def render_display(self, timestamp): 
+    def _initialize_dynamic_elements(self):
+        """Builds the time text and the single instanced bar actor; render_display only rewrites their data."""
+        if not self.renderer or not self.tooth_bar_base_positions: return
+        num_bars = min(len(self.tooth_bar_base_positions), len(self.processor.tooth_ids))
+        self.time_text_actor = Text2D("Time: 0.0s",pos="bottom-right",c='k',bg=(1,1,1),alpha=0.6,s=0.7)
+
+        base_pts = np.array(self.tooth_bar_base_positions[:num_bars], dtype=float).reshape(-1, 3)
+        self._bar_base_xy = base_pts[:, :2].copy()
+        self._bar_poly = vtk.vtkPolyData()
+        vtk_pts = vtk.vtkPoints(); vtk_pts.SetData(numpy_to_vtk(base_pts, deep=True)); self._bar_poly.SetPoints(vtk_pts)
+        scale_arr = numpy_to_vtk(np.zeros((num_bars, 3)), deep=True); scale_arr.SetName("bar_scale")
+        color_arr = numpy_to_vtk(np.zeros(num_bars), deep=True); color_arr.SetName("bar_color_idx")
+        self._bar_poly.GetPointData().AddArray(scale_arr); self._bar_poly.GetPointData().AddArray(color_arr)
+        self._bar_scale_array = self._bar_poly.GetPointData().GetArray("bar_scale"); self._bar_scale_view = vtk_to_numpy(self._bar_scale_array)
+        self._bar_color_array = self._bar_poly.GetPointData().GetArray("bar_color_idx"); self._bar_color_view = vtk_to_numpy(self._bar_color_array)
+
+        cube = vtk.vtkCubeSource(); cube.SetCenter(0, 0, 0.5) # Unit cube standing on its base, scaled per instance
+        lut = vtk.vtkLookupTable(); lut.SetNumberOfTableValues(len(BAR_COLOR_TABLE)); lut.SetTableRange(-0.5, len(BAR_COLOR_TABLE)-0.5)
+        for i, rgba in enumerate(BAR_COLOR_TABLE): lut.SetTableValue(i, *rgba)
+        lut.Build()
+        mapper = vtk.vtkGlyph3DMapper()
+        mapper.SetInputData(self._bar_poly); mapper.SetSourceConnection(cube.GetOutputPort())
+        mapper.OrientOff(); mapper.ScalingOn(); mapper.SetScaleModeToScaleByVectorComponents(); mapper.SetScaleArray("bar_scale")
+        mapper.SetLookupTable(lut); mapper.SetScalarRange(-0.5, len(BAR_COLOR_TABLE)-0.5)
+        mapper.SetScalarModeToUsePointFieldData(); mapper.SelectColorArray("bar_color_idx"); mapper.ScalarVisibilityOn()
+        self.bar_glyph_actor = vtk.vtkActor(); self.bar_glyph_actor.SetMapper(mapper)
+        self.bar_glyph_actor.name = "Bar_Instances" # Raw vtkActor: clicks are resolved to a tooth from the picked position
+
+        self.renderer.AddActor(self.time_text_actor.actor); self.renderer.AddActor(self.bar_glyph_actor)
+        logging.info(f"3DBarVizQt (R{self.renderer_index}): Instanced bar actor created for {num_bars} teeth.")
+
+    def render_display(self, timestamp): # Per frame: one (teeth,) height write and one colour-index write
+        if self.processor.force_matrix is None or self.processor.force_matrix.size == 0: return
+        self.apply_frame_state(build_frame_state(self.processor, self.processor.get_time_index(timestamp)), timestamp)
+
+    def apply_frame_state(self, frame_state, timestamp=None):
+        """Writes bar heights/colours for a precomputed FrameState."""
         if not self.tooth_bar_base_positions or not self.renderer: return
+        if self.bar_glyph_actor is None: self._initialize_dynamic_elements()
         self.parent_plotter.at(self.renderer_index) 
-        
-        actors_to_remove_vtk = []
-        if self.time_text_actor: actors_to_remove_vtk.append(self.time_text_actor.actor)
-        for act in self.force_bar_actors: actors_to_remove_vtk.append(act.actor)
-        for vtk_act in actors_to_remove_vtk: 
-            if vtk_act: self.renderer.RemoveActor(vtk_act)
-        
-        self.force_bar_actors.clear(); self.time_text_actor = None
-        
-        current_vedo_actors_to_add = []
-        self.time_text_actor = Text2D(f"Time: {timestamp:.1f}s",pos="bottom-right",c='k',bg=(1,1,1),alpha=0.6,s=0.7)
-        current_vedo_actors_to_add.append(self.time_text_actor)
-
-        for i,base_pos in enumerate(self.tooth_bar_base_positions):
-            if i >= len(self.processor.tooth_ids): continue
-            tooth_id=self.processor.tooth_ids[i]; _,f_series=self.processor.get_average_force_for_tooth(tooth_id)
-            curr_f=0.0
-            if self.timestamps and len(f_series)==len(self.timestamps):
-                try: idx=np.argmin(np.abs(np.array(self.timestamps)-timestamp)); curr_f=f_series[idx]
-                except: pass 
-            if not np.isfinite(curr_f): curr_f=0.0
-            norm_f=min(1.0,max(0.0,curr_f/self.max_force_for_scaling))
-            bar_h=self.min_bar_height+norm_f*(self.max_bar_height-self.min_bar_height)
-            if curr_f<1e-3: bar_h=0.0 
-            if bar_h>1e-4: 
-                if norm_f<0.01:clr=(0.1,0.1,0.6) 
-                elif norm_f<0.25:clr=(0.2,0.4,1) 
-                elif norm_f<0.5:clr=(0.1,0.8,0.4) 
-                elif norm_f<0.75:clr=(1,0.9,0.1)   
-                elif norm_f<0.9:clr=(1,0.4,0) 
-                else: clr=(0.9,0.0,0.2)                    
-                bar_cz=base_pos[2]+bar_h/2.0
-                bar=Box(pos=(base_pos[0],base_pos[1],bar_cz),length=self.bar_base_radius*1.6,width=self.bar_base_radius*1.6,height=bar_h,c=clr,alpha=0.92)
-                bar.name=f"Bar_Tooth_{tooth_id}"; bar.pickable=True
-                if self.selected_tooth_id_3dbar == tooth_id: bar.color('yellow').alpha(1.0)
-                self.force_bar_actors.append(bar); current_vedo_actors_to_add.append(bar)
-        
-        if current_vedo_actors_to_add: 
-            for vo in current_vedo_actors_to_add: self.renderer.AddActor(vo.actor)
+        if timestamp is None: timestamp = frame_state.timestamp
+        self.time_text_actor.text(f"Time: {timestamp:.1f}s")
+
+        view_state = frame_state.views.get('bar')
+        if view_state is None: # Not precomputed by the producer thread
+            with PERF.span('bar.compute'): view_state = self.compute_frame_state(frame_state)
+        if view_state is None: return
+        num_bars = len(self._bar_scale_view)
+        self._bar_scale_view[:] = view_state['scale']
+        self._bar_color_view[:] = view_state['color_idx']
+        if self.selected_tooth_id_3dbar in self.processor.tooth_ids[:num_bars]: # Selection is a per-instance colour override
+            self._bar_color_view[self.processor.tooth_ids.index(self.selected_tooth_id_3dbar)] = BAR_SELECTED_COLOR_INDEX
+        self._bar_scale_array.Modified(); self._bar_color_array.Modified(); self._bar_poly.Modified()
+
+    def compute_frame_state(self, frame_state):
+        """Pure per-view step: per-instance scales (w, w, h) and colour-band indices. Safe off the GUI thread."""
+        if self._bar_scale_view is None: return None
+        num_bars = len(self._bar_scale_view)
+        curr_f = np.zeros(num_bars)
+        tooth_avgs = frame_state.tooth_averages
+        curr_f[:min(num_bars, len(tooth_avgs))] = tooth_avgs[:num_bars]
+        curr_f[~np.isfinite(curr_f)] = 0.0
+        norm_f = np.clip(curr_f/self.max_force_for_scaling, 0.0, 1.0)
+        bar_h = np.where(curr_f < 1e-3, 0.0, self.min_bar_height + norm_f*(self.max_bar_height-self.min_bar_height))
+        bar_w = np.where(bar_h > 1e-4, self.bar_base_radius*1.6, 0.0) # Zero footprint hides the bar entirely
+        scale = np.empty((num_bars, 3)); scale[:, 0] = bar_w; scale[:, 1] = bar_w; scale[:, 2] = bar_h
+        return {'scale': scale, 'color_idx': np.searchsorted(BAR_FORCE_BANDS, norm_f, side='right')}
+
+    def _tooth_id_at_bar_point(self, picked3d):
+        """Maps a picked position on the instanced bar actor to the tooth whose bar footprint contains it."""
+        if self._bar_base_xy is None or picked3d is None or not len(self._bar_base_xy): return None
+        d2 = np.sum((self._bar_base_xy - np.asarray(picked3d, dtype=float)[:2])**2, axis=1); nearest = int(np.argmin(d2))
+        if d2[nearest] > (self.bar_base_radius*1.6)**2: return None
+        return self.processor.tooth_ids[nearest]
 
-    def animate(self, timestamp_to_render): 
+    def animate(self, timestamp_to_render, frame_state=None): 
         if not self.timestamps: return
         self.last_animated_timestamp = timestamp_to_render
-        self.render_display(timestamp_to_render)
+        if frame_state is not None: self.apply_frame_state(frame_state, timestamp_to_render)
+        else: self.render_display(timestamp_to_render)
 
     def get_frame_as_array(self, timestamp_to_render): # Not used if MainApp screenshots main plotter
         logging.warning("get_frame_as_array called on individual 3DBar viz; main plotter should screenshot.")
@@ -181,13 +239,10 @@ class DentalArch3DBarVisualizerQt:
         clicked_tooth_id_parsed = None
         
         if event.actor: # An actor within this renderer was clicked
-            actor_name = event.actor.name
+            actor_name = getattr(event.actor, 'name', None)
             logging.info(f"3DBarVizQt (R{self.renderer_index if hasattr(self, 'renderer_index') else 'N/A'}) Processing Click: Actor '{actor_name}' at {event.picked3d}")
-            if actor_name and actor_name.startswith("Bar_Tooth_"): # Check for Bar_Tooth_ prefix
-                try: 
-                    clicked_tooth_id_parsed = int(actor_name.split("_")[-1])
-                except ValueError: 
-                    logging.warning(f"3DBarVizQt: Could not parse tooth_id from actor name: {actor_name}")
+            if actor_name == "Bar_Instances": # One actor draws every bar; resolve the instance from the pick position
+                clicked_tooth_id_parsed = self._tooth_id_at_bar_point(event.picked3d)
         else: # Background of this specific renderer was clicked (event.actor is None)
             logging.info(f"3DBarVizQt (R{self.renderer_index if hasattr(self, 'renderer_index') else 'N/A'}): Processing background click for its renderer.")
 
@@ -225,15 +280,10 @@ class DentalArch3DBarVisualizerQt:
                     timestamp_for_info = 0.0
                 
                 # For 3D bar, we typically show average force for the selected tooth
-                _ , avg_force_series = self.processor.get_average_force_for_tooth(self.selected_tooth_id_3dbar)
                 current_avg_force = 0.0
-                if self.timestamps and len(avg_force_series) == len(self.timestamps):
-                    try:
-                        # Find the index for the current timestamp
-                        time_idx_info = np.argmin(np.abs(np.array(self.timestamps) - timestamp_for_info))
-                        current_avg_force = avg_force_series[time_idx_info]
-                    except Exception as e:
-                        logging.debug(f"3DBarVizQt: Error getting avg force for info panel: {e}")
+                tooth_avgs = self.processor.get_tooth_average_forces_at_time(timestamp_for_info)
+                if self.selected_tooth_id_3dbar in self.processor.tooth_ids and len(tooth_avgs) == len(self.processor.tooth_ids):
+                    current_avg_force = tooth_avgs[self.processor.tooth_ids.index(self.selected_tooth_id_3dbar)]
                 
                 detail_info_text = (f"3D Bar - Tooth ID: {self.selected_tooth_id_3dbar}\n"
                                     f"Avg Force @ {timestamp_for_info:.1f}s: {current_avg_force:.1f} N")
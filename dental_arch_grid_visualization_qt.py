@@ -1,10 +1,29 @@
 import numpy as np
-from vedo import Text2D, Line, Rectangle, Text3D, Grid, Sphere, colors # Plotter not imported here
+from vedo import Text2D, Line, Rectangle, Text3D, Sphere, Mesh, colors # Plotter not imported here
 import logging
+import vtk
+from cached_text_labels import CachedLabelSet, get_numeric_table
+from frame_state import build_frame_state
+from sensor_geometry import tooth_geometries
+from tooth_numbering import processor_arch_config, dual_arch_centers, balance_weights, balance_percentages, format_balance, tooth_label
+from perf_instrumentation import PERF
+from vtk.util.numpy_support import vtk_to_numpy, numpy_to_vtk, numpy_to_vtkIdTypeArray
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+
+def _cell_scale_for_arch_x(norm_x):
+    """(width, height) scale of a tooth cell from its distance to the midline (0 at the centre, 1 at the arch end)."""
+    if norm_x > 0.75: return 1.35, 0.85
+    if norm_x > 0.50: return 1.1, 1.0
+    if norm_x < 0.10: return 0.70, 1.20
+    if norm_x < 0.35: return 0.85, 1.10
+    return 1.0, 1.0
+
+
 class DentalArchGridVisualizerQt:
+    compute_cof_on_setup = True # setup_scene computes the processor's COF trajectory for this layout
+
     def __init__(self, processor, parent_plotter_instance, renderer_index):
         self.processor = processor
         self.parent_plotter = parent_plotter_instance
@@ -13,6 +32,9 @@ class DentalArchGridVisualizerQt:
 
         if self.processor.cleaned_data is None: self.processor.create_force_matrix()
         self.num_data_teeth = len(self.processor.tooth_ids) if self.processor.tooth_ids else 0
+        # Arch/side/position of each tooth from its number (None when the ids follow no known numbering)
+        self.tooth_numbering, self._tooth_positions, self.dual_arch = processor_arch_config(self.processor)
+        self.display_numbering = getattr(self.processor, 'display_numbering', None)
         
         self.arch_layout_width = 16.0
         self.arch_layout_depth = 10.0
@@ -27,13 +49,23 @@ class DentalArchGridVisualizerQt:
 
         self.grid_outline_actors = {} 
         self.tooth_label_actors = {}  
-        self.intra_tooth_heatmap_actors_list = [] 
-        self.force_percentage_actors_list = []    
-        self.force_percentage_bg_actors_list = [] 
+        # Dynamic actors are created once (_initialize_dynamic_elements) and updated in place by render_arch
+        self.dynamic_elements_initialized = False
+        # All tooth heatmaps live in one mesh: point scalars come from one fancy index, picking maps cell id -> tooth id
+        self.heatmap_mesh_actor = None; self.heatmap_scalar_array = None; self.heatmap_scalar_view = None
+        self._heatmap_point_sources = None; self._heatmap_cell_tooth_ids = None
+        self.percentage_labels = None; self.lr_percentage_labels = None # CachedLabelSet: one text actor per label group
+        self._tooth_column_ranges = {}
+        self._left_side_weights = None; self._right_side_weights = None; self._lr_bar_geometry = {}
+        self._percentage_table = None # NumericLabelTable for the per-tooth percentages (vectorized label updates)
+        self.balance_text_actor = None; self._balance_weights = None; self._balance_arches = (); self._balance_text = None
+        self._highlighted_tooth_id = None
         self.left_right_bar_actor_left = None; self.left_right_bar_actor_right = None
         self.left_bar_label_actor = None; self.right_bar_label_actor = None
-        self.left_bar_percentage_actor = None; self.right_bar_percentage_actor = None
         self.cof_trajectory_line_actor = None; self.cof_current_marker_actor = None; self.time_text_actor = None   
+        # COF trail: persistent polyline over a growable point buffer; only new points are copied, seeks only re-slice ids
+        self.cof_trail_window_s = None # None = whole history, otherwise only the last N seconds are drawn
+        self._cof_trail_pts = None; self._cof_trail_ids = None; self._cof_trail_loaded = 0; self._cof_trail_range = None
         self.selected_tooth_info_text_actor = None        
         self.main_app_window_ref = None # Will be set by EmbeddedVedoMultiViewWidget
 
@@ -43,7 +75,7 @@ class DentalArchGridVisualizerQt:
             return 
         
         # Layout definitions are created here, ready for setup_scene
-        self.tooth_cell_definitions = self._define_explicit_tscan_layout(self.num_data_teeth)
+        self.tooth_cell_definitions = self._define_dual_arch_layout() if self.dual_arch else self._define_explicit_tscan_layout(self.num_data_teeth)
 
         if self.parent_plotter and self.parent_plotter.interactor: # Use parent_plotter
             # Example for making grid view strictly 2D interactive
@@ -100,8 +132,9 @@ class DentalArchGridVisualizerQt:
         cam.SetFreezeFocalPoint(True)
         logging.info(f"GridVizQt (R{self.renderer_index}): Camera setup complete. Focal point frozen. Locked params stored.")
         
-        if self.tooth_cell_definitions and hasattr(self.processor, 'calculate_cof_trajectory'):
+        if self.compute_cof_on_setup and self.tooth_cell_definitions and hasattr(self.processor, 'calculate_cof_trajectory'):
             self.processor.calculate_cof_trajectory(self.tooth_cell_definitions)
+        self._initialize_dynamic_elements()
         
         # if self.parent_plotter and hasattr(self, '_on_mouse_click'):
         #      self.parent_plotter.add_callback('mouse click', self._on_mouse_click)
@@ -139,7 +172,7 @@ class DentalArchGridVisualizerQt:
             if hasattr(outline, 'actor'): self.renderer.AddActor(outline.actor)
 
             lbl_pos=(cx,cy+h*0.5+0.2); txt_s=h*0.30; txt_s=max(0.25,min(txt_s,0.5)) 
-            lbl=Text3D(str(tooth_id),pos=(lbl_pos[0],lbl_pos[1],0.12),s=txt_s,c=(0.05,0.05,0.3),justify='cc',depth=0.01)
+            lbl=Text3D(tooth_label(tooth_id,self.tooth_numbering,self.display_numbering),pos=(lbl_pos[0],lbl_pos[1],0.12),s=txt_s,c=(0.05,0.05,0.3),justify='cc',depth=0.01)
             lbl.name = f"Label_Tooth_{tooth_id}"; lbl.pickable = False 
             self.tooth_label_actors[tooth_id]=lbl
             # --- CORRECTED: Add individual VTK actor ---
@@ -159,117 +192,100 @@ class DentalArchGridVisualizerQt:
         #     an_actor = actor_collection.GetNextActor()
         # --- END CORRECTED LOGGING ---
 
-    def render_arch(self, timestamp): # Updates actors on self.renderer
+    def _initialize_dynamic_elements(self):
+        """Creates every per-frame actor once; render_arch only updates them in place afterwards."""
         if not self.tooth_cell_definitions or not self.renderer: return
-        self.parent_plotter.at(self.renderer_index) # Set active renderer for parent plotter context
-        
-        # 1. Clear all previously added dynamic actors from this frame from self.renderer
-        actors_to_remove_vtk = []
-        if self.time_text_actor: actors_to_remove_vtk.append(self.time_text_actor.actor)
-        for act_list in [self.intra_tooth_heatmap_actors_list, 
-                         self.force_percentage_bg_actors_list, 
-                         self.force_percentage_actors_list]:
-            for act in act_list: actors_to_remove_vtk.append(act.actor)
-        
-        dynamic_lr_actors = [self.left_right_bar_actor_left, self.left_right_bar_actor_right,
-                             self.left_bar_label_actor, self.right_bar_label_actor,
-                             self.left_bar_percentage_actor, self.right_bar_percentage_actor,
-                             self.cof_trajectory_line_actor, self.cof_current_marker_actor,
-                             self.selected_tooth_info_text_actor]
-        for act in dynamic_lr_actors:
-            if act: actors_to_remove_vtk.append(act.actor)
-        
-        for vtk_act in actors_to_remove_vtk: # Remove VTK actors
-            if vtk_act: self.renderer.RemoveActor(vtk_act)
-
-        # Reset Python lists/references
-        self.intra_tooth_heatmap_actors_list.clear(); self.force_percentage_bg_actors_list.clear(); self.force_percentage_actors_list.clear()
-        self.time_text_actor=None; self.left_right_bar_actor_left=None; self.left_right_bar_actor_right=None
-        self.left_bar_label_actor=None; self.right_bar_label_actor=None; self.left_bar_percentage_actor=None; self.right_bar_percentage_actor=None
-        self.cof_trajectory_line_actor=None; self.cof_current_marker_actor=None; self.selected_tooth_info_text_actor = None
-        
-        # 2. Create and collect all new actors for the current frame
-        current_actors_to_add_vedo_objects = [] # Store Vedo objects
-        
-        self.time_text_actor = Text2D(f"Time: {timestamp:.1f}s",pos="bottom-left",c='k',bg=(1,1,1),alpha=0.7,s=0.7)
-        current_actors_to_add_vedo_objects.append(self.time_text_actor)
-        
-        ordered_pairs, forces_all_sensor_points = self.processor.get_all_forces_at_time(timestamp)
-        if not ordered_pairs: 
-            if current_actors_to_add_vedo_objects and self.renderer:
-                 for vo in current_actors_to_add_vedo_objects: self.renderer.AddActor(vo.actor)
-            return
-        
-        # ... (rest of logic to calculate forces, create heatmaps, percentages, L/R bars, COF) ...
-        # ... (When creating actors, append the Vedo object to current_actors_to_add_vedo_objects) ...
-        force_map_all_sensors = {p:f for p,f in zip(ordered_pairs,forces_all_sensor_points)}
-        total_force_on_arch_this_step = sum(f for f in forces_all_sensor_points if np.isfinite(f) and f > 0); total_force_on_arch_this_step = max(total_force_on_arch_this_step,1e-6)
-        force_left_side=0; force_right_side=0
-        for _layout_idx, cell_prop in self.tooth_cell_definitions.items():
-            tooth_id = cell_prop['actual_id']
-            outline_actor = self.grid_outline_actors.get(tooth_id) 
-            if outline_actor:
-                if self.selected_tooth_id_grid == tooth_id: outline_actor.color('lime').lw(3.0).alpha(1.0) 
-                else: outline_actor.color((0.3,0.3,0.3)).lw(1.0).alpha(0.8)
-            current_tooth_total_force = 0
-            sensor_ids_for_this_tooth = [spid for tid,spid in self.processor.ordered_tooth_sensor_pairs if tid==tooth_id]
-            forces_on_this_tooth_sensors = {spid: np.nan_to_num(force_map_all_sensors.get((tooth_id,spid),0.0)) for spid in sensor_ids_for_this_tooth}
-            current_tooth_total_force = sum(forces_on_this_tooth_sensors.values())
-            if cell_prop['center'][0] < -0.01: force_right_side += current_tooth_total_force
-            elif cell_prop['center'][0] > 0.01: force_left_side += current_tooth_total_force
-            else: force_left_side+=current_tooth_total_force/2.0; force_right_side+=current_tooth_total_force/2.0
-            heatmap_actor = self._create_intra_tooth_heatmap(cell_prop, forces_on_this_tooth_sensors)
-            if heatmap_actor:
-                if self.selected_tooth_id_grid == tooth_id: heatmap_actor.alpha(1.0)
-                else: heatmap_actor.alpha(0.75)
-                self.intra_tooth_heatmap_actors_list.append(heatmap_actor) 
-            perc = (current_tooth_total_force/total_force_on_arch_this_step)*100
-            text_s = cell_prop['height']*0.20; text_s = max(0.20,min(text_s,0.45)) 
-            perc_pos_xy = (cell_prop['center'][0],cell_prop['center'][1]-cell_prop['height']*0.70); pz = 0.16 
-            num_chars=len(f"{perc:.1f}%"); bg_w_est=text_s*num_chars*0.50; bg_h_est=text_s*1.0
-            bg_w_est=max(cell_prop['width']*0.25,bg_w_est); bg_h_est=max(cell_prop['height']*0.15,bg_h_est)
-            p1_bg=(perc_pos_xy[0]-bg_w_est/2,perc_pos_xy[1]-bg_h_est/2);p2_bg=(perc_pos_xy[0]+bg_w_est/2,perc_pos_xy[1]+bg_h_est/2)
-            pbg_rgb=(0.95,0.95,0.85);pbg_a=0.75
-            p_bg=Rectangle(p1_bg,p2_bg,c=pbg_rgb,alpha=pbg_a);p_bg.z(pz-0.02) 
-            self.force_percentage_bg_actors_list.append(p_bg)
-            p_lbl=Text3D(f"{perc:.1f}%",pos=(perc_pos_xy[0],perc_pos_xy[1],pz),s=text_s,c='k',justify='cc',depth=0.01) 
-            self.force_percentage_actors_list.append(p_lbl)
-        
-        current_actors_to_add_vedo_objects.extend(self.intra_tooth_heatmap_actors_list)
-        current_actors_to_add_vedo_objects.extend(self.force_percentage_bg_actors_list)
-        current_actors_to_add_vedo_objects.extend(self.force_percentage_actors_list)
-
-        perc_l=(force_left_side/total_force_on_arch_this_step)*100; perc_r=(force_right_side/total_force_on_arch_this_step)*100
-        if self.tooth_cell_definitions:
-            min_y_overall=min(p['center'][1]-p['height']/2 for p in self.tooth_cell_definitions.values())
-            bar_base_y=min_y_overall-1.8; bar_overall_width=self.arch_layout_width*0.30; bar_max_h=0.8 
-            left_bar_h=max(0.02,(perc_l/100.0)*bar_max_h); right_bar_h=max(0.02,(perc_r/100.0)*bar_max_h)
-            bar_label_s=0.25; bar_perc_s=0.22
-            bar_z=0.05; text_on_bar_z=bar_z+0.02; label_above_bar_z=bar_z+0.03
-            l_bar_cx=-bar_overall_width*0.8; l_p1=(l_bar_cx-bar_overall_width/2,bar_base_y); l_p2=(l_bar_cx+bar_overall_width/2,bar_base_y+left_bar_h)
-            self.left_right_bar_actor_left=Rectangle(l_p1,l_p2,c='g',alpha=0.85).z(bar_z)
-            left_label_pos=(l_bar_cx,bar_base_y+left_bar_h+0.20,label_above_bar_z); self.left_bar_label_actor=Text3D("Left",pos=left_label_pos,s=bar_label_s,c='k',justify='cb',depth=0.01)
-            if left_bar_h>0.02: left_perc_pos=(l_bar_cx,bar_base_y+left_bar_h/2,text_on_bar_z); self.left_bar_percentage_actor=Text3D(f"{perc_l:.0f}%",pos=left_perc_pos,s=bar_perc_s,c='w',justify='cc',depth=0.01)
-            else: self.left_bar_percentage_actor = None
-            r_bar_cx=bar_overall_width*0.8; r_p1=(r_bar_cx-bar_overall_width/2,bar_base_y); r_p2=(r_bar_cx+bar_overall_width/2,bar_base_y+right_bar_h)
-            self.left_right_bar_actor_right=Rectangle(r_p1,r_p2,c='r',alpha=0.85).z(bar_z)
-            right_label_pos=(r_bar_cx,bar_base_y+right_bar_h+0.20,label_above_bar_z); self.right_bar_label_actor=Text3D("Right",pos=right_label_pos,s=bar_label_s,c='k',justify='cb',depth=0.01)
-            if right_bar_h > 0.02: right_perc_pos=(r_bar_cx,bar_base_y+right_bar_h/2,text_on_bar_z); self.right_bar_percentage_actor=Text3D(f"{perc_r:.0f}%",pos=right_perc_pos,s=bar_perc_s,c='w',justify='cc',depth=0.01)
-            else: self.right_bar_percentage_actor = None
-            current_actors_to_add_vedo_objects.extend(filter(None,[self.left_right_bar_actor_left,self.left_bar_label_actor,self.left_bar_percentage_actor, self.left_right_bar_actor_right,self.right_bar_label_actor,self.right_bar_percentage_actor]))
-        
-        cof_pts=self.processor.get_cof_up_to_timestamp(timestamp)
-        if len(cof_pts)>1: cof_ln_pts=[(p[0],p[1],0.25) for p in cof_pts];self.cof_trajectory_line_actor=Line(cof_ln_pts,c=(0.8,0.1,0.8),lw=2,alpha=0.6); current_actors_to_add_vedo_objects.append(self.cof_trajectory_line_actor)
-        if cof_pts: cx_cof,cy_cof=cof_pts[-1];self.cof_current_marker_actor=Sphere(pos=(cx_cof,cy_cof,0.27),r=0.10,c='darkred',alpha=0.9); current_actors_to_add_vedo_objects.append(self.cof_current_marker_actor)
-        
-        if current_actors_to_add_vedo_objects and self.renderer: 
-            for vedo_obj in current_actors_to_add_vedo_objects:
-                if hasattr(vedo_obj, 'actor'): # Check if it's a Vedo object with a .actor attribute
-                    self.renderer.AddActor(vedo_obj.actor)
-                else: # Should not happen for Vedo shapes
-                    logging.warning(f"Trying to add non-actor to renderer: {type(vedo_obj)}")
-        # No self.renderer.render() - let Qt widget handle it.
-        
+        if self.parent_plotter: self.parent_plotter.at(self.renderer_index)
+        new_vedo_objects = []
+
+        self.time_text_actor = Text2D("Time: 0.0s",pos="bottom-left",c='k',bg=(1,1,1),alpha=0.7,s=0.7)
+        new_vedo_objects.append(self.time_text_actor)
+
+        custom_cmap_rgb = ['darkblue', (0,0,1), (0,1,0), (1,1,0), (1,0,0)] 
+        vmax_cmap = max(self.max_force_for_scaling, 1.0) # Avoid vmax=0 for colormap
+        num_pairs = len(self.processor.ordered_tooth_sensor_pairs)
+        col_starts = list(self.processor.tooth_column_starts) + [num_pairs]
+        geometries = tooth_geometries(self.processor)
+        heatmap_points, heatmap_faces, point_sources, cell_tooth_ids = [], [], [], []; num_points = 0
+        perc_positions, perc_sizes, perc_bg_min_sizes = [], [], []
+        for layout_idx, cell_prop in self.tooth_cell_definitions.items():
+            tooth_id=cell_prop['actual_id']; cx,cy=cell_prop['center']; cw,ch=cell_prop['width'],cell_prop['height']
+            col_start, col_stop = int(col_starts[layout_idx]), int(col_starts[layout_idx+1])
+            self._tooth_column_ranges[tooth_id] = (col_start, col_stop)
+
+            # Heatmap: one point per sensor of the tooth's grid (row 0 at the top), spread over the cell (slightly smaller than
+            # the outline, z=0.05 to be above it) with quads between neighbours; VTK interpolates the colours in between
+            lattice_rows, lattice_cols, sensor_idx = geometries[tooth_id].lattice_sources()
+            hw, hh = cw*0.96/2, ch*0.96/2
+            px, py = np.meshgrid(np.linspace(cx-hw, cx+hw, lattice_cols), np.linspace(cy+hh, cy-hh, lattice_rows))
+            heatmap_points.append(np.column_stack((px.ravel(), py.ravel(), np.full(px.size, 0.05))))
+            r, c = np.divmod(np.arange((lattice_rows-1)*(lattice_cols-1)), lattice_cols-1)
+            top_left = num_points + r*lattice_cols + c
+            heatmap_faces.append(np.column_stack((top_left+lattice_cols, top_left+lattice_cols+1, top_left+1, top_left))) # BL, BR, TR, TL
+            point_sources.append(col_start + sensor_idx); cell_tooth_ids.append(np.full(len(top_left), tooth_id))
+            num_points += px.size
+
+            # Percentage label below the cell; its background is sized from the measured text width
+            text_s = ch*0.20; text_s = max(0.20,min(text_s,0.45))
+            perc_positions.append((cx, cy-ch*0.70, 0.16)); perc_sizes.append(text_s)
+            perc_bg_min_sizes.append((cw*0.25, max(ch*0.15, text_s*1.0)))
+
+        heatmap_points, heatmap_faces = np.vstack(heatmap_points), np.vstack(heatmap_faces)
+        self.heatmap_mesh_actor = Mesh([heatmap_points, heatmap_faces]).lw(0)
+        self.heatmap_mesh_actor.name = "Heatmap_Arch"; self.heatmap_mesh_actor.pickable = True
+        self.heatmap_mesh_actor.pointdata["forces"] = np.zeros(len(heatmap_points), dtype=float)
+        self.heatmap_mesh_actor.cmap(custom_cmap_rgb, "forces", vmin=0, vmax=vmax_cmap).alpha(0.75) # One shared LUT, fixed range
+        self.heatmap_scalar_array = self.heatmap_mesh_actor.dataset.GetPointData().GetScalars()
+        self.heatmap_scalar_view = vtk_to_numpy(self.heatmap_scalar_array) # numpy view sharing the VTK buffer
+        self._heatmap_point_sources = np.concatenate(point_sources).astype(np.intp)
+        self._heatmap_cell_tooth_ids = np.concatenate(cell_tooth_ids)
+        new_vedo_objects.insert(1, self.heatmap_mesh_actor)
+
+        self.percentage_labels = CachedLabelSet(perc_positions, perc_sizes, c='k', max_chars=6,
+                                                background_color=(0.95,0.95,0.85), background_alpha=0.75,
+                                                background_min_sizes=perc_bg_min_sizes)
+        new_vedo_objects.extend(self.percentage_labels.actors)
+        self._percentage_table = get_numeric_table(self.percentage_labels.glyph_cache, self.percentage_labels.max_chars)
+
+        if self._tooth_positions is not None: # Patient sides from the tooth numbers, plus arch-wise and anterior/posterior balance
+            left = np.array([p.side == 'L' for p in self._tooth_positions], dtype=float)
+            self._left_side_weights, self._right_side_weights = left, 1.0 - left
+            self._balance_weights = balance_weights(self._tooth_positions)
+            self._balance_arches = tuple(a for a in ('upper', 'lower') if any(p.arch == a for p in self._tooth_positions))
+            self.balance_text_actor = Text2D("",pos="top-left",c='k',bg=(1,1,1),alpha=0.7,s=0.6)
+            new_vedo_objects.append(self.balance_text_actor)
+        else: # Left/Right share of the total force per tooth from the layout (midline teeth split evenly)
+            centers_x = np.array([self.tooth_cell_definitions[i]['center'][0] for i in range(len(self.tooth_cell_definitions))])
+            self._left_side_weights = np.where(centers_x > 0.01, 1.0, np.where(centers_x < -0.01, 0.0, 0.5))
+            self._right_side_weights = np.where(centers_x < -0.01, 1.0, np.where(centers_x > 0.01, 0.0, 0.5))
+
+        # L/R distribution bars: unit-height rectangles scaled in y per frame
+        min_y_overall = min(p['center'][1]-p['height']/2 for p in self.tooth_cell_definitions.values())
+        bar_overall_width = self.arch_layout_width*0.30
+        self._lr_bar_geometry = {'base_y': min_y_overall-1.8, 'max_h': 0.8, 'z': 0.05,
+                                 'left_cx': -bar_overall_width*0.8, 'right_cx': bar_overall_width*0.8}
+        bar_actors = {}
+        for side, clr, label in (('left', 'g', "Left"), ('right', 'r', "Right")):
+            bar_cx = self._lr_bar_geometry[f'{side}_cx']
+            bar = Rectangle((bar_cx-bar_overall_width/2,0),(bar_cx+bar_overall_width/2,1),c=clr,alpha=0.85)
+            bar.actor.SetPosition(0, self._lr_bar_geometry['base_y'], self._lr_bar_geometry['z'])
+            lbl = Text3D(label,pos=(0,0,0),s=0.25,c='k',justify='cb',depth=0.01)
+            bar_actors[side] = (bar, lbl); new_vedo_objects.extend([bar, lbl])
+        self.left_right_bar_actor_left, self.left_bar_label_actor = bar_actors['left']
+        self.left_right_bar_actor_right, self.right_bar_label_actor = bar_actors['right']
+        self.lr_percentage_labels = CachedLabelSet([(0,0,0),(0,0,0)], 0.22, c='w', max_chars=4) # 0 = left, 1 = right
+        new_vedo_objects.extend(self.lr_percentage_labels.actors)
+
+        # COF trail and current-position marker (hidden until there is COF data)
+        self.cof_trajectory_line_actor = Line([(0,0,0.25),(0,0,0.25)],c=(0.8,0.1,0.8),lw=2,alpha=0.6)
+        self.cof_current_marker_actor = Sphere(pos=(0,0,0),r=0.10,c='darkred',alpha=0.9)
+        self.cof_trajectory_line_actor.actor.SetVisibility(False); self.cof_current_marker_actor.actor.SetVisibility(False)
+        self._reserve_cof_trail_capacity(max(len(self.processor.cof_xy), 256))
+        new_vedo_objects.extend([self.cof_trajectory_line_actor, self.cof_current_marker_actor])
+
+        for vo in new_vedo_objects: self.renderer.AddActor(vo.actor)
+        self.dynamic_elements_initialized = True
+        logging.info(f"GridVizQt (R{self.renderer_index}): {len(new_vedo_objects)} persistent dynamic actors created.")
 
 
     def _fit_camera_to_grid(self): 
@@ -336,248 +352,138 @@ class DentalArchGridVisualizerQt:
             actual_id = self.processor.tooth_ids[i]; center_xy = arch_centers_xy[i]
             current_w = base_cell_w; current_h = base_cell_h
             norm_x = abs(center_xy[0]) / (base_arch_w_centers / 2.0) if base_arch_w_centers > 0 else 0
-            w_scale=1.0; h_scale=1.0
-            if norm_x > 0.75: w_scale=1.35; h_scale=0.85
-            elif norm_x > 0.50: w_scale=1.1; h_scale=1.0
-            elif norm_x < 0.10: w_scale=0.70; h_scale=1.20
-            elif norm_x < 0.35: w_scale=0.85; h_scale=1.10
+            w_scale, h_scale = _cell_scale_for_arch_x(norm_x)
             final_w=current_w*w_scale; final_h=current_h*h_scale
             final_w=max(0.6,final_w); final_h=max(0.8,final_h)
             layout[i]={'center':center_xy,'width':final_w,'height':final_h,'actual_id':actual_id}
         return layout
 
-    def _create_intra_tooth_heatmap(self, cell_prop, forces_on_this_tooth_sensors):
-        # This method creates and returns a new Grid actor for the heatmap.
-        # It's called by render_arch each frame in the "recreate actors" model.
-
-        if not forces_on_this_tooth_sensors: 
-            # logging.debug(f"No forces_on_this_tooth_sensors for cell {cell_prop.get('actual_id', 'Unknown')}")
-            return None
-        
-        # --- DEFINE num_sp AT THE BEGINNING of the function's logic ---
-        num_sp = len(forces_on_this_tooth_sensors)
-        if num_sp == 0: 
-            # logging.debug(f"Zero sensor points with force data for cell {cell_prop.get('actual_id', 'Unknown')}")
-            return None # No data to create a heatmap from
-        # --- END DEFINITION ---
-        
-        cx, cy = cell_prop['center']
-        cw, ch = cell_prop['width'], cell_prop['height']
-        
-        # For a 2x2 point grid (4 points total, forming 1 quad cell for heatmap)
-        # we need 1 division in x and 1 division in y for the Grid constructor.
-        heatmap_grid_resolution_param = (1, 1) 
-        heatmap_grid = Grid(s=[cw * 0.96, ch * 0.96], res=heatmap_grid_resolution_param) # Slightly smaller
-        heatmap_grid.pos(cx, cy, 0.05).lw(0).alpha(0.95) # z=0.05 to be above outline slightly
-        heatmap_grid.name = f"Heatmap_Tooth_{cell_prop['actual_id']}"
-        heatmap_grid.pickable = True 
-        
-        grid_points_forces = np.zeros(heatmap_grid.npoints, dtype=float) # npoints should be 4 for res=(1,1)
-
-        # Mapping 4 sensor forces to the 4 points of the Grid (res=(1,1))
-        # Vedo Grid point order for res=(1,1) (a single cell with 4 points):
-        # Point 0: Bottom-Left (-sx/2, -sy/2) relative to grid center
-        # Point 1: Bottom-Right ( sx/2, -sy/2)
-        # Point 2: Top-Left    (-sx/2,  sy/2)
-        # Point 3: Top-Right   ( sx/2,  sy/2)
-        # Assuming sensor_point_id 1, 2, 3, 4 in data map to a visual TL, TR, BL, BR
-        if num_sp == 4: # Ensure we have exactly 4 forces for this specific mapping
-            grid_points_forces[2] = forces_on_this_tooth_sensors.get(1, 0.0) # Sensor 1 (TL) -> Grid Point 2 (Top-Left)
-            grid_points_forces[3] = forces_on_this_tooth_sensors.get(2, 0.0) # Sensor 2 (TR) -> Grid Point 3 (Top-Right)
-            grid_points_forces[0] = forces_on_this_tooth_sensors.get(3, 0.0) # Sensor 3 (BL) -> Grid Point 0 (Bottom-Left)
-            grid_points_forces[1] = forces_on_this_tooth_sensors.get(4, 0.0) # Sensor 4 (BR) -> Grid Point 1 (Bottom-Right)
-        elif num_sp > 0: # Fallback if not exactly 4 sensor points (e.g. 1, 2, or 3)
-            avg_force = np.mean(list(forces_on_this_tooth_sensors.values()))
-            grid_points_forces.fill(avg_force)
-        # If num_sp is 0 (already handled by early return), grid_points_forces would remain all zeros.
-        
-        heatmap_grid.pointdata["forces"] = np.nan_to_num(grid_points_forces)
-        
-        custom_cmap_rgb = ['darkblue', (0,0,1), (0,1,0), (1,1,0), (1,0,0)] 
-        vmax_cmap = max(self.max_force_for_scaling, 1.0) # Avoid vmax=0 for colormap
-        heatmap_grid.cmap(custom_cmap_rgb, "forces", vmin=0, vmax=vmax_cmap)
-        
-        return heatmap_grid
-
-    def render_arch(self, timestamp):
-        if not self.tooth_cell_definitions or not self.renderer: 
-            if self.renderer and hasattr(self.renderer, 'GetRenderWindow') and self.renderer.GetRenderWindow(): # Check if renderer has window
-                 # If called via EmbeddedVedoWidget.update_view, this render might be handled there.
-                 # Only render if it's a direct call and the window exists.
-                 # self.renderer.GetRenderWindow().Render() 
-                 pass 
-            return
-        
-        # Activate this visualizer's renderer context via the parent plotter
-        if self.parent_plotter:
-            self.parent_plotter.at(self.renderer_index)
+    def _define_dual_arch_layout(self):
+        """Maxillary arch above, mandibular arch mirrored below; every tooth sits in the slot of its number (up to 32 teeth)."""
+        arch_w = self.arch_layout_width*0.80; arch_d = self.arch_layout_depth*0.45
+        base_cell_w = max(0.7, arch_w/16*0.90); base_cell_h = max(0.9, base_cell_w*1.1) # 8 slots per side
+        centers = dual_arch_centers(self._tooth_positions, arch_w, arch_d, arch_gap=1.5*base_cell_h + 1.0) # Gap fits the labels between the molars
+        layout = {}
+        for i, (actual_id, center_xy) in enumerate(zip(self.processor.tooth_ids, centers)):
+            w_scale, h_scale = _cell_scale_for_arch_x(abs(center_xy[0]) / (arch_w/2.0))
+            layout[i] = {'center': center_xy, 'width': max(0.6, base_cell_w*w_scale), 'height': max(0.8, base_cell_h*h_scale),
+                         'actual_id': actual_id, 'arch': self._tooth_positions[i].arch}
+        logging.info(f"GridVizQt (R{self.renderer_index}): Dual-arch layout for {len(layout)} teeth ({self.tooth_numbering} numbering).")
+        return layout
 
-        # 1. Clear all DYNAMIC actors from the previous frame from self.renderer
-        actors_to_remove_vtk = [] 
-        
-        # Time text is always recreated
-        if self.time_text_actor: actors_to_remove_vtk.append(self.time_text_actor.actor)
-        
-        # Actors stored in lists are fully recreated
-        for actor_list in [self.intra_tooth_heatmap_actors_list, 
-                           self.force_percentage_bg_actors_list, 
-                           self.force_percentage_actors_list]:
-            for act in actor_list: 
-                if hasattr(act, 'actor'): actors_to_remove_vtk.append(act.actor)
-        
-        # L/R bar related actors are fully recreated
-        lr_actors_to_clear_refs = [
-            self.left_right_bar_actor_left, self.left_right_bar_actor_right,
-            self.left_bar_label_actor, self.right_bar_label_actor,
-            self.left_bar_percentage_actor, self.right_bar_percentage_actor,
-            self.cof_trajectory_line_actor, self.cof_current_marker_actor,
-            self.selected_tooth_info_text_actor # This is also dynamic based on click
-        ]
-        for act in lr_actors_to_clear_refs:
-            if act and hasattr(act, 'actor'): actors_to_remove_vtk.append(act.actor)
-        
-        for vtk_act in actors_to_remove_vtk: 
-            if vtk_act: self.renderer.RemoveActor(vtk_act)
-
-        # Reset Python lists/references for actors that are recreated each frame
-        self.intra_tooth_heatmap_actors_list.clear() 
-        self.force_percentage_bg_actors_list.clear() 
-        self.force_percentage_actors_list.clear()
-        self.time_text_actor=None; self.left_right_bar_actor_left=None; self.left_right_bar_actor_right=None
-        self.left_bar_label_actor=None; self.right_bar_label_actor=None; self.left_bar_percentage_actor=None; self.right_bar_percentage_actor=None
-        self.cof_trajectory_line_actor=None; self.cof_current_marker_actor=None
-        # self.selected_tooth_info_text_actor is handled by _on_mouse_click for its recreation/removal
-
-        # This list will collect Vedo objects of NEW actors to be added in THIS frame
-        current_vedo_objects_to_add = [] 
-        
-        # Create and add Time Text
-        self.time_text_actor = Text2D(f"Time: {timestamp:.1f}s",pos="bottom-left",c='k',bg=(1,1,1),alpha=0.7,s=0.7)
-        current_vedo_objects_to_add.append(self.time_text_actor)
-        
-        # Fetch forces for the current timestamp
-        ordered_pairs, forces_all_sensor_points = self.processor.get_all_forces_at_time(timestamp)
-        if not ordered_pairs: 
-            if current_vedo_objects_to_add and self.renderer:
-                for vo in current_vedo_objects_to_add: self.renderer.AddActor(vo.actor)
-            # No explicit render call here; let the Qt widget handle it
-            return
-        
-        force_map_all_sensors = {p:f for p,f in zip(ordered_pairs,forces_all_sensor_points)}
-        total_force_on_arch_this_step = sum(f for f in forces_all_sensor_points if np.isfinite(f) and f > 0)
-        total_force_on_arch_this_step = max(total_force_on_arch_this_step, 1e-6)
-        
-        force_left_side = 0.0
-        force_right_side = 0.0
+    def render_arch(self, timestamp): # Updates the persistent actors in place; nothing is created or removed per frame
+        if self.processor.force_matrix is None or self.processor.force_matrix.size == 0: return
+        self.apply_frame_state(build_frame_state(self.processor, self.processor.get_time_index(timestamp)), timestamp)
 
-        # Loop through tooth cells to update/create heatmaps and per-tooth percentages
-        for _layout_idx, cell_prop in self.tooth_cell_definitions.items():
-            tooth_id = cell_prop['actual_id']
-            
-            # Update Highlight for STATIC Outline Actor (already in renderer)
-            outline_actor = self.grid_outline_actors.get(tooth_id) 
+    def apply_frame_state(self, frame_state, timestamp=None):
+        """Writes a precomputed FrameState into the actors (no per-frame force lookups here)."""
+        if not self.tooth_cell_definitions or not self.renderer: return
+        if not self.dynamic_elements_initialized: self._initialize_dynamic_elements()
+        if self.parent_plotter: self.parent_plotter.at(self.renderer_index)
+        if timestamp is None: timestamp = frame_state.timestamp
+
+        self.time_text_actor.text(f"Time: {timestamp:.1f}s")
+        self._apply_selection_highlight()
+
+        view_state = frame_state.views.get('grid') or self.compute_frame_state(frame_state) # Precomputed by the producer thread when available
+        if view_state is None: return
+
+        with PERF.span('grid.heatmap'):
+            self.heatmap_scalar_view[:] = view_state['heatmap']
+            self.heatmap_scalar_array.Modified()
+
+        with PERF.span('grid.labels'):
+            self.percentage_labels.set_values(view_state['percentages'], self._percentage_table) # All teeth in one vectorized write
+            perc_l, perc_r = view_state['lr']
+            self._update_lr_bar(0, 'left', self.left_right_bar_actor_left, self.left_bar_label_actor, perc_l)
+            self._update_lr_bar(1, 'right', self.left_right_bar_actor_right, self.right_bar_label_actor, perc_r)
+            if self.balance_text_actor is not None and view_state['balance'] != self._balance_text:
+                self.balance_text_actor.text(view_state['balance']); self._balance_text = view_state['balance']
+
+        with PERF.span('grid.cof_trail'): self._update_cof_trail(timestamp, frame_state.cof_count)
+        # The final render call is handled by EmbeddedVedoMultiViewWidget.update_views()
+
+    def compute_frame_state(self, frame_state):
+        """Pure per-view step: heatmap scalars, percentages, L/R shares and balance readout for frame_state. Reads only layout data, so it can run off the GUI thread."""
+        forces = frame_state.forces
+        if forces.size == 0 or self._heatmap_point_sources is None: return None
+        tooth_totals = frame_state.tooth_totals # Aligned with the layout order
+        heatmap = forces[self._heatmap_point_sources] # One vectorized gather over every tooth's sensor grid
+        balance = None
+        if self._balance_weights is not None: balance = format_balance(balance_percentages(tooth_totals, self._balance_weights), self._balance_arches)
+        return {'heatmap': heatmap, 'percentages': frame_state.percentages, 'lr': self.lr_shares(tooth_totals), 'balance': balance}
+
+    def lr_shares(self, tooth_totals):
+        """(left %, right %) of the arch total for per-tooth totals aligned with processor.tooth_ids."""
+        if self._left_side_weights is None: return (0.0, 0.0)
+        total = max(float(np.sum(tooth_totals)), 1e-6)
+        return (float(tooth_totals @ self._left_side_weights) * 100.0 / total, float(tooth_totals @ self._right_side_weights) * 100.0 / total)
+
+    def _update_lr_bar(self, label_idx, side, bar_actor, label_actor, perc):
+        geom = self._lr_bar_geometry; bar_cx = geom[f'{side}_cx']
+        bar_h = max(0.02, (perc/100.0)*geom['max_h'])
+        bar_actor.actor.SetScale(1, bar_h, 1)
+        label_actor.actor.SetPosition(bar_cx, geom['base_y']+bar_h+0.20, geom['z']+0.03)
+        perc_txt = f"{perc:.0f}%" if bar_h > 0.02 else "" # No percentage on a collapsed bar
+        self.lr_percentage_labels.set_label(label_idx, perc_txt, pos=(bar_cx, geom['base_y']+bar_h/2, geom['z']+0.02))
+
+    def _apply_selection_highlight(self):
+        if self._highlighted_tooth_id == self.selected_tooth_id_grid: return
+        for tooth_id in (self._highlighted_tooth_id, self.selected_tooth_id_grid): # Only the old and new selection change
+            if tooth_id is None: continue
+            is_selected = tooth_id == self.selected_tooth_id_grid
+            outline_actor = self.grid_outline_actors.get(tooth_id)
             if outline_actor:
-                if self.selected_tooth_id_grid == tooth_id:
-                    outline_actor.color('lime').lw(3.0).alpha(1.0) 
-                else:
-                    outline_actor.color((0.3,0.3,0.3)).lw(1.0).alpha(0.8)
-            
-            current_tooth_total_force = 0.0
-            sensor_ids_for_this_tooth = [spid for tid,spid in self.processor.ordered_tooth_sensor_pairs if tid==tooth_id]
-            forces_on_this_tooth_sensors = {spid: np.nan_to_num(force_map_all_sensors.get((tooth_id,spid),0.0)) for spid in sensor_ids_for_this_tooth}
-            current_tooth_total_force = sum(forces_on_this_tooth_sensors.values())
-
-            # Accumulate Left/Right forces
-            if cell_prop['center'][0] < -0.01: force_right_side += current_tooth_total_force
-            elif cell_prop['center'][0] > 0.01: force_left_side += current_tooth_total_force
-            else: force_left_side+=current_tooth_total_force/2.0; force_right_side+=current_tooth_total_force/2.0
-            
-            # Create new heatmap actor for this frame
-            heatmap_actor = self._create_intra_tooth_heatmap(cell_prop, forces_on_this_tooth_sensors)
-            if heatmap_actor:
-                if self.selected_tooth_id_grid == tooth_id: heatmap_actor.alpha(1.0) # Apply highlight alpha
-                else: heatmap_actor.alpha(0.75)
-                self.intra_tooth_heatmap_actors_list.append(heatmap_actor) 
-            
-            # Create new per-tooth percentage text and its background for this frame
-            perc = (current_tooth_total_force/total_force_on_arch_this_step)*100
-            text_s = cell_prop['height']*0.20; text_s = max(0.20,min(text_s,0.45)) 
-            perc_pos_xy = (cell_prop['center'][0],cell_prop['center'][1]-cell_prop['height']*0.70); pz = 0.16 
-            num_chars=len(f"{perc:.1f}%"); bg_w_est=text_s*num_chars*0.50; bg_h_est=text_s*1.0 # Heuristic width
-            bg_w_est=max(cell_prop['width']*0.25,bg_w_est); bg_h_est=max(cell_prop['height']*0.15,bg_h_est)
-            p1_bg=(perc_pos_xy[0]-bg_w_est/2,perc_pos_xy[1]-bg_h_est/2);p2_bg=(perc_pos_xy[0]+bg_w_est/2,perc_pos_xy[1]+bg_h_est/2)
-            pbg_rgb=(0.95,0.95,0.85);pbg_a=0.75
-            p_bg=Rectangle(p1_bg,p2_bg,c=pbg_rgb,alpha=pbg_a);p_bg.z(pz-0.02) 
-            self.force_percentage_bg_actors_list.append(p_bg)
-            p_lbl=Text3D(f"{perc:.1f}%",pos=(perc_pos_xy[0],perc_pos_xy[1],pz),s=text_s,c='k',justify='cc',depth=0.01) 
-            self.force_percentage_actors_list.append(p_lbl)
-        
-        # Add collected per-tooth dynamic actors to the main list for this frame's plotter.add()
-        current_vedo_objects_to_add.extend(self.intra_tooth_heatmap_actors_list)
-        current_vedo_objects_to_add.extend(self.force_percentage_bg_actors_list)
-        current_vedo_objects_to_add.extend(self.force_percentage_actors_list)
-
-        # Create L/R Distribution Bars and Text (recreated each frame)
-        perc_l=(force_left_side/total_force_on_arch_this_step)*100
-        perc_r=(force_right_side/total_force_on_arch_this_step)*100
-        
-        if self.tooth_cell_definitions: # This check is good
-            min_y_overall=min(p['center'][1]-p['height']/2 for p in self.tooth_cell_definitions.values())
-            bar_base_y=min_y_overall-1.8; bar_overall_width=self.arch_layout_width*0.30; bar_max_h=0.8 
-            left_bar_h=max(0.02,(perc_l/100.0)*bar_max_h); right_bar_h=max(0.02,(perc_r/100.0)*bar_max_h)
-            bar_label_s=0.25; bar_perc_s=0.22 # Adjusted from previous version
-            bar_z=0.05; text_on_bar_z=bar_z+0.02; label_above_bar_z=bar_z+0.03
-
-            l_bar_cx=-bar_overall_width*0.8; 
-            l_p1=(l_bar_cx-bar_overall_width/2,bar_base_y); l_p2=(l_bar_cx+bar_overall_width/2,bar_base_y+left_bar_h)
-            self.left_right_bar_actor_left=Rectangle(l_p1,l_p2,c='g',alpha=0.85).z(bar_z)
-            left_label_pos=(l_bar_cx,bar_base_y+left_bar_h+0.20,label_above_bar_z); 
-            self.left_bar_label_actor=Text3D("Left",pos=left_label_pos,s=bar_label_s,c='k',justify='cb',depth=0.01)
-            if left_bar_h > 0.02: 
-                left_perc_pos=(l_bar_cx,bar_base_y+left_bar_h/2,text_on_bar_z); 
-                self.left_bar_percentage_actor=Text3D(f"{perc_l:.0f}%",pos=left_perc_pos,s=bar_perc_s,c='w',justify='cc',depth=0.01)
-            else: self.left_bar_percentage_actor = None
-            
-            r_bar_cx=bar_overall_width*0.8; 
-            r_p1=(r_bar_cx-bar_overall_width/2,bar_base_y); r_p2=(r_bar_cx+bar_overall_width/2,bar_base_y+right_bar_h)
-            self.left_right_bar_actor_right=Rectangle(r_p1,r_p2,c='r',alpha=0.85).z(bar_z)
-            right_label_pos=(r_bar_cx,bar_base_y+right_bar_h+0.20,label_above_bar_z); 
-            self.right_bar_label_actor=Text3D("Right",pos=right_label_pos,s=bar_label_s,c='k',justify='cb',depth=0.01)
-            if right_bar_h > 0.02:
-                right_perc_pos=(r_bar_cx,bar_base_y+right_bar_h/2,text_on_bar_z); 
-                self.right_bar_percentage_actor=Text3D(f"{perc_r:.0f}%",pos=right_perc_pos,s=bar_perc_s,c='w',justify='cc',depth=0.01)
-            else: self.right_bar_percentage_actor = None
-            
-            current_vedo_objects_to_add.extend(filter(None,[
-                self.left_right_bar_actor_left,self.left_bar_label_actor,self.left_bar_percentage_actor, 
-                self.left_right_bar_actor_right,self.right_bar_label_actor,self.right_bar_percentage_actor
-            ]))
-        
-        # COF Rendering (recreated)
-        cof_pts=self.processor.get_cof_up_to_timestamp(timestamp)
-        if len(cof_pts)>1: 
-            cof_ln_pts=[(p[0],p[1],0.25) for p in cof_pts] # Ensure Z is high enough
-            self.cof_trajectory_line_actor=Line(cof_ln_pts,c=(0.8,0.1,0.8),lw=2,alpha=0.6)
-            current_vedo_objects_to_add.append(self.cof_trajectory_line_actor)
-        if cof_pts: 
-            cx_cof,cy_cof=cof_pts[-1]
-            self.cof_current_marker_actor=Sphere(pos=(cx_cof,cy_cof,0.27),r=0.10,c='darkred',alpha=0.9)
-            current_vedo_objects_to_add.append(self.cof_current_marker_actor)
-        
-        # Add all collected new actors for this frame to the specific renderer
-        if current_vedo_objects_to_add and self.renderer: 
-            for vo in current_vedo_objects_to_add:
-                if hasattr(vo, 'actor'): # Vedo objects have a .actor attribute for the vtkActor
-                    self.renderer.AddActor(vo.actor)
-                # else: # Should not happen for standard Vedo shapes
-                #     logging.warning(f"GridVizQt: Trying to add non-actor object {type(vo)} to renderer.")
-
-        # The final render call to update the screen is handled by EmbeddedVedoMultiViewWidget.update_views()
-        # which calls self.vedo_canvas.Render() after this method (via self.visualizer.animate()) completes.
-
-
-
-    def animate(self, timestamp_to_render): # Takes timestamp directly
+                if is_selected: outline_actor.color('lime').lw(3.0).alpha(1.0)
+                else: outline_actor.color((0.3,0.3,0.3)).lw(1.0).alpha(0.8)
+        self._highlighted_tooth_id = self.selected_tooth_id_grid
+
+    def _tooth_id_at_heatmap_point(self, picked3d):
+        """Resolves a pick on the merged heatmap mesh to a tooth via its cell id."""
+        if self.heatmap_mesh_actor is None or self._heatmap_cell_tooth_ids is None: return None
+        cell_id = self.heatmap_mesh_actor.closest_point(picked3d, return_cell_id=True)
+        if cell_id is None or not (0 <= cell_id < len(self._heatmap_cell_tooth_ids)): return None
+        return int(self._heatmap_cell_tooth_ids[cell_id])
+
+    def _update_cof_trail(self, timestamp, n_visible=None):
+        """O(new points) per frame: appends newly reached COF points, then re-slices the polyline's id range."""
+        if n_visible is None: n_visible = self.processor.get_cof_count_up_to_timestamp(timestamp)
+        poly = self.cof_trajectory_line_actor.dataset
+        if n_visible > self._cof_trail_loaded: # Points already loaded are reused after a backwards seek
+            self._reserve_cof_trail_capacity(n_visible)
+            self._cof_trail_pts[self._cof_trail_loaded:n_visible, :2] = self.processor.cof_xy[self._cof_trail_loaded:n_visible]
+            self._cof_trail_loaded = n_visible
+            poly.GetPoints().GetData().Modified(); poly.GetPoints().Modified()
+        n_start = 0
+        if self.cof_trail_window_s is not None and n_visible:
+            n_start = int(np.searchsorted(self.processor.cof_times[:n_visible], timestamp - self.cof_trail_window_s, side='left'))
+        if (n_start, n_visible) != self._cof_trail_range:
+            n_line = max(n_visible - n_start, 0)
+            lines = vtk.vtkCellArray() # Connectivity wraps a view of the preallocated id buffer (no copy)
+            if n_line > 1:
+                lines.SetData(numpy_to_vtkIdTypeArray(np.array([0, n_line], dtype=np.int64), deep=True),
+                              numpy_to_vtkIdTypeArray(self._cof_trail_ids[n_start:n_visible], deep=False))
+            poly.SetLines(lines); poly.Modified()
+            self._cof_trail_range = (n_start, n_visible)
+        self.cof_trajectory_line_actor.actor.SetVisibility(n_visible - n_start > 1)
+        if n_visible:
+            cx_cof, cy_cof = self.processor.cof_xy[n_visible-1]
+            self.cof_current_marker_actor.actor.SetPosition(cx_cof, cy_cof, 0.27) # Marker moves by transform only
+        self.cof_current_marker_actor.actor.SetVisibility(n_visible > 0)
+
+    def _reserve_cof_trail_capacity(self, n_points):
+        if self._cof_trail_pts is not None and len(self._cof_trail_pts) >= n_points: return
+        capacity = max(n_points, 2 * (len(self._cof_trail_pts) if self._cof_trail_pts is not None else 0))
+        new_pts = np.zeros((capacity, 3)); new_pts[:, 2] = 0.25 # Ensure Z is high enough
+        if self._cof_trail_pts is not None: new_pts[:self._cof_trail_loaded] = self._cof_trail_pts[:self._cof_trail_loaded]
+        vtk_pts = vtk.vtkPoints(); vtk_pts.SetData(numpy_to_vtk(new_pts, deep=True))
+        self.cof_trajectory_line_actor.dataset.SetPoints(vtk_pts)
+        self._cof_trail_pts = vtk_to_numpy(vtk_pts.GetData()) # Writes go straight into the VTK buffer
+        self._cof_trail_ids = np.arange(capacity, dtype=np.int64)
+        self._cof_trail_range = None # Ids must be re-wrapped against the new buffer
+
+
+    def animate(self, timestamp_to_render, frame_state=None): # Takes timestamp directly, optionally with a prefetched FrameState
         if not self.timestamps: 
             return
         
@@ -586,7 +492,8 @@ class DentalArchGridVisualizerQt:
         # This visualizer just renders the state for the given timestamp_to_render.
         # If you need current_timestamp_idx for some internal logic here, ensure it's set correctly.
         # For now, render_arch directly uses timestamp_to_render.
-        self.render_arch(timestamp_to_render) # Updates actors on self.renderer
+        if frame_state is not None: self.apply_frame_state(frame_state, timestamp_to_render)
+        else: self.render_arch(timestamp_to_render) # Updates actors on self.renderer
 
         # --- Enforce 2D Camera Lock for this view ---
         # This check is done after rendering the current frame's data.
@@ -658,7 +565,9 @@ class DentalArchGridVisualizerQt:
         if event.actor: 
             actor_name = event.actor.name
             logging.info(f"GridVizQt (R{self.renderer_index if hasattr(self, 'renderer_index') else 'N/A'}) Processing Click: Actor '{actor_name}' at {event.picked3d}")
-            if actor_name and (actor_name.startswith("Heatmap_Tooth_") or actor_name.startswith("Outline_Tooth_")):
+            if actor_name == "Heatmap_Arch" and event.picked3d is not None:
+                clicked_tooth_id_parsed = self._tooth_id_at_heatmap_point(event.picked3d)
+            elif actor_name and actor_name.startswith("Outline_Tooth_"):
                 try: clicked_tooth_id_parsed = int(actor_name.split("_")[-1])
                 except ValueError: logging.warning(f"GridVizQt: Could not parse tooth_id from actor: {actor_name}")
         else: 
@@ -738,4 +647,28 @@ class DentalArchGridVisualizerQt:
                     current_t_render = 0.0
                 
                 if current_t_render is not None: 
-                    self.main_app_window_ref.force_render_vedo_views(current_t_render)
\ No newline at end of file
+                    self.main_app_window_ref.force_render_vedo_views(current_t_render)
+
+class DifferenceGridVisualizerQt(DentalArchGridVisualizerQt):
+    """Grid of the change between two sessions (FrameStates holding b - a): diverging heatmap around zero and per-tooth
+    share change in percentage points. L/R bars and the balance readout are hidden (they are shown per session)."""
+    compute_cof_on_setup = False # The COF trail belongs to the individual sessions
+
+    def _initialize_dynamic_elements(self):
+        super()._initialize_dynamic_elements()
+        if not self.dynamic_elements_initialized: return
+        limit = max(self.max_force_for_scaling * 0.5, 1.0)
+        self.heatmap_mesh_actor.cmap(['darkblue', 'deepskyblue', 'white', 'orange', 'darkred'], "forces", vmin=-limit, vmax=limit)
+        self.heatmap_scalar_array = self.heatmap_mesh_actor.dataset.GetPointData().GetScalars() # cmap may replace the array
+        self.heatmap_scalar_view = vtk_to_numpy(self.heatmap_scalar_array)
+        # Signed share changes: the table only builds the strings shown, so the doubled range costs no memory up front
+        self._percentage_table = get_numeric_table(self.percentage_labels.glyph_cache, self.percentage_labels.max_chars,
+                                                   fmt="{:.1f}", min_value=-100.0, max_value=100.0, max_entries=128)
+        hidden = [self.left_right_bar_actor_left, self.left_bar_label_actor, self.left_right_bar_actor_right, self.right_bar_label_actor]
+        hidden += self.lr_percentage_labels.actors + ([self.balance_text_actor] if self.balance_text_actor is not None else [])
+        for vo in hidden: vo.actor.SetVisibility(False)
+
+    def compute_frame_state(self, frame_state):
+        forces = frame_state.forces
+        if forces.size == 0 or self._heatmap_point_sources is None: return None
+        return {'heatmap': forces[self._heatmap_point_sources], 'percentages': frame_state.percentages, 'lr': (0.0, 0.0), 'balance': None}
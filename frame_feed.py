@@ -0,0 +1,207 @@
+# --- START OF FILE frame_feed.py ---
+import sys
+import socket
+import struct
+import logging
+import argparse
+from collections import namedtuple
+from multiprocessing import shared_memory
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Shared-memory feed of the composed frames and per-frame metrics for other local tools (recording system, research logger).
+#
+# Segment layout: header | tooth ids | slots x (metrics record | BGR frame), every block 64-byte aligned.
+# Frames are BGR throughout (cv2 order): video_export.compose_video_frame converts the RGB vedo screenshot on composition.
+# A slot is guarded by its 'seq': 0 while the publisher writes it, the frame's sequence number (1, 2, ...) once committed.
+# Readers map the segment and read in place: a frame is consistent if its slot still holds the same seq after use
+# (FeedFrame.valid()). Each commit is announced by a UDP datagram on 127.0.0.1 (struct '<QI': seq, slot) to every
+# reader that sent b'SUB' to the port stored in the header; the publisher never blocks on readers.
+
+DEFAULT_FEED_NAME = "dental_frame_feed"
+FEED_MAGIC = b"DFRF"; FEED_VERSION = 1
+_published_names = set() # Segments created by a FrameFeedPublisher in this process (their resource tracker entry stays)
+HEADER_DTYPE = np.dtype([('magic', 'S4'), ('version', '<u4'), ('width', '<u4'), ('height', '<u4'), ('channels', '<u4'),
+                         ('slots', '<u4'), ('num_teeth', '<u4'), ('port', '<u4'), ('slot_stride', '<u8'),
+                         ('metrics_bytes', '<u8'), ('write_seq', '<u8')])
+NOTIFY_STRUCT = struct.Struct('<QI')
+SUBSCRIBE = b"SUB"; UNSUBSCRIBE = b"UNSUB"
+
+# One metrics record per frame; cof is NaN when there is no centre of force
+FeedMetrics = namedtuple('FeedMetrics', 'frame_index timestamp tooth_totals percentages lr cof')
+
+
+def _align(n, alignment=64): return (n + alignment - 1) // alignment * alignment
+
+
+def metrics_dtype(num_teeth):
+    return np.dtype([('seq', '<u8'), ('frame_index', '<i8'), ('timestamp', '<f8'), ('total', '<f8'), ('lr', '<f4', (2,)),
+                     ('cof', '<f8', (2,)), ('tooth_totals', '<f4', (num_teeth,)), ('percentages', '<f4', (num_teeth,))])
+
+
+class _FeedLayout:
+    """numpy views over a feed segment (shared by the publisher and the readers)."""
+    def __init__(self, buf, header=None):
+        self.header = np.ndarray((), HEADER_DTYPE, buffer=buf)
+        if header is not None: self.header[()] = header
+        if self.header['magic'] != FEED_MAGIC or self.header['version'] != FEED_VERSION: raise ValueError("Not a dental frame feed (or another version).")
+        h = self.header; self.num_teeth = int(h['num_teeth']); self.slots = int(h['slots'])
+        self.frame_shape = (int(h['height']), int(h['width']), int(h['channels']))
+        self.tooth_ids = np.ndarray((self.num_teeth,), '<i4', buffer=buf, offset=_align(HEADER_DTYPE.itemsize))
+        slots_offset = _align(HEADER_DTYPE.itemsize) + _align(4 * self.num_teeth)
+        stride = int(h['slot_stride']); m_dtype = metrics_dtype(self.num_teeth)
+        self.metrics = [np.ndarray((), m_dtype, buffer=buf, offset=slots_offset + i*stride) for i in range(self.slots)]
+        self.frames = [np.ndarray(self.frame_shape, np.uint8, buffer=buf, offset=slots_offset + i*stride + int(h['metrics_bytes']))
+                       for i in range(self.slots)]
+
+    @staticmethod
+    def segment_size(width, height, channels, slots, num_teeth):
+        metrics_bytes = _align(metrics_dtype(num_teeth).itemsize); stride = metrics_bytes + _align(width * height * channels)
+        return _align(HEADER_DTYPE.itemsize) + _align(4 * num_teeth) + slots * stride, stride, metrics_bytes
+
+
+class FrameFeedPublisher:
+    """Owner of the feed segment. begin_frame/commit are called from one thread (AsyncFrameWriter's worker)."""
+    def __init__(self, name=DEFAULT_FEED_NAME, width=1920, height=1080, tooth_ids=(), slots=4, port=0, channels=3):
+        size, stride, metrics_bytes = _FeedLayout.segment_size(width, height, channels, slots, len(tooth_ids))
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=size); _published_names.add(self.shm.name)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM); self.sock.bind(("127.0.0.1", port)); self.sock.setblocking(False)
+        header = np.zeros((), HEADER_DTYPE)
+        header['magic'] = FEED_MAGIC; header['version'] = FEED_VERSION; header['width'] = width; header['height'] = height
+        header['channels'] = channels; header['slots'] = slots; header['num_teeth'] = len(tooth_ids)
+        header['port'] = self.sock.getsockname()[1]; header['slot_stride'] = stride; header['metrics_bytes'] = metrics_bytes
+        self.layout = _FeedLayout(self.shm.buf, header)
+        self.layout.tooth_ids[:] = tooth_ids
+        self.name = name; self.port = int(header['port']); self.seq = 0; self._writing = None
+        self.subscribers = set(); self.frames_published = 0
+        logging.info(f"Frame feed '{name}': {slots} slots of {width}x{height}, {size/1e6:.1f} MB, notifications on 127.0.0.1:{self.port}.")
+
+    def begin_frame(self):
+        """BGR frame buffer of the next slot, to compose into in place; the slot reads as invalid until commit()."""
+        slot = self.seq % self.layout.slots
+        self.layout.metrics[slot]['seq'] = 0; self._writing = slot
+        return self.layout.frames[slot]
+
+    def commit(self, metrics=None):
+        """Publishes the slot from begin_frame with its metrics (FeedMetrics) and notifies the readers."""
+        slot = self._writing
+        if slot is None: raise RuntimeError("commit() without begin_frame()")
+        record = self.layout.metrics[slot]
+        if metrics is not None:
+            record['frame_index'] = metrics.frame_index; record['timestamp'] = metrics.timestamp
+            record['tooth_totals'] = metrics.tooth_totals; record['percentages'] = metrics.percentages
+            record['total'] = float(np.sum(metrics.tooth_totals)); record['lr'] = metrics.lr; record['cof'] = metrics.cof
+        else: record['frame_index'] = -1 # Frame without metrics
+        self.seq += 1
+        record['seq'] = self.seq; self.layout.header['write_seq'] = self.seq # Slot first, then the header readers poll
+        self._writing = None; self.frames_published += 1
+        self._notify(NOTIFY_STRUCT.pack(self.seq, slot))
+
+    def _notify(self, message):
+        while True: # Drain (un)subscribe requests without blocking
+            try: data, addr = self.sock.recvfrom(64)
+            except (BlockingIOError, InterruptedError): break
+            except OSError: continue # e.g. Windows reports an unreachable reader on the next receive
+            if data == SUBSCRIBE: self.subscribers.add(addr)
+            elif data == UNSUBSCRIBE: self.subscribers.discard(addr)
+        for addr in list(self.subscribers):
+            try: self.sock.sendto(message, addr)
+            except OSError: self.subscribers.discard(addr) # Reader gone
+
+    def close(self):
+        self.sock.close(); self.layout = None
+        self.shm.close(); self.shm.unlink(); _published_names.discard(self.shm.name)
+        logging.info(f"Frame feed '{self.name}' closed after {self.frames_published} frames.")
+
+
+class FeedFrame:
+    """One published frame read in place: image is a (H, W, 3) BGR view into shared memory (image[..., ::-1] for RGB),
+    metrics a record view."""
+    __slots__ = ('seq', 'slot', 'image', 'metrics')
+
+    def __init__(self, seq, slot, image, metrics): self.seq = seq; self.slot = slot; self.image = image; self.metrics = metrics
+
+    def valid(self):
+        """True while the publisher has not reused the slot; check after reading (or copy) the views."""
+        return int(self.metrics['seq']) == self.seq
+
+
+def _attach_segment(name):
+    """Maps an existing segment without letting this process's resource tracker unlink it on exit (Python < 3.13).
+
+    A segment published from this same process keeps its registration: the tracker holds one entry per name, and
+    removing it would make the publisher's unlink() fail in the tracker.
+    """
+    try: return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError: pass
+    shm = shared_memory.SharedMemory(name=name)
+    if sys.platform != 'win32' and shm.name not in _published_names:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+class FrameFeedReader:
+    """Consumer side: zero-copy access to the newest frame and notification-driven waiting."""
+    def __init__(self, name=DEFAULT_FEED_NAME, subscribe=True):
+        self.shm = _attach_segment(name)
+        self.layout = _FeedLayout(self.shm.buf)
+        self.tooth_ids = self.layout.tooth_ids.tolist(); self.frame_shape = self.layout.frame_shape
+        self.sock = None
+        if subscribe:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM); self.sock.bind(("127.0.0.1", 0))
+            self._publisher = ("127.0.0.1", int(self.layout.header['port']))
+            self.sock.sendto(SUBSCRIBE, self._publisher)
+
+    @property
+    def latest_seq(self): return int(self.layout.header['write_seq'])
+
+    def frame(self, seq):
+        """FeedFrame for seq if it is still in the ring, else None."""
+        if seq <= 0 or seq <= self.latest_seq - self.layout.slots: return None
+        slot = (seq - 1) % self.layout.slots
+        frame = FeedFrame(seq, slot, self.layout.frames[slot], self.layout.metrics[slot])
+        return frame if frame.valid() else None
+
+    def latest(self): return self.frame(self.latest_seq)
+
+    def wait(self, timeout=None):
+        """Blocks until the next notification and returns the newest frame (older pending notifications are skipped)."""
+        if self.sock is None: raise RuntimeError("Reader was created with subscribe=False")
+        self.sock.settimeout(timeout)
+        try: self.sock.recv(NOTIFY_STRUCT.size)
+        except socket.timeout: return None
+        self.sock.setblocking(False)
+        try:
+            while True: self.sock.recv(NOTIFY_STRUCT.size)
+        except (BlockingIOError, InterruptedError): pass
+        return self.latest()
+
+    def close(self):
+        if self.sock is not None:
+            try: self.sock.sendto(UNSUBSCRIBE, self._publisher)
+            except OSError: pass
+            self.sock.close()
+        self.layout = None; self.shm.close()
+
+
+if __name__ == '__main__':
+    # Example consumer: prints each frame's metrics (what a research logger would store)
+    parser = argparse.ArgumentParser(description="Print the metrics published on a dental frame feed.")
+    parser.add_argument('--name', default=DEFAULT_FEED_NAME, help="Shared-memory name of the feed.")
+    parser.add_argument('--timeout', type=float, default=5.0, help="Exit after this many seconds without a frame.")
+    args = parser.parse_args()
+    reader = FrameFeedReader(args.name)
+    logging.info(f"Reading feed '{args.name}': {reader.frame_shape} frames, teeth {reader.tooth_ids}.")
+    try:
+        while True:
+            frame = reader.wait(args.timeout)
+            if frame is None: logging.info("No frame within the timeout; exiting."); break
+            m = frame.metrics
+            line = (f"#{frame.seq} t={float(m['timestamp']):.2f}s total={float(m['total']):.1f}N "
+                    f"L/R={m['lr'][0]:.0f}/{m['lr'][1]:.0f}% COF=({m['cof'][0]:.2f}, {m['cof'][1]:.2f})")
+            if frame.valid(): print(line, flush=True)
+    except KeyboardInterrupt: pass
+    finally: reader.close()
+# --- END OF FILE frame_feed.py ---
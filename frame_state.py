@@ -0,0 +1,51 @@
+# --- START OF FILE frame_state.py ---
+import logging
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class FrameState:
+    """Everything the views need for one timestamp, computed from the processor without touching any actor."""
+    __slots__ = ('time_index', 'timestamp', 'forces', 'tooth_totals', 'percentages', 'tooth_averages', 'cof_count', 'views')
+
+    def __init__(self, time_index, timestamp, forces, tooth_totals, percentages, tooth_averages, cof_count):
+        self.time_index = time_index; self.timestamp = timestamp
+        self.forces = forces                 # Force row (NaN -> 0), ordered_tooth_sensor_pairs order
+        self.tooth_totals = tooth_totals     # Per-tooth sums, aligned with processor.tooth_ids
+        self.percentages = percentages       # Per-tooth share of the arch total (%)
+        self.tooth_averages = tooth_averages # Per-tooth NaN-aware sensor means
+        self.cof_count = cof_count           # Number of COF points with ts <= timestamp
+        self.views = {}                      # Per-visualizer states from compute_frame_state ('grid', 'bar'), filled ahead of time
+
+
+def build_frame_state(processor, time_index):
+    """Pure per-frame computation shared by all views (safe to run on a worker thread: the processor is only read)."""
+    timestamp = float(processor.timestamps_array[time_index])
+    return frame_state_from_row(processor, processor.force_matrix[time_index, :], timestamp, time_index,
+                                processor.get_cof_count_up_to_timestamp(timestamp))
+
+
+def frame_state_from_row(processor, row, timestamp, time_index=-1, cof_count=0):
+    """FrameState for one force row in ordered_tooth_sensor_pairs order (NaN = no reading), e.g. a live sample."""
+    valid = ~np.isnan(row)
+    forces = np.where(valid, row, 0.0)
+    tooth_totals = processor.get_tooth_totals(forces)
+    counts = processor.get_tooth_totals(valid.astype(float))
+    tooth_averages = np.divide(tooth_totals, counts, out=np.zeros_like(tooth_totals), where=counts > 0)
+    percentages = tooth_totals * (100.0 / max(float(forces.sum()), 1e-6))
+    return FrameState(time_index, timestamp, forces, tooth_totals, percentages, tooth_averages, cof_count)
+
+
+def frame_states_from_rows(processor, rows, timestamps, time_indices, cof_counts):
+    """FrameStates for a (n, pairs) block of force rows sharing processor's sensor layout, computed in one vectorized pass."""
+    valid = ~np.isnan(rows)
+    forces = np.where(valid, rows, 0.0)
+    starts = processor.tooth_column_starts
+    if len(starts) == 0: tooth_totals = counts = np.zeros((len(rows), 0))
+    else: tooth_totals = np.add.reduceat(forces, starts, axis=1); counts = np.add.reduceat(valid, starts, axis=1, dtype=float)
+    tooth_averages = np.divide(tooth_totals, counts, out=np.zeros_like(tooth_totals), where=counts > 0)
+    percentages = tooth_totals * (100.0 / np.maximum(forces.sum(axis=1, keepdims=True), 1e-6))
+    return [FrameState(time_indices[i], timestamps[i], forces[i], tooth_totals[i], percentages[i], tooth_averages[i], cof_counts[i])
+            for i in range(len(rows))]
+# --- END OF FILE frame_state.py ---
@@ -1,9 +1,10 @@
 # --- START OF FILE graph_visualization_qt.py ---
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+from matplotlib.lines import Line2D
 import numpy as np
 import logging
-import io      
-import cv2 # Only needed if get_frame_as_array uses cv2.imdecode, which it will
+from series_lod import MinMaxPyramid
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -12,11 +13,22 @@ class GraphVisualizerQt: # Renamed to avoid conflict if old one is in same dir
         self.processor = processor
         self.figure = None # Will be set by MainAppWindow
         self.ax = None     # Will be set by MainAppWindow
-        self.lines = {} 
-        self.full_data_cache = {}
+        # All plotted teeth share one LineCollection fed from the processor's (T x teeth) average matrix;
+        # changing the selection only changes plotted_tooth_ids / _plotted_columns
+        self.line_collection = None
+        self.plotted_tooth_ids = []; self._plotted_columns = np.array([], dtype=np.intp); self._requested_tooth_ids = None
+        self.series_pyramid = None # MinMaxPyramid over every tooth column, built once per data set
+        self._series_source = None; self._tooth_column = {}
+        self._column_min = np.array([]); self._column_max = np.array([])
         self.active_legend = None
         self.default_dpi = 100 
         self.current_time_indicator_on_graph = None # Store ref to the axvline on graph
+        # Blit mode: static background cached per full draw, lines + time indicator drawn as animated artists
+        self.use_blit = False
+        self._blit_background = None; self._background_stale = True; self._draw_event_cid = None
+        # Video capture: pixel crop of the Agg buffer (tight bbox computed once per layout) and a reused BGR frame
+        self._capture_crop = None; self._capture_crop_key = None; self._capture_bgr = None
+        self.live_window_s = None # Live mode: X is time relative to the newest sample, fixed at [-live_window_s, 0]
 
     def set_figure_axes(self, fig, ax):
         """Called by the main Qt app to provide the drawing context."""
@@ -33,6 +45,40 @@ class GraphVisualizerQt: # Renamed to avoid conflict if old one is in same dir
             else: 
                 self.ax.set_xlim(0, 1) 
             # Ylim will be set more dynamically in plot_tooth_lines or update
+
+    def enable_blit(self, enabled=True):
+        """Switches per-frame updates to blitting: restore cached background, draw only the animated artists."""
+        self.use_blit = enabled
+        if self.figure is None: return
+        if enabled and self._draw_event_cid is None:
+            self._draw_event_cid = self.figure.canvas.mpl_connect('draw_event', self._on_draw_event)
+        elif not enabled and self._draw_event_cid is not None:
+            self.figure.canvas.mpl_disconnect(self._draw_event_cid); self._draw_event_cid = None
+        for artist in self._animated_artists(): artist.set_animated(enabled)
+        self._blit_background = None; self._background_stale = True
+
+    def _animated_artists(self):
+        artists = [self.line_collection] if self.line_collection is not None else []
+        if self.current_time_indicator_on_graph is not None: artists.append(self.current_time_indicator_on_graph)
+        return artists
+
+    def _on_draw_event(self, event):
+        """Every full draw (layout change, resize, replot) re-captures the static background."""
+        canvas = self.figure.canvas
+        if event is not None and event.canvas is not canvas: return # e.g. the temporary canvas used by savefig
+        self._blit_background = canvas.copy_from_bbox(self.figure.bbox); self._background_stale = False
+        for artist in self._animated_artists(): self.ax.draw_artist(artist) # Full draws skip animated artists
+
+    def blit_frame(self):
+        """Per-frame redraw in blit mode; falls back to a full draw when the background is missing or stale."""
+        if self.figure is None or self.ax is None: return
+        canvas = self.figure.canvas
+        if self._blit_background is None or self._background_stale:
+            canvas.draw() # Triggers _on_draw_event, which captures the background and draws the artists
+            return
+        canvas.restore_region(self._blit_background)
+        for artist in self._animated_artists(): self.ax.draw_artist(artist)
+        canvas.blit(self.figure.bbox)
     def create_graph_figure(self, figsize=(10, 4)): # figsize can be adjusted
         """Creates or clears the Matplotlib figure and axes, and sets initial properties."""
         if self.figure is None or self.ax is None:
@@ -40,8 +86,8 @@ class GraphVisualizerQt: # Renamed to avoid conflict if old one is in same dir
             logging.info("Matplotlib figure and axes created.")
         else:
             self.ax.clear() 
-            self.lines.clear() # Clear line references
-            self.full_data_cache.clear() # Clear data cache
+            self.line_collection = None; self.plotted_tooth_ids = []; self._requested_tooth_ids = None # Collection removed by ax.clear()
+            self.current_time_indicator_on_graph = None # Removed by ax.clear()
             if self.active_legend:
                 try: self.active_legend.remove()
                 except AttributeError: pass # May have been removed by ax.clear()
@@ -82,44 +128,58 @@ class GraphVisualizerQt: # Renamed to avoid conflict if old one is in same dir
         self.ax.grid(True)
         return self.figure, self.ax
     
+    def _ensure_series_cache(self):
+        """Builds the shared per-tooth series pyramid once per processor data set."""
+        matrix = self.processor.get_tooth_average_matrix()
+        if self.series_pyramid is not None and self._series_source is matrix: return
+        self._series_source = matrix
+        self.series_pyramid = MinMaxPyramid(self.processor.timestamps_array, matrix)
+        self._tooth_column = {tid: i for i, tid in enumerate(self.processor.tooth_ids or [])}
+        has_rows = matrix.shape[0] > 0
+        self._column_min = matrix.min(axis=0) if has_rows else np.zeros(matrix.shape[1])
+        self._column_max = matrix.max(axis=0) if has_rows else np.zeros(matrix.shape[1])
+        logging.info(f"Graph series cache built: {matrix.shape[0]} samples x {matrix.shape[1]} teeth, {len(self.series_pyramid.levels)} LOD levels.")
+
+    def _ensure_line_collection(self):
+        if self.line_collection is None or self.line_collection.axes is not self.ax:
+            self.line_collection = LineCollection([], linewidths=1.5, animated=self.use_blit)
+            self.ax.add_collection(self.line_collection, autolim=False) # Limits are managed explicitly
+        return self.line_collection
+
     def plot_tooth_lines(self, tooth_ids_to_display):
+        """Selects the teeth drawn by the shared LineCollection and sets colours, legend, title and Y-limits."""
         if self.ax is None:
             logging.error("GraphVisualizerQt: Axes not set. Call create_graph_figure first.")
             self.create_graph_figure() 
             if self.ax is None: return 
 
-        for line_artist in list(self.ax.lines): # Use list() for safe removal while iterating
-            if hasattr(line_artist, 'get_gid') and line_artist.get_gid() == "graph_time_indicator_live":
-                continue # Don't remove the main time indicator if it's managed here
-            line_artist.remove()
-        self.lines.clear(); self.full_data_cache.clear()
+        self._ensure_series_cache()
         if self.active_legend:
             try: self.active_legend.remove()
             except AttributeError: pass
             self.active_legend = None
 
-        if not tooth_ids_to_display:
+        self._background_stale = True; self._capture_crop = None # Title/legend/limits change below
+        missing = [tid for tid in tooth_ids_to_display if tid not in self._tooth_column]
+        if missing: logging.warning(f"GRAPH_DATA: Teeth {missing} have no force data; not plotted.")
+        self._requested_tooth_ids = list(tooth_ids_to_display)
+        self.plotted_tooth_ids = [tid for tid in tooth_ids_to_display if tid in self._tooth_column]
+        self._plotted_columns = np.array([self._tooth_column[tid] for tid in self.plotted_tooth_ids], dtype=np.intp)
+        collection = self._ensure_line_collection()
+        collection.set_segments([]) # Filled by update_graph_to_timestamp
+
+        if not self.plotted_tooth_ids:
             title_suffix = "(No tooth selected)"
             self.ax.set_title(f"Average Bite Force Over Time {title_suffix}")
             self.ax.set_ylim(0, 1) # Default sensible Y range if no data
+            if self.live_window_s is not None: self._apply_live_limits()
             if self.figure: self.figure.canvas.draw_idle()
             return
 
-        max_y_for_current_selection = 0.0 # Start with 0
-        min_y_for_current_selection = 0.0
-        has_data_for_ylim = False
-
-        for tooth_id in tooth_ids_to_display: # Pre-fetch all data to determine overall Y range
-            _ , forces = self.processor.get_average_force_for_tooth(tooth_id)
-            if forces.size > 0:
-                has_data_for_ylim = True
-                current_max = np.nanmax(forces)
-                current_min = np.nanmin(forces)
-                if np.isfinite(current_max): max_y_for_current_selection = max(max_y_for_current_selection, current_max)
-                if np.isfinite(current_min): min_y_for_current_selection = min(min_y_for_current_selection, current_min)
-        
-        if not has_data_for_ylim or max_y_for_current_selection == 0: # If no data or all forces are zero
-            top_y_limit = 10.0 # Default if no data or all zero
+        max_y_for_current_selection = max(0.0, float(np.max(self._column_max[self._plotted_columns])))
+        min_y_for_current_selection = min(0.0, float(np.min(self._column_min[self._plotted_columns])))
+        if max_y_for_current_selection == 0: # If all forces are zero
+            top_y_limit = 10.0
             bottom_y_limit = -0.5
         else:
             top_y_limit = max_y_for_current_selection * 1.1
@@ -128,107 +188,138 @@ class GraphVisualizerQt: # Renamed to avoid conflict if old one is in same dir
 
         self.ax.set_ylim(bottom=bottom_y_limit, top=top_y_limit)
         logging.info(f"Graph Y-LIM updated for selection: Bottom {bottom_y_limit:.2f}, Top {top_y_limit:.2f}")
+        if self.live_window_s is not None: self._apply_live_limits() # Live range is unknown up front: full scale
 
-        num_lines = len(tooth_ids_to_display)
+        num_lines = len(self.plotted_tooth_ids)
         colors = plt.cm.viridis(np.linspace(0,1,max(1,num_lines)))
-
-        for i, tooth_id in enumerate(tooth_ids_to_display):
-            full_times, full_forces = self.processor.get_average_force_for_tooth(tooth_id) # Fetch again for cache
-            self.full_data_cache[tooth_id] = (full_times, full_forces)
-            # Initially plot empty; update_graph_to_timestamp will fill them
-            line, = self.ax.plot([], [], label=f"Tooth {tooth_id}", color=colors[i % len(colors)], lw=1.5)
-            self.lines[tooth_id] = line
-        
-        self.active_legend = self.ax.legend(loc='upper right')
-        title_suffix = f"(Teeth: {', '.join(map(str, tooth_ids_to_display))})"
+        collection.set_color(colors)
+        # The collection has no per-segment labels, so the legend is built from proxy handles
+        legend_handles = [Line2D([], [], color=colors[i], lw=1.5, label=f"Tooth {tid}") for i, tid in enumerate(self.plotted_tooth_ids)]
+        self.active_legend = self.ax.legend(handles=legend_handles, loc='upper right',
+                                            ncol=int(np.ceil(num_lines / 8)), fontsize='small' if num_lines > 8 else None)
+        title_suffix = f"(Teeth: {', '.join(map(str, self.plotted_tooth_ids))})"
         self.ax.set_title(f"Average Bite Force Over Time {title_suffix}")
         
-        logging.info("Graph lines plotted for teeth: %s", tooth_ids_to_display)
+        logging.info("Graph lines plotted for teeth: %s", self.plotted_tooth_ids)
         if self.figure: self.figure.canvas.draw_idle()
 
     def update_graph_to_timestamp(self, current_timestamp, tooth_ids_currently_plotted):
         if self.figure is None or self.ax is None: return
-        # logging.debug(f"GRAPH: Updating to T={current_timestamp:.2f} for teeth {tooth_ids_currently_plotted}") # General call log
-        changed_data_for_frame = False # Flag to see if any line data was actually set
-
-        for tooth_id in tooth_ids_currently_plotted: 
-            if tooth_id in self.lines and tooth_id in self.full_data_cache:
-                full_times, full_forces = self.full_data_cache[tooth_id]
-                if full_times is not None and len(full_times) > 0:
-                    idx_up_to_time = np.searchsorted(full_times, current_timestamp, side='right')
-                    times_to_plot = full_times[:idx_up_to_time]
-                    forces_to_plot = full_forces[:idx_up_to_time]
-                    
-                    if len(times_to_plot) > 0 : 
-                        logging.debug(f"GRAPH_DATA Tooth {tooth_id} @ T={current_timestamp:.2f}: "
-                                    f"Plotting {len(times_to_plot)} points. "
-                                    f"X range: ({times_to_plot[0]:.2f} to {times_to_plot[-1]:.2f}), "
-                                    f"Y range: ({np.min(forces_to_plot):.2f} to {np.max(forces_to_plot):.2f})")
-                        self.lines[tooth_id].set_data(times_to_plot, forces_to_plot)
-                        changed_data_for_frame = True
-                    elif self.lines[tooth_id].get_xdata().size > 0 or self.lines[tooth_id].get_ydata().size > 0: 
-                        # If line had data before but now should be empty
-                        logging.debug(f"GRAPH_DATA Tooth {tooth_id} @ T={current_timestamp:.2f}: No data to plot (setting to empty).")
-                        self.lines[tooth_id].set_data([], [])
-                        changed_data_for_frame = True
-                    # else: line is already empty and no new data, no change needed
-                else: # full_times or full_forces is None or empty
-                    self.lines[tooth_id].set_data([], []) 
-                    if self.lines[tooth_id].get_xdata().size > 0: changed_data_for_frame = True # It became empty
-            else:
-                logging.warning(f"GRAPH_DATA: Tooth {tooth_id} not in self.lines or self.full_data_cache.")
-        
-        # The figure.canvas.draw_idle() is called in MainAppWindow.animation_step
-        # if changed_data_for_frame and self.figure:
-        #     logging.debug("GRAPH_DATA: Requesting canvas draw_idle due to data change.")
-        #     self.figure.canvas.draw_idle()
+        if self.line_collection is None or list(tooth_ids_currently_plotted) != self._requested_tooth_ids:
+            self.plot_tooth_lines(tooth_ids_currently_plotted) # Selection change is only an index-set update
+        pyramid = self.series_pyramid
+        if not self.plotted_tooth_ids or pyramid is None or len(pyramid.times) == 0:
+            self.line_collection.set_segments([]); return
+
+        idx_up_to_time = np.searchsorted(pyramid.times, current_timestamp, side='right')
+        if idx_up_to_time == 0:
+            self.line_collection.set_segments([]); return
+        # Min/max level with ~2 points per pixel: cost follows the axes width, not the session length
+        x_min, x_max = self.ax.get_xlim()
+        lod_level = pyramid.level_for_view(x_min, x_max, self.ax.bbox.width)
+        times_to_plot, forces_to_plot = pyramid.series_up_to(idx_up_to_time, lod_level, columns=self._plotted_columns)
+        segments = np.empty((len(self._plotted_columns), len(times_to_plot), 2), dtype=float)
+        segments[:, :, 0] = times_to_plot; segments[:, :, 1] = forces_to_plot.T
+        self.line_collection.set_segments(segments)
+        logging.debug(f"GRAPH_DATA @ T={current_timestamp:.2f}: {len(self.plotted_tooth_ids)} teeth x "
+                      f"{len(times_to_plot)} points (LOD level {lod_level}).")
+        # The figure redraw is called in MainAppWindow.animation_step (blit_frame() or draw_idle())
     
+    def set_live_window(self, window_s):
+        """Switches the axes to a rolling window of the last window_s seconds (None returns to session time)."""
+        self.live_window_s = window_s
+        if self.ax is None: return
+        if window_s is None:
+            self.create_graph_figure()
+            if self._requested_tooth_ids is not None: self.plot_tooth_lines(self._requested_tooth_ids)
+            return
+        self._apply_live_limits()
+        self.update_time_indicator(None) # "Now" is always the right edge
+        if self.line_collection is not None: self.line_collection.set_segments([])
+        self._background_stale = True; self._capture_crop = None
+        if self.figure: self.figure.canvas.draw_idle()
+
+    def _apply_live_limits(self):
+        max_y_force = self.processor.max_force_overall if self.processor.max_force_overall > 0 else 10.0
+        self.ax.set_xlim(-self.live_window_s, 0)
+        self.ax.set_ylim(bottom=-max_y_force*0.05, top=max_y_force*1.1)
+        self.ax.set_xlabel("Time relative to latest sample (s)")
+
+    def update_live_window(self, times, tooth_averages):
+        """Rolling-window update from the live buffer: times (n,) and per-tooth averages (n, teeth), oldest first."""
+        if self.figure is None or self.ax is None or self.line_collection is None: return
+        if not self.plotted_tooth_ids or len(times) == 0:
+            self.line_collection.set_segments([]); return
+        segments = np.empty((len(self._plotted_columns), len(times), 2), dtype=float)
+        segments[:, :, 0] = times - times[-1]; segments[:, :, 1] = tooth_averages[:, self._plotted_columns].T
+        self.line_collection.set_segments(segments)
+        # The figure redraw is called by MainAppWindow.live_display_step (blit_frame() or draw_idle())
+
     def update_time_indicator(self, current_timestamp):
-        """Updates or creates the vertical time indicator line."""
+        """Moves the persistent vertical time indicator line (created on first use)."""
         if not self.ax or not self.figure: return
 
-        if self.current_time_indicator_on_graph:
-            try: self.current_time_indicator_on_graph.remove()
-            except (ValueError, AttributeError): pass # Already removed or None
-            self.current_time_indicator_on_graph = None
-        
-        if current_timestamp is not None:
+        if current_timestamp is None:
+            if self.current_time_indicator_on_graph: self.current_time_indicator_on_graph.set_visible(False)
+            return
+        if self.current_time_indicator_on_graph is None:
             self.current_time_indicator_on_graph = self.ax.axvline(
-                current_timestamp, color='grey', linestyle=':', lw=1, gid="graph_time_indicator_live"
+                current_timestamp, color='grey', linestyle=':', lw=1, gid="graph_time_indicator_live", animated=self.use_blit
             )
-        # Figure redraw will be handled by the main animation loop via draw_idle() on canvas
+        else:
+            self.current_time_indicator_on_graph.set_xdata([current_timestamp, current_timestamp])
+            self.current_time_indicator_on_graph.set_visible(True)
+        # Figure redraw is handled by the main animation loop (blit_frame() or draw_idle() on canvas)
 
     def get_frame_as_array(self, current_timestamp, tooth_ids_to_display):
+        """BGR frame read straight from the Agg render buffer. The returned array is reused by the next call."""
         if self.figure is None or self.ax is None:
             logging.warning("Graph figure not initialized for get_frame_as_array.")
             return None # Cannot generate frame
 
         # Ensure graph is updated to the specific timestamp for the screenshot
         # This might redraw lines if tooth_ids_to_display changed from current state
-        if set(tooth_ids_to_display) != set(self.lines.keys()):
-            self.plot_tooth_lines(tooth_ids_to_display) 
-            
         self.update_graph_to_timestamp(current_timestamp, tooth_ids_to_display)
         self.update_time_indicator(current_timestamp) # Ensure indicator is on for screenshot
-        
-        self.figure.canvas.draw() # Ensure all drawing commands are processed
-        
-        buf = io.BytesIO()
+
+        canvas = self.figure.canvas
+        if self.use_blit: self.blit_frame() # Background + animated artists are in the Agg buffer afterwards
+        else: canvas.draw()
+        return self.capture_buffer()
+
+    def capture_buffer(self):
+        """BGR crop of the Agg buffer as last drawn (e.g. right after blit_frame), without updating the graph."""
+        if self.figure is None: return None
+        canvas = self.figure.canvas
+        try:
+            rgba = np.asarray(canvas.buffer_rgba()) # (H, W, 4) view of the renderer buffer, no copy
+        except AttributeError as e:
+            logging.error(f"Graph canvas has no Agg buffer to capture: {e}")
+            return None
+        y0, y1, x0, x1 = self._get_capture_crop(rgba.shape)
+        out_shape = (y1 - y0, x1 - x0, 3)
+        if self._capture_bgr is None or self._capture_bgr.shape != out_shape:
+            self._capture_bgr = np.empty(out_shape, dtype=np.uint8)
+        import cv2 # Only needed when recording; keeps OpenCV out of application startup
+        cv2.cvtColor(rgba[y0:y1, x0:x1], cv2.COLOR_RGBA2BGR, dst=self._capture_bgr)
+        return self._capture_bgr
+
+    def _get_capture_crop(self, buffer_shape, pad_inches=0.1):
+        """Pixel crop equivalent to savefig(bbox_inches='tight'), recomputed only when the layout changes."""
+        crop_key = (buffer_shape[0], buffer_shape[1], self.figure.dpi)
+        if self._capture_crop is not None and self._capture_crop_key == crop_key: return self._capture_crop
+        height, width = buffer_shape[:2]
         try:
-            self.figure.savefig(buf, format='png', dpi=self.default_dpi, bbox_inches='tight', facecolor=self.figure.get_facecolor())
-            buf.seek(0)
-            img_array_png = np.frombuffer(buf.getvalue(), dtype=np.uint8)
-            frame_bgr = cv2.imdecode(img_array_png, cv2.IMREAD_COLOR)
+            tight = self.figure.get_tightbbox(self.figure.canvas.get_renderer())
+            dpi = self.figure.dpi
+            x0 = int(np.floor((tight.x0 - pad_inches) * dpi)); x1 = int(np.ceil((tight.x1 + pad_inches) * dpi))
+            y0 = int(np.floor(height - (tight.y1 + pad_inches) * dpi)); y1 = int(np.ceil(height - (tight.y0 - pad_inches) * dpi)) # Buffer rows run top-down
+            x0, x1 = max(0, x0), min(width, x1); y0, y1 = max(0, y0), min(height, y1)
+            if x1 <= x0 or y1 <= y0: raise ValueError("empty tight bbox")
         except Exception as e:
-            logging.error(f"Error saving Matplotlib figure to buffer: {e}")
-            frame_bgr = None
-        finally:
-            buf.close()
-            if self.current_time_indicator_on_graph: # Clean up indicator used for screenshot
-                try: self.current_time_indicator_on_graph.remove()
-                except (ValueError, AttributeError): pass
-                self.current_time_indicator_on_graph = None
-
-        if frame_bgr is None: logging.error("Failed to decode Matplotlib figure to image array.")
-        return frame_bgr
+            logging.warning(f"Graph capture: tight bbox unavailable ({e}), using full canvas.")
+            x0, x1, y0, y1 = 0, width, 0, height
+        self._capture_crop = (y0, y1, x0, x1); self._capture_crop_key = crop_key
+        logging.info(f"Graph capture crop set to rows {y0}:{y1}, cols {x0}:{x1} of {height}x{width} buffer.")
+        return self._capture_crop
 # --- END OF FILE graph_visualization_qt.py ---
\ No newline at end of file
@@ -0,0 +1,169 @@
+# --- START OF FILE leak_diagnostics.py ---
+import os
+import sys
+import csv
+import time
+import argparse
+import logging
+import tracemalloc
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+try:
+    import psutil # Optional: most accurate RSS on every platform
+except ImportError:
+    psutil = None
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB (psutil, else /proc on Linux, else the peak RSS from getrusage)."""
+    if psutil is not None: return psutil.Process().memory_info().rss / 1e6
+    try:
+        with open('/proc/self/statm') as f: return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except (OSError, ValueError, IndexError): pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1e6 if sys.platform == 'darwin' else peak / 1e3 # bytes on macOS, KB elsewhere
+    except ImportError: return float('nan')
+
+
+def renderer_actor_counts(renderers):
+    """[(3D actors, 2D actors)] for each VTK renderer."""
+    return [(r.GetActors().GetNumberOfItems(), r.GetActors2D().GetNumberOfItems()) for r in renderers]
+
+
+def is_monotonic_growth(values, min_increase, min_rising_fraction=0.9):
+    """True when the series rose by more than min_increase and (almost) never went down on the way."""
+    values = np.asarray(values, dtype=float)
+    if len(values) < 3 or not np.all(np.isfinite(values)): return False
+    steps = np.diff(values)
+    return values[-1] - values[0] > min_increase and np.mean(steps >= 0) >= min_rising_fraction
+
+
+class LeakMonitor:
+    """Samples VTK actor counts, RSS and Python allocations every N frames and flags steadily growing series.
+
+    renderers_fn returns the renderers to count (called at every sample, so it may change). Growth is judged
+    over the last `window` samples; a flagged series is logged once and reported until it levels off.
+    Python allocations are traced with tracemalloc (started here unless track_python=False) and the top
+    growing allocation sites since the previous sample are logged.
+    """
+    GROWTH_TOLERANCE = {'rss_mb': 5.0, 'actors': 0.5, 'traced_mb': 1.0}
+
+    def __init__(self, renderers_fn=None, sample_every_frames=600, window=12, track_python=True, top_allocations=5, csv_path=None):
+        self.renderers_fn = renderers_fn
+        self.sample_every_frames = max(1, int(sample_every_frames)); self.window = max(3, int(window))
+        self.top_allocations = top_allocations; self.csv_path = csv_path
+        self.frames = 0; self.samples = []; self.flagged = set()
+        self._started_tracemalloc = track_python and not tracemalloc.is_tracing()
+        if self._started_tracemalloc: tracemalloc.start()
+        self.track_python = track_python
+        self._last_snapshot = None; self._t0 = time.monotonic()
+        if csv_path:
+            with open(csv_path, 'w', newline='') as f:
+                csv.writer(f).writerow(['elapsed_s', 'frames', 'rss_mb', 'traced_mb', 'actors', 'actors_per_renderer'])
+        logging.info(f"Leak diagnostics: sampling every {self.sample_every_frames} frames, window {self.window} samples.")
+
+    def on_frame(self):
+        self.frames += 1
+        if self.frames % self.sample_every_frames == 0: self.sample()
+
+    def sample(self):
+        """Takes one sample, logs allocation growth since the previous one and re-evaluates the growth flags."""
+        per_renderer = renderer_actor_counts(self.renderers_fn()) if self.renderers_fn else []
+        sample = {'elapsed_s': time.monotonic() - self._t0, 'frames': self.frames, 'rss_mb': current_rss_mb(),
+                  'traced_mb': tracemalloc.get_traced_memory()[0] / 1e6 if tracemalloc.is_tracing() else float('nan'),
+                  'actors': sum(a + b for a, b in per_renderer), 'actors_per_renderer': per_renderer}
+        self.samples.append(sample)
+        if self.track_python and tracemalloc.is_tracing(): self._log_allocation_growth()
+        if self.csv_path:
+            with open(self.csv_path, 'a', newline='') as f:
+                csv.writer(f).writerow([f"{sample['elapsed_s']:.1f}", sample['frames'], f"{sample['rss_mb']:.1f}",
+                                        f"{sample['traced_mb']:.2f}", sample['actors'], sample['actors_per_renderer']])
+        self._check_growth()
+        return sample
+
+    def _log_allocation_growth(self):
+        snapshot = tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+        if self._last_snapshot is not None:
+            growth = [d for d in snapshot.compare_to(self._last_snapshot, 'lineno') if d.size_diff > 0][:self.top_allocations]
+            for d in growth: logging.debug(f"Leak diagnostics: +{d.size_diff / 1024:.1f} KB (+{d.count_diff} blocks) at {d.traceback}")
+        self._last_snapshot = snapshot
+
+    def _check_growth(self):
+        recent = self.samples[-self.window:]
+        if len(recent) < self.window: return
+        for series, tolerance in self.GROWTH_TOLERANCE.items():
+            growing = is_monotonic_growth([s[series] for s in recent], tolerance)
+            if growing and series not in self.flagged:
+                self.flagged.add(series)
+                logging.warning(f"Leak diagnostics: {series} grew steadily over the last {self.window} samples "
+                                f"({recent[0][series]:.1f} -> {recent[-1][series]:.1f}).")
+            elif not growing and series in self.flagged:
+                self.flagged.discard(series); logging.info(f"Leak diagnostics: {series} levelled off.")
+
+    def report(self):
+        """Summary of the run: first/last/max of each series and the currently flagged ones."""
+        if not self.samples: return {'frames': self.frames, 'samples': 0, 'flagged': []}
+        summary = {'frames': self.frames, 'samples': len(self.samples), 'elapsed_s': self.samples[-1]['elapsed_s'], 'flagged': sorted(self.flagged)}
+        for series in self.GROWTH_TOLERANCE:
+            values = [s[series] for s in self.samples]
+            summary[series] = {'first': values[0], 'last': values[-1], 'max': max(values)}
+        return summary
+
+    def stop(self):
+        report = self.report()
+        if self._started_tracemalloc: tracemalloc.stop(); self._started_tracemalloc = False
+        logging.info(f"Leak diagnostics report: {report}")
+        return report
+
+
+def soak(processor, frames=None, hours=None, sample_every_frames=600, window=12, csv_path="leak_diagnostics.csv", track_python=True):
+    """Offscreen soak test: loops playback over the session (all views + video capture, no encoding) under a LeakMonitor."""
+    from video_export import OffscreenVideoExporter
+    exporter = OffscreenVideoExporter(processor)
+    monitor = LeakMonitor(lambda: exporter.plotter.renderers, sample_every_frames, window, track_python, csv_path=csv_path)
+    timestamps = processor.timestamps_array
+    deadline = time.monotonic() + hours * 3600.0 if hours else None
+    i = 0
+    try:
+        while (frames is None or i < frames) and (deadline is None or time.monotonic() < deadline):
+            exporter.render_frame(timestamps[i % len(timestamps)]) # Loops like the app's playback
+            monitor.on_frame(); i += 1
+    except KeyboardInterrupt:
+        logging.info("Soak interrupted.")
+    finally:
+        exporter.close()
+    return monitor.stop()
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Offscreen long-run playback under actor/RSS/allocation leak tracking.")
+    parser.add_argument('--frames', type=int, default=None, help="Stop after this many frames.")
+    parser.add_argument('--hours', type=float, default=None, help="Stop after this many hours (e.g. 8 for an unattended day).")
+    parser.add_argument('--sample-every', type=int, default=600, help="Frames between samples.")
+    parser.add_argument('--window', type=int, default=12, help="Samples a series must grow over to be flagged.")
+    parser.add_argument('--no-tracemalloc', action='store_true', help="Skip Python allocation tracking (lower overhead).")
+    parser.add_argument('--csv', default=None, help="Recorded session CSV; simulated data when omitted.")
+    parser.add_argument('-o', '--output', default="leak_diagnostics.csv", help="Sample log (CSV).")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    if args.frames is None and args.hours is None: args.frames = 2 * args.sample_every * args.window # Two full growth windows
+    import matplotlib; matplotlib.use('Agg') # No Qt/display for the graph
+    from video_export import load_processor
+    processor = load_processor(args.csv)
+    if not processor.timestamps: logging.error("No timestamps. Exiting."); return 1
+    logging.getLogger().setLevel(logging.WARNING) # Keep per-frame view logging out of a multi-hour run; flags are warnings
+    report = soak(processor, args.frames, args.hours, args.sample_every, args.window, args.output, not args.no_tracemalloc)
+    print(f"{report['frames']} frames, {report['samples']} samples; flagged: {', '.join(report['flagged']) or 'none'}")
+    return 1 if report['flagged'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+# --- END OF FILE leak_diagnostics.py ---
@@ -0,0 +1,128 @@
+# --- START OF FILE live_acquisition.py ---
+import time
+import logging
+import threading
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class LiveForceBuffer:
+    """Fixed-size ring of complete force frames written by the acquisition thread and read by the display.
+
+    Each slot holds the sample timestamp, the force row (ordered_tooth_sensor_pairs order, NaN = no reading),
+    the per-tooth averages for the graph, and the perf_counter() time the frame became complete (for latency).
+    """
+    def __init__(self, n_pairs, n_teeth, capacity):
+        self.capacity = max(int(capacity), 2)
+        self.times = np.zeros(self.capacity, dtype=float)
+        self.rows = np.full((self.capacity, n_pairs), np.nan, dtype=float)
+        self.tooth_averages = np.zeros((self.capacity, n_teeth), dtype=float)
+        self.arrival_times = np.zeros(self.capacity, dtype=float)
+        self.count = 0 # Total frames appended; the newest frame is at (count - 1) % capacity
+        self._lock = threading.Lock()
+
+    def append(self, timestamp, row, tooth_averages, arrival_time):
+        with self._lock:
+            i = self.count % self.capacity
+            self.times[i] = timestamp; self.rows[i] = row
+            self.tooth_averages[i] = tooth_averages; self.arrival_times[i] = arrival_time
+            self.count += 1
+
+    def latest(self):
+        """(sequence, timestamp, row copy, arrival_time) of the newest frame, or None while empty."""
+        with self._lock:
+            if self.count == 0: return None
+            i = (self.count - 1) % self.capacity
+            return self.count, float(self.times[i]), self.rows[i].copy(), float(self.arrival_times[i])
+
+    def window(self, seconds):
+        """(times, tooth_averages) of the frames within `seconds` of the newest one, oldest first (copies)."""
+        with self._lock:
+            n = min(self.count, self.capacity)
+            if n == 0: return np.empty(0), np.empty((0, self.tooth_averages.shape[1]))
+            start = (self.count - n) % self.capacity
+            order = np.roll(np.arange(self.capacity), -start)[:n]
+            times = self.times[order]; averages = self.tooth_averages[order]
+        first = int(np.searchsorted(times, times[-1] - seconds, side='left'))
+        return times[first:], averages[first:]
+
+
+class LiveAcquisition:
+    """Runs SensorDataReader.stream_readings on a background thread and assembles readings into frames.
+
+    A frame is published as soon as every sensor of the layout has reported for its timestamp (or, for
+    incomplete frames, when the next timestamp starts), so display latency does not wait for the next sample.
+    """
+    def __init__(self, reader, processor, window_s=10.0, max_sample_rate_hz=100.0, **stream_kwargs):
+        self.reader = reader; self.processor = processor
+        self.window_s = float(window_s)
+        self.stream_kwargs = stream_kwargs
+        self.pair_index = {pair: i for i, pair in enumerate(processor.ordered_tooth_sensor_pairs)}
+        self.buffer = LiveForceBuffer(len(self.pair_index), len(processor.tooth_ids), int(self.window_s * max_sample_rate_hz) + 1)
+        self.frames_received = 0; self.readings_ignored = 0
+        self._stop_event = threading.Event(); self._thread = None
+
+    @property
+    def running(self): return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running: return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="LiveAcquisition", daemon=True)
+        self._thread.start()
+        logging.info(f"Live acquisition started ({len(self.pair_index)} sensors, {self.window_s:g} s window).")
+
+    def stop(self, timeout=2.0):
+        self._stop_event.set()
+        if self._thread is not None: self._thread.join(timeout); self._thread = None
+        logging.info(f"Live acquisition stopped: {self.frames_received} frames, {self.readings_ignored} readings ignored.")
+
+    def _publish(self, timestamp, row):
+        valid = ~np.isnan(row)
+        totals = self.processor.get_tooth_totals(np.where(valid, row, 0.0))
+        counts = self.processor.get_tooth_totals(valid.astype(float))
+        averages = np.divide(totals, counts, out=np.zeros_like(totals), where=counts > 0)
+        self.buffer.append(timestamp, row, averages, time.perf_counter())
+        self.frames_received += 1
+
+    def _run(self):
+        n_pairs = len(self.pair_index)
+        row = np.full(n_pairs, np.nan); filled = 0
+        current_ts = None; published_ts = None
+        try:
+            for timestamp, tooth_id, sensor_point_id, force, _ in self.reader.stream_readings(self._stop_event, **self.stream_kwargs):
+                if timestamp == published_ts: continue # Late duplicate for a frame that was already complete
+                if timestamp != current_ts:
+                    if filled: self._publish(current_ts, row) # Incomplete frame: publish what arrived
+                    row = np.full(n_pairs, np.nan); filled = 0; current_ts = timestamp
+                col = self.pair_index.get((tooth_id, sensor_point_id))
+                if col is None: self.readings_ignored += 1; continue
+                if np.isnan(row[col]): filled += 1
+                row[col] = force
+                if filled == n_pairs:
+                    self._publish(current_ts, row)
+                    published_ts = current_ts; current_ts = None
+                    row = np.full(n_pairs, np.nan); filled = 0
+        except Exception as e:
+            logging.error(f"Live acquisition stopped on error: {e}", exc_info=True)
+
+
+class LatencyMeter:
+    """Sample-to-screen latency: arrival of a complete frame to the end of the render that showed it."""
+    def __init__(self, target_ms=50.0):
+        self.target_ms = target_ms
+        self.last_ms = 0.0; self.avg_ms = 0.0; self.max_ms = 0.0; self.samples = 0
+
+    def record(self, arrival_time, shown_time=None):
+        ms = ((time.perf_counter() if shown_time is None else shown_time) - arrival_time) * 1000.0
+        self.samples += 1; self.last_ms = ms; self.max_ms = max(self.max_ms, ms)
+        self.avg_ms = ms if self.samples == 1 else 0.9 * self.avg_ms + 0.1 * ms
+        return ms
+
+    @property
+    def within_target(self): return self.avg_ms <= self.target_ms
+
+    def stats(self):
+        return {'last_ms': self.last_ms, 'avg_ms': self.avg_ms, 'max_ms': self.max_ms, 'samples': self.samples, 'target_ms': self.target_ms}
+# --- END OF FILE live_acquisition.py ---
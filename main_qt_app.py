@@ -1,28 +1,25 @@
 # --- START OF FILE main_qt_app.py ---
+import time
+_STARTUP_T0 = time.perf_counter() # Reference for the startup timing breakdown
 import sys
 import logging
 import numpy as np
-import cv2 
 import atexit
 import os
+import argparse
+import threading
+from collections import OrderedDict
 
-# ... (Qt imports as before) ...
-from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel
-from PyQt5.QtCore import QTimer, Qt
-import vedo
-from vtkmodules.qt.QVTKRenderWindowInteractor import QVTKRenderWindowInteractor
+# Only Qt and numpy-level modules are imported here so the window can appear immediately; vedo/VTK,
+# matplotlib, pandas (data modules) and OpenCV (recording) are imported on first use.
+from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QComboBox, QSlider, QProgressBar
+from PyQt5.QtCore import QTimer, Qt, QThread, pyqtSignal
 
-
-from data_acquisition import SensorDataReader
-from data_processing import DataProcessor
-from graph_visualization_qt import GraphVisualizerQt 
-from dental_arch_grid_visualization_qt import DentalArchGridVisualizerQt
-from dental_arch_3d_bar_visualization_qt import DentalArch3DBarVisualizerQt
-
-from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
-
-from vedo import Plotter, settings # Import base Plotter
+from playback import PlaybackClock, PLAYBACK_SPEEDS
+from frame_state import frame_state_from_row
+from live_acquisition import LatencyMeter
+from perf_instrumentation import PERF
+from frame_feed import FeedMetrics, DEFAULT_FEED_NAME
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -31,164 +28,344 @@ def cleanup_on_exit(): # ... (same as before) ...
     global _main_app_window_instance_for_atexit
     if _main_app_window_instance_for_atexit and hasattr(_main_app_window_instance_for_atexit, 'video_writer'):
         if _main_app_window_instance_for_atexit.video_writer is not None and _main_app_window_instance_for_atexit.video_writer.isOpened():
-            logging.info("ATEIXT: Releasing OpenCV video writer..."); _main_app_window_instance_for_atexit.video_writer.release(); _main_app_window_instance_for_atexit.video_writer = None
+            logging.info("ATEIXT: Releasing OpenCV video writer..."); _main_app_window_instance_for_atexit._release_video_writer()
             logging.info("ATEIXT: OpenCV video writer released.")
 atexit.register(cleanup_on_exit)
 
-class VedoQtCanvas(QVTKRenderWindowInteractor): # Same as before
-    def __init__(self, parent=None): 
-        super().__init__(parent)
-        # --- ADD THESE LINES ---
-        # Ensure the interactor and render window are initialized.
-        # This might be done implicitly by Plotter(qt_widget=self) later,
-        # but being explicit can sometimes help.
-        if self.GetRenderWindow() and self.GetRenderWindow().GetInteractor():
-            self.GetRenderWindow().GetInteractor().Initialize()
-            # self.Start() # Start is usually for the blocking event loop, not always needed here
-            # when Qt's event loop is primary. Try with and without self.Start().
-            # If self.Start() blocks, then it's not right here.
-        else:
-            logging.warning("VedoQtCanvas: RenderWindow or Interactor not immediately available after super().__init__")
-        # --- END ADD ---
-
-    def GetPlotter(self, **kwargs_for_plotter): 
-        plt = Plotter(qt_widget=self, **kwargs_for_plotter)
-        # After plotter is created, it has initialized the render window and interactor.
-        # It's good to ensure the interactor is started if not done automatically by Plotter.
-        # This is usually done by the Qt event loop when the widget is shown.
-        # if plt.interactor and not plt.interactor.GetInitialized(): # Check if already initialized
-        #     plt.interactor.Initialize()
-        #     # plt.interactor.Start() # Not here, Qt's loop runs it
-        return plt    
-    def closeEvent(self, event): self.Finalize(); super().closeEvent(event)
-
-class EmbeddedVedoMultiViewWidget(QWidget):
-    def __init__(self, processor_instance, GridVisualizerClass, BarVisualizerClass, parent_main_window, plotter_kwargs=None): # Added parent_main_window
-        super().__init__(parent_main_window) # Pass parent to QWidget
-        if plotter_kwargs is None: plotter_kwargs = {}
-        self.vlayout = QVBoxLayout(self); self.vlayout.setContentsMargins(0,0,0,0)
-        self.vedo_canvas = VedoQtCanvas(self); self.vlayout.addWidget(self.vedo_canvas)
-        
-        plotter_args_for_main = {'shape':(1,2), 'sharecam':False} 
-        if plotter_kwargs: plotter_args_for_main.update(plotter_kwargs)
-        # Use the plotter_kwargs from MainAppWindow to set title for the whole window
-        main_plotter_title = plotter_kwargs.get('title', "Dental Visualizations")
-        self.main_plotter = self.vedo_canvas.GetPlotter(title=main_plotter_title, **plotter_args_for_main) 
-        
-        if not self.main_plotter or len(self.main_plotter.renderers) < 2:
-            logging.error("Failed to create main Vedo Plotter with 2 sub-renderers."); return
+class FrameStateProducer(QThread):
+    """Worker thread that computes complete frame states (shared data + every view's compute_frame_state) ahead of the playhead.
 
-        self.grid_visualizer = GridVisualizerClass(processor_instance, self.main_plotter, 0)
-        self.bar_visualizer = BarVisualizerClass(processor_instance, self.main_plotter, 1)
-        
-        # Link MainAppWindow to visualizers if they need to call its methods (like for graph updates)
-        # This replaces the set_animation_controller_for_graph_link
-        self.grid_visualizer.main_app_window_ref = parent_main_window
-        self.bar_visualizer.main_app_window_ref = parent_main_window
+    Ready states sit in a small ring keyed by timestamp index. The GUI thread only applies them to actors;
+    a miss (e.g. right after a seek) is computed on the GUI thread so the frame is never late.
+    """
+    def __init__(self, build_fn, num_frames, ring_size=32, parent=None):
+        super().__init__(parent)
+        self._build = build_fn # time_index -> FrameState with .views filled
+        self.num_frames = num_frames; self.ring_size = ring_size
+        self._ring = OrderedDict(); self._lock = threading.Lock()
+        self._cursor = 0; self._step = 1; self._wake = threading.Event(); self._stopped = False
+        self.hits = 0; self.misses = 0
+
+    def set_cursor(self, time_index, step=1):
+        """Playhead position and expected index advance per tick; production restarts from there."""
+        self._cursor = int(time_index); self._step = max(1, int(step)); self._wake.set()
+
+    def get(self, time_index):
+        with self._lock: state = self._ring.get(time_index)
+        if state is not None: self.hits += 1; return state
+        self.misses += 1
+        state = self._build(time_index)
+        self._store(time_index, state)
+        return state
+
+    def _store(self, time_index, state):
+        with self._lock:
+            self._ring[time_index] = state; self._ring.move_to_end(time_index)
+            while len(self._ring) > self.ring_size: self._ring.popitem(last=False) # Oldest first
+
+    def _upcoming(self, cursor, step):
+        """Indices the playhead will hit next (wrapping like looped playback), plus the neighbours behind for scrubbing."""
+        ahead = [(cursor + k * step) % self.num_frames for k in range(self.ring_size * 3 // 4)]
+        behind = [cursor - k for k in range(1, self.ring_size // 4) if cursor - k >= 0]
+        return ahead + behind
+
+    def stop(self):
+        self._stopped = True; self._wake.set(); self.wait(1000)
+
+    def run(self):
+        while not self._stopped:
+            self._wake.wait(); self._wake.clear()
+            cursor, step = self._cursor, self._step
+            for idx in self._upcoming(cursor, step):
+                if self._stopped or (self._cursor, self._step) != (cursor, step): break # Playhead moved: restart from it
+                with self._lock: ready = idx in self._ring
+                if ready: continue
+                try: self._store(idx, self._build(idx))
+                except Exception as e: logging.error(f"FrameStateProducer: failed to build frame {idx}: {e}")
+
+
+class StartupTimer:
+    """Wall-clock breakdown of the launch stages, logged once the first frame has been rendered."""
+    def __init__(self, t0=None):
+        self.t0 = _STARTUP_T0 if t0 is None else t0; self._last = self.t0
+        self.stages = OrderedDict()
+
+    def mark(self, stage):
+        """Attributes the time since the previous mark to stage (GUI-thread stages)."""
+        now = time.perf_counter(); self.stages[stage] = self.stages.get(stage, 0.0) + now - self._last; self._last = now
+
+    def add(self, stage, seconds): self.stages[stage] = self.stages.get(stage, 0.0) + seconds # Worker-thread stages
+
+    def add_parallel(self, timings):
+        """Adds worker-thread stage timings (stage -> seconds) and restarts the stage clock: they ran alongside the event loop."""
+        for stage, seconds in timings.items(): self.add(stage, seconds)
+        self._last = time.perf_counter()
+
+    def log(self):
+        total = time.perf_counter() - self.t0
+        logging.info("Startup timing: " + ", ".join(f"{stage} {seconds*1000:.0f} ms" for stage, seconds in self.stages.items())
+                     + f"; window-to-first-frame total {total*1000:.0f} ms")
+
+
+def _preload_view_modules():
+    """Imports the non-Qt heavy libraries used by the views (vedo/VTK, matplotlib) so the GUI thread finds them cached."""
+    import vedo, matplotlib.figure, matplotlib.collections # noqa: F401
+
+
+def load_recorded_session(progress, timings, duration=10, num_teeth=16, num_sensor_points_per_tooth=4, display_numbering=None):
+    """Worker-thread loader for the (simulated) recorded session; returns (processor, None)."""
+    t = time.perf_counter()
+    progress(5, "Loading libraries...")
+    from data_acquisition import SensorDataReader # pandas
+    from data_processing import DataProcessor
+    _preload_view_modules()
+    timings['heavy imports'] = time.perf_counter() - t; t = time.perf_counter()
+    progress(40, "Acquiring data...")
+    data = SensorDataReader().simulate_data(duration=duration, num_teeth=num_teeth, num_sensor_points_per_tooth=num_sensor_points_per_tooth)
+    timings['data'] = time.perf_counter() - t; t = time.perf_counter()
+    progress(65, "Processing data...")
+    processor = DataProcessor(data); processor.display_numbering = display_numbering; processor.create_force_matrix()
+    processor.get_tooth_average_matrix() # Graph series input, cached on the processor
+    timings['processing'] = time.perf_counter() - t
+    progress(90, "Building views...")
+    return processor, None
+
+
+def load_live_session(progress, timings, port='COM4', window_s=10.0, sample_period=0.05, num_teeth=16, num_sensor_points_per_tooth=4, display_numbering=None):
+    """Worker-thread loader for live mode: the processor only carries the sensor layout; returns (processor, LiveAcquisition)."""
+    t = time.perf_counter()
+    progress(5, "Loading libraries...")
+    from data_acquisition import SensorDataReader
+    from data_processing import DataProcessor
+    from live_acquisition import LiveAcquisition
+    _preload_view_modules()
+    timings['heavy imports'] = time.perf_counter() - t; t = time.perf_counter()
+    progress(50, "Connecting to sensor...")
+    pairs = [(tid, spid) for tid in range(1, num_teeth+1) for spid in range(1, num_sensor_points_per_tooth+1)]
+    processor = DataProcessor.from_force_matrix(np.full((1, len(pairs)), np.nan), [0.0], pairs, max_force_overall=100.0)
+    processor.display_numbering = display_numbering
+    reader = SensorDataReader(port=port); reader.connect()
+    live_acquisition = LiveAcquisition(reader, processor, window_s=window_s, sample_period=sample_period,
+                                       num_teeth=num_teeth, num_sensor_points_per_tooth=num_sensor_points_per_tooth)
+    timings['data'] = time.perf_counter() - t
+    progress(90, "Building views...")
+    return processor, live_acquisition
+
+
+class DataLoadWorker(QThread):
+    """Runs a loader (load_recorded_session / load_live_session) off the GUI thread and reports its progress."""
+    progress = pyqtSignal(int, str)
+    loaded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, load_fn, parent=None):
+        super().__init__(parent)
+        self.load_fn = load_fn; self.timings = OrderedDict()
+
+    def run(self):
+        try: result = self.load_fn(self.progress.emit, self.timings)
+        except Exception as e:
+            logging.error(f"Data loading failed: {e}", exc_info=True); self.failed.emit(str(e)); return
+        self.loaded.emit(result)
+
+
+class PlaybackWindowMixin:
+    """Recorded-session playback shared by MainAppWindow and ComparisonWindow (mixed into a QMainWindow).
+
+    Owns the loading page, the PlaybackClock-driven animation tick, the FrameStateProducer cursor, coalesced slider
+    seeks and the timeline/play/speed controls. A window provides playback_timestamps, _set_loaded_data, _build_views
+    and _update_views(frame_idx, timestamp, frame_state); _frame_shown and _frame_done are optional per-frame hooks.
+    """
+    timeline_format = "{:.1f}s"
+
+    def _init_playback(self, startup_timer=None):
+        self.startup_timer = startup_timer; self.data_loader = None
+        self.current_timestamp_idx = 0; self.is_animating = False; self.fps = 10
+        self.animation_timer = QTimer(self); self.animation_timer.setTimerType(Qt.PreciseTimer) # Tick jitter shows up directly as playback jitter
+        self.animation_timer.timeout.connect(self.animation_step)
+        self.playback_clock = None; self.frame_producer = None # Created with the views (compute_frame_state needs the built layout)
+        self.graph_qt_canvas = None; self.graph_visualizer = None
+        self.initial_graph_teeth = []; self.currently_graphed_tooth_ids = []
+        self._pending_seek_idx = None
+
+    @property
+    def playback_timestamps(self): raise NotImplementedError
+
+    def _setup_loading_ui(self):
+        page = QWidget(); self.setCentralWidget(page)
+        layout = QVBoxLayout(page); layout.addStretch(1)
+        self.loading_label = QLabel("Starting..."); self.loading_label.setAlignment(Qt.AlignCenter)
+        self.loading_progress = QProgressBar(); self.loading_progress.setRange(0, 100); self.loading_progress.setMaximumWidth(600)
+        layout.addWidget(self.loading_label); layout.addWidget(self.loading_progress, 0, Qt.AlignHCenter); layout.addStretch(1)
+
+    def load_data_async(self, load_fn):
+        """Runs load_fn(progress, timings) on a DataLoadWorker; the views are built on the GUI thread when it returns."""
+        self.data_loader = DataLoadWorker(load_fn, parent=self)
+        self.data_loader.progress.connect(self._on_load_progress) # Bound slots: delivered on the GUI thread
+        self.data_loader.loaded.connect(self._on_data_loaded)
+        self.data_loader.failed.connect(self._on_load_failed)
+        self.data_loader.start()
+
+    def _on_load_progress(self, percent, text): self.loading_progress.setValue(percent); self.loading_label.setText(text)
+
+    def _on_load_failed(self, message): self.loading_label.setText(f"Loading failed: {message}")
+
+    def _on_data_loaded(self, result):
+        self._set_loaded_data(result)
+        if self.startup_timer: self.startup_timer.add_parallel(self.data_loader.timings)
+        if not self.playback_timestamps:
+            logging.error("No timestamps. Nothing to display."); self.loading_label.setText("No data to display."); return
+        self._build_views()
+
+    def _start_frame_producer(self, build_fn):
+        """Frame states (force lookups, sums, percentages, COF count, bar scales/colours) are produced off the GUI thread."""
+        self.frame_producer = FrameStateProducer(build_fn, len(self.playback_timestamps), ring_size=32, parent=self)
+        self.frame_producer.start()
+
+    def _build_playback_controls(self):
+        """Creates the timeline slider/label, play button, speed combo and render stats label; returns the timeline row."""
+        timeline_layout = QHBoxLayout()
+        self.timeline_slider = QSlider(Qt.Horizontal)
+        self.timeline_slider.setRange(0, max(0, len(self.playback_timestamps) - 1))
+        self.timeline_slider.valueChanged.connect(self._on_timeline_changed)
+        self.timeline_label = QLabel("0.0s")
+        timeline_layout.addWidget(self.timeline_slider, 1); timeline_layout.addWidget(self.timeline_label)
+        self.play_pause_button = QPushButton("Play Animation"); self.play_pause_button.clicked.connect(self.toggle_animation)
+        self.speed_combo = QComboBox()
+        for speed in PLAYBACK_SPEEDS: self.speed_combo.addItem(f"{speed:g}x", speed)
+        self.speed_combo.setCurrentIndex(PLAYBACK_SPEEDS.index(1.0))
+        self.speed_combo.currentIndexChanged.connect(lambda i: self.playback_clock.set_speed(self.speed_combo.itemData(i)))
+        self.render_stats_label = QLabel("Render: - ms")
+        return timeline_layout
+
+    def animation_step(self):
+        if not self.playback_timestamps: self.toggle_animation(); return
+        frame_idx = self.playback_clock.next_frame()
+        if frame_idx is None: return # Frame due now is already on screen
+        if self.playback_clock.finished: self.toggle_animation()
+        render_start = time.perf_counter()
+        frame_state = self._show_frame(frame_idx)
+        self._frame_shown(frame_idx, frame_state)
+        render_time = time.perf_counter() - render_start
+        self.playback_clock.record_render_time(render_time)
+        if PERF.enabled: PERF.frame_done(render_start, render_time); PERF.set_counter('frames skipped', self.playback_clock.frames_skipped)
+        self._frame_done(frame_idx)
+        stats = self.playback_clock.stats()
+        self.render_stats_label.setText(f"Render: {stats['render_ms']:.0f} / {stats['budget_ms']:.0f} ms, skipped {stats['frames_skipped']}")
+
+    def _frame_shown(self, frame_idx, frame_state): pass # Counted in the render time (e.g. capture for recording)
+
+    def _frame_done(self, frame_idx): pass # After the render time is recorded (e.g. diagnostics)
+
+    def _show_frame(self, frame_idx):
+        """Renders timestamp index frame_idx in every view and the graph and moves the timeline; returns the frame state used."""
+        self.current_timestamp_idx = frame_idx
+        current_timestamp = self.playback_timestamps[frame_idx]
+        frame_state = None
+        if self.frame_producer:
+            with PERF.span('producer.get'): frame_state = self.frame_producer.get(frame_idx) # Built on the spot if the worker has not reached it
+            step = self.playback_clock.frames_per_tick(1.0 / self.fps) if self.is_animating else 1
+            self.frame_producer.set_cursor(frame_idx, step)
+
+        with PERF.span('views.update'): self._update_views(frame_idx, current_timestamp, frame_state)
 
+        if self.graph_visualizer.figure and self.graph_visualizer.ax: # Matplotlib update
+            with PERF.span('graph.update'):
+                self.graph_visualizer.update_graph_to_timestamp(current_timestamp, self.currently_graphed_tooth_ids)
+                self.graph_visualizer.update_time_indicator(current_timestamp)
+            with PERF.span('graph.draw'):
+                if self.graph_visualizer.use_blit: self.graph_visualizer.blit_frame()
+                else: self.graph_qt_canvas.draw_idle()
+
+        self.timeline_slider.blockSignals(True); self.timeline_slider.setValue(frame_idx); self.timeline_slider.blockSignals(False)
+        self.timeline_label.setText(self.timeline_format.format(current_timestamp))
+        return frame_state
+
+    def _on_timeline_changed(self, frame_idx):
+        """Slider seek: while playing the clock jumps there; while paused the frame is shown on the next event-loop pass."""
+        if not self.playback_timestamps: return
+        self.playback_clock.seek(self.playback_timestamps[frame_idx])
+        if self.is_animating: return
+        if self._pending_seek_idx is None: QTimer.singleShot(0, self._apply_pending_seek) # Coalesces a burst of drag events into one render
+        self._pending_seek_idx = frame_idx
+
+    def _apply_pending_seek(self):
+        frame_idx, self._pending_seek_idx = self._pending_seek_idx, None
+        if frame_idx is not None: self._show_frame(frame_idx)
 
-        if hasattr(self.grid_visualizer, 'setup_scene'): self.grid_visualizer.setup_scene()
-        if hasattr(self.bar_visualizer, 'setup_scene'): self.bar_visualizer.setup_scene()
-        
-        # --- Add ONE mouse click callback to the main_plotter ---
-        logging.info(f"EMBEDDED_VEDO: Registering master click dispatcher to {self.main_plotter}")
-        self.main_plotter.add_callback('mouse click', self._dispatch_mouse_click) # ONLY THIS ONE
-        # ---
+    def toggle_animation(self):
+        if self.is_animating:
+            self.animation_timer.stop(); self.playback_clock.pause()
+            self.play_pause_button.setText("Play Animation")
+            logging.info("Animation Paused.")
+        else:
+            if not self.playback_timestamps:
+                logging.warning("No data to animate."); self.play_pause_button.setText("Play Animation"); return
+            self._before_playback_start()
+            if self.current_timestamp_idx >= len(self.playback_timestamps): self.current_timestamp_idx = 0
+            self.playback_clock.start(self.playback_timestamps[self.current_timestamp_idx])
+            self.animation_timer.start(int(1000 / self.fps))
+            self.play_pause_button.setText("Pause Animation")
+            logging.info(f"Animation Started/Resumed at {self.fps} FPS.")
+        self.is_animating = not self.is_animating
 
-        self.Render() # Initial render
-    
-    def _dispatch_mouse_click(self, event): # event is vedo.interaction.Event
-        if not event: return
+    def _before_playback_start(self): pass
 
-        picked_actor = event.actor
-        
-        # event.at gives the renderer index for subplot clicks
-        renderer_index_of_click = getattr(event, 'at', None)
+    def _stop_playback(self):
+        """closeEvent part: stops the tick, waits for a running loader and stops the frame producer."""
+        self.animation_timer.stop()
+        if self.data_loader and self.data_loader.isRunning(): self.data_loader.wait(5000)
+        if self.frame_producer: self.frame_producer.stop()
 
-        logging.debug(f"DISPATCH_CLICK: Event received! Actor: {picked_actor.name if picked_actor else 'None'}. "
-                      f"Clicked Renderer Index (event.at): {renderer_index_of_click}.")
-        
-        if renderer_index_of_click is not None:
-            if renderer_index_of_click == self.grid_visualizer.renderer_index: # Assuming visualizers store their index
-                logging.debug("Dispatching click to Grid Visualizer (matched event.at).")
-                if hasattr(self.grid_visualizer, '_on_mouse_click'):
-                    self.grid_visualizer._on_mouse_click(event) # Pass original event
-                return 
-            elif renderer_index_of_click == self.bar_visualizer.renderer_index:
-                logging.debug("Dispatching click to 3D Bar Visualizer (matched event.at).")
-                if hasattr(self.bar_visualizer, '_on_mouse_click'):
-                    self.bar_visualizer._on_mouse_click(event) # Pass original event
-                return
-            # else: # Click was in a renderer index not assigned or out of bounds
-                # logging.warning(f"Click in renderer index {renderer_index_of_click}, but no visualizer assigned.")
-        
-        # Fallback if event.at was None (e.g. click outside any specific renderer viewport but still in window)
-        # OR if an actor was picked whose renderer couldn't be determined via event.at
-        # This part is less likely to be hit if event.at is reliable for subplots.
-        logging.info("Click not dispatched to a specific sub-renderer via event.at. Treating as general deselect.")
-        
-        # General deselect logic (as before, ensuring event.actor is None for visualizer handlers)
-        original_actor_for_fallback = event.actor 
-        event.actor = None 
-        if hasattr(self.grid_visualizer, '_on_mouse_click'):
-            self.grid_visualizer._on_mouse_click(event)
-        if hasattr(self.bar_visualizer, '_on_mouse_click'):
-            self.bar_visualizer._on_mouse_click(event)
-        event.actor = original_actor_for_fallback
-        
 
-    def update_views(self, timestamp):
-        # Grid visualizer (Renderer 0)
-        if self.grid_visualizer and hasattr(self.grid_visualizer, 'animate'):
-            self.main_plotter.at(0) # Activate renderer 0
-            self.grid_visualizer.animate(timestamp)
-        
-        # Bar visualizer (Renderer 1)
-        if self.bar_visualizer and hasattr(self.bar_visualizer, 'animate'):
-            self.main_plotter.at(1) # Activate renderer 1
-            self.bar_visualizer.animate(timestamp)
-        
-        if hasattr(self.vedo_canvas, 'Render'): self.vedo_canvas.Render() # Render the whole QVTK widget
-        elif self.main_plotter: self.main_plotter.render()
-
-        if self.vedo_canvas and hasattr(self.vedo_canvas, 'GetRenderWindow') and self.vedo_canvas.GetRenderWindow():
-            # logging.debug(f"EMBEDDED: Calling Render on vedo_canvas for {self.main_plotter.title}")
-            self.vedo_canvas.GetRenderWindow().Render() # More direct VTK render call               # logging.debug(f"EMBEDDED: Calling Render on vedo_canvas for {self.main_plotter.title}")
-
-    def get_frame_as_array(self, timestamp): # This screenshots the WHOLE Vedo window
-        self.update_views(timestamp) # Ensure both views are up-to-date for the timestamp
-        if self.main_plotter:
-            return self.main_plotter.screenshot(asarray=True)
-        return None
-    
-    def Render(self): # Expose Render method of the canvas
-        if hasattr(self.vedo_canvas, 'Render'): self.vedo_canvas.Render()
-        elif self.main_plotter: self.main_plotter.render()
-
-    def get_grid_visualizer(self): return self.grid_visualizer
-    def get_bar_visualizer(self): return self.bar_visualizer
-
-
-class MatplotlibCanvas(FigureCanvas): # ... (same as before) ...
-    def __init__(self, parent=None, width=5, height=4, dpi=100):
-        self.fig = Figure(figsize=(width, height), dpi=dpi); self.axes = self.fig.add_subplot(111)
-        super().__init__(self.fig); self.setParent(parent)
-
-class MainAppWindow(QMainWindow):
-    def __init__(self, processor):
+class MainAppWindow(PlaybackWindowMixin, QMainWindow):
+    def __init__(self, processor=None, live_acquisition=None, startup_timer=None):
+        """Builds the views right away when a processor is given; otherwise shows a progress page until load_data_async finishes."""
         super().__init__(); # ... (most initializations same) ...
-        self.processor = processor; self.current_timestamp_idx = 0
-        self.animation_timer = QTimer(self); self.is_animating = False; self.graph_time_indicator = None
+        self.processor = processor; self._init_playback(startup_timer)
+        # Live mode: processor only provides the sensor layout; frames come from live_acquisition's ring buffer
+        self.live_acquisition = live_acquisition
+        self.live_display_timer = QTimer(self); self.live_display_timer.setTimerType(Qt.PreciseTimer)
+        self.live_display_fps = 30 # Display rate, independent of the sensor sample rate
+        self.latency_meter = LatencyMeter(target_ms=50.0); self._live_shown_seq = 0
+        self.graph_time_indicator = None
         self.setWindowTitle("Dental Force Visualization Suite (PyQt - Single Vedo Window)"); self.setGeometry(50, 50, 1800, 960) 
-        self.initial_graph_teeth = []; self.currently_graphed_tooth_ids = []; self.last_animated_timestamp = None
-        self.output_video_filename="composite_dental_animation.mp4"; self.canvas_width=1920; self.canvas_height=1080
-        self.fps = 10; self.video_writer = None 
+        self.last_animated_timestamp = None
+        self.output_video_filename="composite_dental_animation.mp4"; self.canvas_width=None; self.canvas_height=None # From video_export on first recording
+        self.video_writer = None 
+        # Composition + encoding run on a worker thread; when it falls behind, frames are dropped rather than stalling playback
+        self.frame_writer = None; self.video_queue_size = 8; self.video_drop_when_full = True
+        self.vedo_multiview_widget = None
+        self.perf_overlay = None; self.perf_overlay_timer = QTimer(self) # Overlay text refresh (4 Hz, not per frame)
+        self.perf_trace_basename = "perf_trace" # Written as .json (Chrome trace) and .csv
+        # Leak diagnostics: set leak_sample_every_frames before the views are built to sample actors/RSS/allocations
+        self.leak_sample_every_frames = None; self.leak_monitor = None
+        # Shared-memory frame feed for other local tools: set frame_feed_name before the views are built to publish every shown frame
+        self.frame_feed_name = None; self.frame_feed_port = 0; self.frame_feed_slots = 4; self.frame_feed = None
         global _main_app_window_instance_for_atexit; _main_app_window_instance_for_atexit = self
         self.setStyleSheet("background-color: lightblue;")
+        if processor is not None: self._build_views()
+        else: self._setup_loading_ui()
+
+    @property
+    def playback_timestamps(self): return self.processor.timestamps or []
+
+    def _set_loaded_data(self, result): self.processor, self.live_acquisition = result
+
+    def _build_views(self):
+        """Imports the view libraries and builds the graph, the vedo multiview and the controls, then renders the first frame."""
+        from qt_views import EmbeddedVedoMultiViewWidget, MatplotlibCanvas # vedo/VTK + matplotlib Qt backends
+        from graph_visualization_qt import GraphVisualizerQt
+        from dental_arch_grid_visualization_qt import DentalArchGridVisualizerQt
+        from dental_arch_3d_bar_visualization_qt import DentalArch3DBarVisualizerQt
+        if self.startup_timer: self.startup_timer.mark('view imports')
+        # Ticks run at self.fps; which frame each tick shows comes from wall time x speed, not from a +1 step
+        self.playback_clock = PlaybackClock(self.processor.timestamps or [], speed=1.0, loop=True, frame_budget_s=1.0/self.fps)
 
         self.graph_qt_canvas = MatplotlibCanvas(self); 
         self.graph_visualizer = GraphVisualizerQt(self.processor)
         self.graph_visualizer.set_figure_axes(self.graph_qt_canvas.fig, self.graph_qt_canvas.axes)
+        self.graph_visualizer.enable_blit(True) # Per-frame graph cost: restore background + draw lines/indicator only
         # ... (graph init) ...
         
         if self.processor.tooth_ids: 
@@ -228,7 +405,9 @@ class MainAppWindow(QMainWindow):
         self.detailed_info_label.setWordWrap(True); self.detailed_info_label.setAlignment(Qt.AlignTop | Qt.AlignLeft)
         self.detailed_info_label.setMinimumWidth(200); self.detailed_info_label.setMaximumWidth(300)
 
-        self._setup_ui(); self._setup_animation_timer()
+        self._setup_ui()
+        if self.startup_timer: self.startup_timer.mark('scene setup')
+        if self.processor.timestamps and self.live_acquisition is None: self._start_frame_producer(self.vedo_multiview_widget.compute_frame_state)
         if self.processor.timestamps:
             first_ts = self.processor.timestamps[0]
             self.last_animated_timestamp = first_ts 
@@ -237,18 +416,46 @@ class MainAppWindow(QMainWindow):
             # These calls should update actors and then EmbeddedVedoMultiViewWidget's update_views
             # calls vedo_canvas.Render()
             self.vedo_multiview_widget.update_views(first_ts) 
+            self.graph_qt_canvas.draw()
+            QTimer.singleShot(0, lambda: self.vedo_multiview_widget.update_views(first_ts)) # Again once the new layout has its final size
             logging.info("Initial render of Vedo views attempt complete.")
+        if self.startup_timer: self.startup_timer.mark('first frame'); self.startup_timer.log()
+        if self.leak_sample_every_frames:
+            from leak_diagnostics import LeakMonitor
+            self.leak_monitor = LeakMonitor(lambda: self.vedo_multiview_widget.main_plotter.renderers,
+                                            self.leak_sample_every_frames, csv_path="leak_diagnostics.csv")
+        if self.frame_feed_name: self._start_frame_feed()
+        if self.live_acquisition is not None: self._setup_live_mode()
+
+    def _start_frame_feed(self):
+        """Publishes every shown frame and its metrics (frame_feed); composition and publishing run on the frame writer thread."""
+        from frame_feed import FrameFeedPublisher
+        from video_export import AsyncFrameWriter, VIDEO_CANVAS_WIDTH, VIDEO_CANVAS_HEIGHT
+        self.canvas_width = self.canvas_width or VIDEO_CANVAS_WIDTH; self.canvas_height = self.canvas_height or VIDEO_CANVAS_HEIGHT
+        try: self.frame_feed = FrameFeedPublisher(self.frame_feed_name, self.canvas_width, self.canvas_height, self.processor.tooth_ids or [],
+                                                  slots=self.frame_feed_slots, port=self.frame_feed_port)
+        except OSError as e: logging.error(f"Frame feed '{self.frame_feed_name}' not started: {e}"); return # e.g. name in use by another instance
+        # The MP4 writer is attached to this frame writer when recording starts (one composition for both outputs)
+        self.frame_writer = AsyncFrameWriter(None, self.canvas_width, self.canvas_height, max_queue=self.video_queue_size,
+                                             drop_when_full=True, frame_feed=self.frame_feed)
 
 
     def _initialize_video_writer(self): # ... (same as before) ...
         if self.video_writer is None:
+            import cv2 # Recording only: OpenCV is loaded the first time playback starts
+            from video_export import AsyncFrameWriter, VIDEO_CANVAS_WIDTH, VIDEO_CANVAS_HEIGHT
+            self.canvas_width = self.canvas_width or VIDEO_CANVAS_WIDTH; self.canvas_height = self.canvas_height or VIDEO_CANVAS_HEIGHT
             if os.path.exists(self.output_video_filename):
                 try: os.remove(self.output_video_filename); logging.info(f"Removed existing: {self.output_video_filename}")
                 except Exception as e: logging.warning(f"Could not remove {self.output_video_filename}: {e}")
             fourcc = cv2.VideoWriter_fourcc(*'mp4v'); self.video_writer = cv2.VideoWriter(self.output_video_filename,fourcc,float(self.fps),(self.canvas_width,self.canvas_height))
             global _main_app_window_instance_for_atexit; _main_app_window_instance_for_atexit = self
             if not self.video_writer.isOpened(): logging.error(f"Could not open video writer for {self.output_video_filename}"); self.video_writer = None; _main_app_window_instance_for_atexit = None
-            else: logging.info(f"Video writer opened for {self.output_video_filename} at {self.fps} FPS.")
+            else:
+                logging.info(f"Video writer opened for {self.output_video_filename} at {self.fps} FPS.")
+                if self.frame_writer: self.frame_writer.video_writer = self.video_writer # Frame feed already running
+                else: self.frame_writer = AsyncFrameWriter(self.video_writer, self.canvas_width, self.canvas_height,
+                                                           max_queue=self.video_queue_size, drop_when_full=self.video_drop_when_full)
         return self.video_writer is not None and self.video_writer.isOpened()
 
 
@@ -263,12 +470,39 @@ class MainAppWindow(QMainWindow):
         main_vertical_layout.addLayout(top_area_layout, 3)
 
         main_vertical_layout.addWidget(self.graph_qt_canvas, 2)
+
+        main_vertical_layout.addLayout(self._build_playback_controls())
         # ... (controls layout as before) ...
-        controls_layout=QHBoxLayout(); self.play_pause_button=QPushButton("Play Animation"); self.play_pause_button.clicked.connect(self.toggle_animation)
+        controls_layout=QHBoxLayout()
         self.reset_3d_view_button = QPushButton("Reset 3D View"); self.reset_3d_view_button.clicked.connect(self.reset_3d_bar_camera_in_multiview) # New handler
-        controls_layout.addStretch(1); controls_layout.addWidget(self.play_pause_button); controls_layout.addWidget(self.reset_3d_view_button); controls_layout.addStretch(1)
+        if self.live_acquisition is not None: self.render_stats_label.setText("Latency: - ms")
+        self.perf_button = QPushButton("Perf Overlay"); self.perf_button.setCheckable(True)
+        self.perf_button.toggled.connect(self.set_perf_overlay)
+        controls_layout.addStretch(1); controls_layout.addWidget(self.play_pause_button); controls_layout.addWidget(self.speed_combo)
+        controls_layout.addWidget(self.reset_3d_view_button); controls_layout.addWidget(self.render_stats_label); controls_layout.addWidget(self.perf_button); controls_layout.addStretch(1)
         main_vertical_layout.addLayout(controls_layout)
 
+        # Per-stage timing overlay, drawn over the graph canvas (the VTK widget is a native window and would cover it)
+        self.perf_overlay = QLabel(self.graph_qt_canvas); self.perf_overlay.move(8, 8); self.perf_overlay.hide()
+        self.perf_overlay.setStyleSheet("background-color: rgba(0, 0, 0, 170); color: white; font-family: monospace; padding: 4px;")
+        self.perf_overlay_timer.timeout.connect(self._refresh_perf_overlay)
+        if PERF.enabled: self.perf_button.setChecked(True) # DENTAL_PERF=1
+
+
+    def set_perf_overlay(self, enabled):
+        """Turns span recording and the overlay on/off; turning it off writes the recorded trace."""
+        if enabled:
+            PERF.set_enabled(True); self.perf_overlay.show(); self.perf_overlay.raise_(); self.perf_overlay_timer.start(250)
+        else:
+            self.perf_overlay_timer.stop(); self.perf_overlay.hide()
+            self.dump_perf_trace(); PERF.set_enabled(False)
+
+    def _refresh_perf_overlay(self):
+        self.perf_overlay.setText(PERF.overlay_text()); self.perf_overlay.adjustSize()
+
+    def dump_perf_trace(self):
+        if not PERF.frames: return
+        PERF.dump_chrome_trace(self.perf_trace_basename + ".json"); PERF.dump_csv(self.perf_trace_basename + ".csv")
 
     def reset_3d_bar_camera_in_multiview(self):
         """Calls reset on the 3D bar visualizer within the multiview widget."""
@@ -280,90 +514,90 @@ class MainAppWindow(QMainWindow):
                 self.vedo_multiview_widget.Render()
 
 
-    def animation_step(self): 
-        if not self.processor.timestamps: self.toggle_animation(); return
-        current_timestamp = self.processor.timestamps[self.current_timestamp_idx]
-        self.last_animated_timestamp = current_timestamp
-        
-        self.vedo_multiview_widget.update_views(current_timestamp) # Updates both Vedo views
-        
-        if self.graph_visualizer.figure and self.graph_visualizer.ax: # Matplotlib update
-            self.graph_visualizer.update_graph_to_timestamp(current_timestamp, self.currently_graphed_tooth_ids)
-            self.graph_visualizer.update_time_indicator(current_timestamp) 
-            self.graph_qt_canvas.draw_idle()
-        
-        if self.video_writer and self.video_writer.isOpened():
-            # Get frame from the single Vedo multiview widget
-            frame_vedo_multiview = self.vedo_multiview_widget.get_frame_as_array(current_timestamp)
-            frame_graph = self.graph_visualizer.get_frame_as_array(current_timestamp, self.currently_graphed_tooth_ids)
-            
-            canvas=np.zeros((self.canvas_height,self.canvas_width,3),dtype=np.uint8); canvas[:]=(210,210,210)
-            
-            # Layout for video: Vedo multiview on top, graph below
-            h_vedo_area = int(self.canvas_height * 0.65)
-            h_graph_area = self.canvas_height - h_vedo_area
-
-            if frame_vedo_multiview is not None:
-                resized_vedo = cv2.resize(frame_vedo_multiview, (self.canvas_width, h_vedo_area))
-                canvas[0:h_vedo_area, 0:self.canvas_width] = resized_vedo
-            if frame_graph is not None:
-                resized_graph = cv2.resize(frame_graph, (self.canvas_width, h_graph_area))
-                canvas[h_vedo_area:self.canvas_height, 0:self.canvas_width] = resized_graph
-            self.video_writer.write(canvas)
-        
-        self.current_timestamp_idx=(self.current_timestamp_idx+1)%len(self.processor.timestamps)
-        logging.debug(f"Qt App Step: Time {current_timestamp:.1f}s")
-
+    def _frame_shown(self, frame_idx, frame_state):
+        if (self.video_writer and self.video_writer.isOpened()) or self.frame_feed:
+            self._submit_composite_frame(self.processor.timestamps[frame_idx], frame_state)
+
+    def _frame_done(self, frame_idx):
+        if self.leak_monitor: self.leak_monitor.on_frame()
+        if PERF.enabled and self.frame_writer: PERF.set_counter('video frames dropped', self.frame_writer.frames_dropped)
+        logging.debug(f"Qt App Step: Time {self.processor.timestamps[frame_idx]:.1f}s")
+
+    def _update_views(self, frame_idx, timestamp, frame_state):
+        self.last_animated_timestamp = timestamp
+        self.vedo_multiview_widget.update_views(timestamp, frame_state) # Updates both Vedo views
+
+    def _submit_composite_frame(self, timestamp, frame_state):
+        """Captures the frame _show_frame just rendered and queues it with its metrics for the MP4 and/or the frame feed."""
+        if not self.frame_writer: return
+        with PERF.span('capture.vedo'): frame_vedo_multiview = self.vedo_multiview_widget.capture_array()
+        with PERF.span('capture.graph'):
+            if self.graph_visualizer.use_blit: frame_graph = self.graph_visualizer.capture_buffer() # Blitted for this frame already
+            else: frame_graph = self.graph_visualizer.get_frame_as_array(timestamp, self.currently_graphed_tooth_ids)
+        metrics = self._frame_metrics(timestamp, frame_state) if self.frame_feed else None
+        # Layout, encoding and publishing happen on the writer thread; the graph frame is copied into a pooled buffer on submit
+        with PERF.span('video.submit'): self.frame_writer.submit(frame_vedo_multiview, frame_graph, metrics)
+
+    def _frame_metrics(self, timestamp, frame_state):
+        """FeedMetrics of a shown frame from its FrameState (no extra force lookups)."""
+        if frame_state is None: return None
+        view_state = frame_state.views.get('grid')
+        lr = view_state['lr'] if view_state else self.vedo_multiview_widget.get_grid_visualizer().lr_shares(frame_state.tooth_totals)
+        n_cof = frame_state.cof_count
+        cof = self.processor.cof_xy[n_cof - 1] if 0 < n_cof <= len(self.processor.cof_xy) else (np.nan, np.nan)
+        return FeedMetrics(frame_state.time_index, timestamp, frame_state.tooth_totals, frame_state.percentages, lr, cof)
+
+    def _setup_live_mode(self):
+        """Live mode: no timeline, speed or recording; the display timer shows the newest acquired frame."""
+        self.timeline_slider.setEnabled(False); self.speed_combo.setEnabled(False)
+        self.graph_visualizer.set_live_window(self.live_acquisition.window_s)
+        self.live_display_timer.timeout.connect(self.live_display_step)
+        self.live_acquisition.start()
+        self.live_display_timer.start(int(1000 / self.live_display_fps)); self.is_animating = True
+        self.play_pause_button.setText("Pause Live")
+
+    def live_display_step(self):
+        """Display-rate tick: renders the newest complete frame once, then measures its sample-to-screen latency."""
+        latest = self.live_acquisition.buffer.latest()
+        if latest is None or latest[0] == self._live_shown_seq: return # Nothing new since the last tick
+        self._live_shown_seq, timestamp, row, arrival_time = latest
+        step_start = time.perf_counter()
+        self.last_animated_timestamp = timestamp
+        frame_state = frame_state_from_row(self.processor, row, timestamp)
+        with PERF.span('views.update'): self.vedo_multiview_widget.update_views(timestamp, frame_state)
+        if self.graph_visualizer.figure and self.graph_visualizer.ax:
+            with PERF.span('graph.update'): self.graph_visualizer.update_live_window(*self.live_acquisition.buffer.window(self.live_acquisition.window_s))
+            with PERF.span('graph.draw'):
+                if self.graph_visualizer.use_blit: self.graph_visualizer.blit_frame()
+                else: self.graph_qt_canvas.draw_idle()
+        if self.frame_feed: self._submit_composite_frame(timestamp, frame_state)
+        PERF.frame_done(step_start, time.perf_counter() - step_start)
+        if self.leak_monitor: self.leak_monitor.on_frame()
+        self.latency_meter.record(arrival_time)
+        stats = self.latency_meter.stats()
+        self.render_stats_label.setText(f"Latency: {stats['last_ms']:.0f} ms (avg {stats['avg_ms']:.0f}, max {stats['max_ms']:.0f}, "
+                                        f"target < {stats['target_ms']:.0f})")
+        self.render_stats_label.setStyleSheet("" if self.latency_meter.within_target else "color: red;")
+        self.timeline_label.setText(f"{timestamp:.1f}s")
 
-    def _setup_animation_timer(self): self.animation_timer.timeout.connect(self.animation_step)
-    
     def toggle_animation(self):
-        if self.is_animating:
-            # --- PAUSING ---
-            self.animation_timer.stop()
-            self.play_pause_button.setText("Play Animation")
-            logging.info("Animation Paused.")
-            # Optionally, release video writer on pause if you only want to record continuous segments
-            # if self.video_writer and self.video_writer.isOpened():
-            #     logging.info("Releasing video writer on pause.")
-            #     self.video_writer.release()
-            #     self.video_writer = None 
-            #     global _main_app_window_instance_for_atexit # So atexit knows it's handled
-            #     _main_app_window_instance_for_atexit = None # If MainAppWindow instance changes or script ends
-        else:
-            # --- STARTING or RESUMING ---
-            if not self.processor.timestamps or len(self.processor.timestamps) == 0:
-                logging.warning("No data to animate.")
-                self.is_animating = False # Ensure state is correct
-                self.play_pause_button.setText("Play Animation")
-                return
-
-            # Initialize or re-initialize video writer if not already open
-            # This allows recording to start/resume when play is pressed
-            if not hasattr(self, 'video_writer') or self.video_writer is None or not self.video_writer.isOpened():
-                if not self._initialize_video_writer(): # Try to initialize
-                    logging.warning("Video writer could not be initialized. Animation will play without recording.")
-                # If _initialize_video_writer fails, self.video_writer will be None,
-                # and the compositing step will safely skip writing frames.
-            
-            # Reset current_timestamp_idx to 0 if you want "Play" to always restart from beginning
-            # self.current_timestamp_idx = 0 
-            # Or, to resume, just ensure it's valid:
-            if self.current_timestamp_idx >= len(self.processor.timestamps):
-                self.current_timestamp_idx = 0
-
-
-            self.animation_timer.start(int(1000 / self.fps))
-            self.play_pause_button.setText("Pause Animation")
-            logging.info(f"Animation Started/Resumed at {self.fps} FPS.")
-        
-        self.is_animating = not self.is_animating
+        if self.live_acquisition is not None: # Live: pause/resume the display only; acquisition keeps filling the buffer
+            if self.is_animating: self.live_display_timer.stop(); self.play_pause_button.setText("Resume Live")
+            else: self.live_display_timer.start(int(1000 / self.live_display_fps)); self.play_pause_button.setText("Pause Live")
+            self.is_animating = not self.is_animating
+            return
+        super().toggle_animation()
+
+    def _before_playback_start(self):
+        # Recording starts (or resumes into the same file) when play is pressed; without a writer playback just isn't recorded
+        if self.video_writer is None or not self.video_writer.isOpened():
+            if not self._initialize_video_writer(): logging.warning("Video writer could not be initialized. Animation will play without recording.")
 
     def update_graph_on_click(self, sel_tid=None): # ... (same logic)
         new_ids = [sel_tid] if sel_tid is not None else self.initial_graph_teeth
-        if new_ids!=self.currently_graphed_tooth_ids or not self.graph_visualizer.lines:
+        if new_ids!=self.currently_graphed_tooth_ids or not self.graph_visualizer.plotted_tooth_ids:
             self.graph_visualizer.plot_tooth_lines(new_ids); self.currently_graphed_tooth_ids=new_ids
-            if self.processor.timestamps:
+            if self.processor.timestamps and self.live_acquisition is None: # Live: the next display tick fills the lines
                 curr_t = self.processor.timestamps[self.current_timestamp_idx]
                 self.graph_visualizer.update_graph_to_timestamp(curr_t,new_ids)
                 self.graph_visualizer.update_time_indicator(curr_t)
@@ -373,13 +607,23 @@ class MainAppWindow(QMainWindow):
 
 
     def closeEvent(self, event): # ... (same as before) ...
-        logging.info("Main window closing..."); self.animation_timer.stop()
+        logging.info("Main window closing..."); self.live_display_timer.stop(); self._stop_playback()
+        if PERF.enabled: self.dump_perf_trace()
+        if self.leak_monitor: self.leak_monitor.stop()
+        if self.live_acquisition: self.live_acquisition.stop()
         if hasattr(self, 'video_writer') and self.video_writer and self.video_writer.isOpened():
             logging.info("Releasing video writer from MainAppWindow closeEvent.")
-            self.video_writer.release(); self.video_writer = None
+            self._release_video_writer()
             global _video_writer_for_atexit; _video_writer_for_atexit = None 
+        if self.frame_writer: self.frame_writer.close(); self.frame_writer = None # Feed-only writer
+        if self.frame_feed: self.frame_feed.close(); self.frame_feed = None
         super().closeEvent(event)
 
+    def _release_video_writer(self):
+        """Drains the frame writer thread (every queued frame is still written), then releases the cv2 writer."""
+        if self.frame_writer: self.frame_writer.close(); self.frame_writer = None
+        if self.video_writer: self.video_writer.release(); self.video_writer = None
+
     def request_main_vedo_render(self):
         if hasattr(self.vedo_multiview_widget, 'Render'):
             self.vedo_multiview_widget.Render()
@@ -397,21 +641,35 @@ class MainAppWindow(QMainWindow):
             logging.warning("MAIN_APP: vedo_multiview_widget not found for forced render.")
             
 
-if __name__ == '__main__': # ... (same __main__ as before) ...
+if __name__ == '__main__':
+    startup_timer = StartupTimer(); startup_timer.mark('import')
     app = QApplication(sys.argv)
-    reader=SensorDataReader(); data=reader.simulate_data(duration=10,num_teeth=16,num_sensor_points_per_tooth=4)
-    processor=DataProcessor(data); processor.create_force_matrix()
-    if not processor.timestamps: logging.error("No timestamps. Exiting."); sys.exit(-1)
-    main_window = MainAppWindow(processor) 
-    main_window.show()
-    # --- ADD A SLIGHT DELAY AND FORCE UPDATE AFTER SHOW ---
-    # This gives Qt time to fully process the window show event and layout calculations.
-    # QTimer.singleShot(50, lambda: main_window.animation_step() if main_window.processor.timestamps else None)
-    # Or, more simply for initial display if animation isn't auto-playing:
-    if main_window.processor.timestamps:
-        QTimer.singleShot(100, lambda: main_window.vedo_multiview_widget.update_views(main_window.processor.timestamps[0]))
-        QTimer.singleShot(120, lambda: main_window.graph_qt_canvas.draw_idle()) # Also update graph
-    # --- END ADD ---
+    parser = argparse.ArgumentParser(description="Dental force visualization suite.")
+    parser.add_argument('--live', action='store_true', help="Stream from the sensor (simulated if not connected) instead of a recorded session.")
+    parser.add_argument('--port', default='COM4', help="Serial port of the sensor in live mode.")
+    parser.add_argument('--window', type=float, default=10.0, help="Seconds shown by the live graph.")
+    parser.add_argument('--sample-period', type=float, default=0.05, help="Frame period of the simulated live stream (s).")
+    parser.add_argument('--sensors', type=int, default=4, help="Sensor points per tooth of the simulated sensor (e.g. 256 for a 16x16 grid).")
+    parser.add_argument('--num-teeth', type=int, default=16, help="Teeth of the simulated sensor (32 = both arches, Universal numbering).")
+    parser.add_argument('--numbering', choices=('universal', 'fdi'), default=None, help="Tooth numbering of the labels (default: as recorded).")
+    parser.add_argument('--leak-diagnostics', type=int, default=None, metavar='N',
+                        help="Sample VTK actors, RSS and Python allocations every N frames and flag steady growth (leak_diagnostics.csv).")
+    parser.add_argument('--feed', nargs='?', const=DEFAULT_FEED_NAME, default=None, metavar='NAME',
+                        help=f"Publish every shown frame and its metrics to shared memory NAME (default {DEFAULT_FEED_NAME}); read with frame_feed.FrameFeedReader.")
+    parser.add_argument('--feed-port', type=int, default=0, help="UDP port on 127.0.0.1 for the feed's frame notifications (0 = any free port).")
+    args, _ = parser.parse_known_args(app.arguments()[1:]) # Qt consumes its own options
+    if args.live:
+        load_fn = lambda progress, timings: load_live_session(progress, timings, port=args.port, window_s=args.window, sample_period=args.sample_period,
+                                                              num_teeth=args.num_teeth, num_sensor_points_per_tooth=args.sensors, display_numbering=args.numbering)
+    else:
+        load_fn = lambda progress, timings: load_recorded_session(progress, timings, num_teeth=args.num_teeth, num_sensor_points_per_tooth=args.sensors,
+                                                                  display_numbering=args.numbering)
+    # The window (with a progress bar) appears first; data loading runs on a worker and the views are built when it finishes
+    main_window = MainAppWindow(startup_timer=startup_timer)
+    main_window.leak_sample_every_frames = args.leak_diagnostics
+    main_window.frame_feed_name = args.feed; main_window.frame_feed_port = args.feed_port
+    main_window.show(); startup_timer.mark('window')
+    main_window.load_data_async(load_fn)
 
     sys.exit(app.exec_())
-# --- END OF FILE main_qt_app.py --
\ No newline at end of file
+# --- END OF FILE main_qt_app.py ---
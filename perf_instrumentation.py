@@ -0,0 +1,130 @@
+# --- START OF FILE perf_instrumentation.py ---
+import os
+import csv
+import json
+import time
+import logging
+import threading
+from collections import deque
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class _NullSpan:
+    """Returned by PerfRecorder.span() while disabled: entering/leaving it costs two no-op calls."""
+    __slots__ = ()
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('recorder', 'name', 'start')
+    def __init__(self, recorder, name): self.recorder = recorder; self.name = name
+    def __enter__(self): self.start = time.perf_counter(); return self
+    def __exit__(self, *exc):
+        self.recorder.record(self.name, self.start, time.perf_counter() - self.start); return False
+
+
+class PerfRecorder:
+    """Named timing spans with a rolling history per stage and a bounded trace of raw events.
+
+    Usage: `with PERF.span('grid.apply'): ...`. While disabled, span() returns a shared no-op context manager,
+    so instrumented code pays one attribute check per span. Spans may be recorded from any thread.
+    """
+    def __init__(self, enabled=False, history=600, trace_capacity=200000):
+        self.enabled = enabled
+        self.history = history
+        self._stages = {}                                # name -> deque of durations (s), last `history` samples
+        self._trace = deque(maxlen=trace_capacity)       # (name, start_s, duration_s, thread_name)
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        self.frames = 0
+
+    def span(self, name):
+        return _Span(self, name) if self.enabled else _NULL_SPAN
+
+    def set_enabled(self, enabled):
+        self.enabled = bool(enabled)
+        logging.info(f"Performance instrumentation {'enabled' if self.enabled else 'disabled'}.")
+
+    def record(self, name, start, duration):
+        with self._lock:
+            history = self._stages.get(name)
+            if history is None: history = self._stages[name] = deque(maxlen=self.history)
+            history.append(duration)
+            self._trace.append((name, start, duration, threading.current_thread().name))
+
+    def count(self, name, n=1):
+        if not self.enabled: return
+        with self._lock: self._counters[name] = self._counters.get(name, 0) + n
+
+    def set_counter(self, name, value):
+        """Absolute value for externally tracked counters (e.g. frames skipped by the playback clock)."""
+        if not self.enabled: return
+        with self._lock: self._counters[name] = value
+
+    def frame_done(self, start, duration):
+        """Records one whole animation step as the 'frame' stage."""
+        if not self.enabled: return
+        self.record('frame', start, duration); self.frames += 1
+
+    def reset(self):
+        with self._lock: self._stages.clear(); self._trace.clear(); self._counters.clear()
+        self.frames = 0; self._t0 = time.perf_counter()
+
+    def stage_stats(self):
+        """{stage: {'count', 'last_ms', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms'}} over the rolling history."""
+        with self._lock: snapshot = {name: np.fromiter(h, dtype=float) for name, h in self._stages.items() if h}
+        stats = {}
+        for name, values in snapshot.items():
+            ms = values * 1000.0
+            p50, p95, p99 = np.percentile(ms, (50, 95, 99))
+            stats[name] = {'count': len(ms), 'last_ms': float(ms[-1]), 'mean_ms': float(ms.mean()),
+                           'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99), 'max_ms': float(ms.max())}
+        return stats
+
+    def histogram(self, name, bins=20):
+        """(counts, edges in ms) of the rolling history of one stage."""
+        with self._lock: values = np.fromiter(self._stages.get(name, ()), dtype=float) * 1000.0
+        return np.histogram(values, bins=bins)
+
+    def counters(self):
+        with self._lock: return dict(self._counters)
+
+    def overlay_text(self, max_stages=10):
+        """Short multi-line summary for the on-screen overlay: frame time, slowest stages, counters."""
+        stats = self.stage_stats()
+        lines = []
+        frame = stats.pop('frame', None)
+        if frame: lines.append(f"frame  {frame['last_ms']:6.1f} ms  p95 {frame['p95_ms']:6.1f}  ({1000.0 / max(frame['mean_ms'], 1e-6):.0f} fps)")
+        for name, s in sorted(stats.items(), key=lambda kv: -kv[1]['mean_ms'])[:max_stages]:
+            lines.append(f"{name:<22} {s['last_ms']:6.2f}  p95 {s['p95_ms']:6.2f}")
+        lines.extend(f"{name}: {value}" for name, value in sorted(self.counters().items()))
+        return "\n".join(lines) if lines else "No samples yet."
+
+    def dump_chrome_trace(self, path):
+        """Trace Event JSON (chrome://tracing, Perfetto): one complete event per span, microseconds from recorder start."""
+        pid = os.getpid()
+        with self._lock: events = list(self._trace); counters = dict(self._counters)
+        tids = {}
+        trace = [{'name': name, 'ph': 'X', 'ts': (start - self._t0) * 1e6, 'dur': duration * 1e6, 'pid': pid,
+                  'tid': tids.setdefault(thread, len(tids) + 1)} for name, start, duration, thread in events]
+        trace.extend({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': thread}} for thread, tid in tids.items())
+        with open(path, 'w') as f: json.dump({'traceEvents': trace, 'otherData': {'counters': counters}}, f)
+        logging.info(f"Performance trace ({len(events)} spans) written to {os.path.abspath(path)}")
+
+    def dump_csv(self, path):
+        with self._lock: events = list(self._trace)
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f); writer.writerow(['stage', 'start_ms', 'duration_ms', 'thread'])
+            for name, start, duration, thread in events: writer.writerow([name, f"{(start - self._t0) * 1000.0:.3f}", f"{duration * 1000.0:.3f}", thread])
+        logging.info(f"Performance trace ({len(events)} spans) written to {os.path.abspath(path)}")
+
+
+# Process-wide recorder used by the app and the visualizers; DENTAL_PERF=1 enables it from the start
+PERF = PerfRecorder(enabled=os.environ.get('DENTAL_PERF', '') == '1')
+# --- END OF FILE perf_instrumentation.py ---
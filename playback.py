@@ -0,0 +1,92 @@
+# --- START OF FILE playback.py ---
+import time
+import logging
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+PLAYBACK_SPEEDS = (0.25, 0.5, 1.0, 2.0, 4.0)
+
+
+class PlaybackClock:
+    """Maps wall-clock time x speed to session time, so playback speed does not depend on render time or sample density.
+
+    The animation timer only asks next_frame() which timestamp index is due; when rendering falls behind,
+    the due index jumps ahead and the frames in between are counted as skipped.
+    """
+    def __init__(self, timestamps, speed=1.0, loop=True, frame_budget_s=0.1, clock=time.perf_counter):
+        self.timestamps = np.asarray(timestamps, dtype=float)
+        self.speed = float(speed); self.loop = loop
+        self.frame_budget_s = frame_budget_s
+        self._clock = clock
+        self.start_time = self.timestamps[0] if len(self.timestamps) else 0.0
+        self.end_time = self.timestamps[-1] if len(self.timestamps) else 0.0
+        self.sample_step = float(np.median(np.diff(self.timestamps))) if len(self.timestamps) > 1 else 0.1
+        self._loop_period = (self.end_time - self.start_time) + self.sample_step # The last frame is shown for one sample step before wrapping
+        self._anchor_wall = None; self._anchor_session = self.start_time
+        self.last_index = -1; self.finished = False
+        self.frames_rendered = 0; self.frames_skipped = 0
+        self.last_render_time_s = 0.0; self.avg_render_time_s = 0.0 # Exponential moving average
+
+    @property
+    def running(self): return self._anchor_wall is not None
+
+    def start(self, session_time=None):
+        if session_time is not None: self._anchor_session = float(session_time)
+        self._anchor_wall = self._clock(); self.finished = False
+
+    def pause(self):
+        self._anchor_session = self.session_time(); self._anchor_wall = None
+
+    def seek(self, session_time):
+        """Jumps to session_time; playback continues from there if running."""
+        self._anchor_session = float(session_time); self.last_index = -1; self.finished = False
+        if self.running: self._anchor_wall = self._clock()
+
+    def set_speed(self, speed):
+        """Changes the multiplier without a jump in session time."""
+        if self.running: self._anchor_session = self.session_time(); self._anchor_wall = self._clock()
+        self.speed = float(speed)
+        logging.info(f"Playback speed set to {self.speed:g}x.")
+
+    def session_time(self):
+        if not self.running: return self._anchor_session
+        t = self._anchor_session + (self._clock() - self._anchor_wall) * self.speed
+        if t <= self.end_time or self._loop_period <= 0: return t
+        if self.loop: return self.start_time + (t - self.start_time) % self._loop_period
+        self.finished = True
+        return self.end_time
+
+    def index_for_time(self, session_time):
+        """Index of the timestamp nearest to session_time (binary search)."""
+        n = len(self.timestamps)
+        if n == 0: return -1
+        i = int(np.searchsorted(self.timestamps, session_time))
+        if i <= 0: return 0
+        if i >= n: return n - 1
+        return i if self.timestamps[i] - session_time < session_time - self.timestamps[i-1] else i - 1
+
+    def next_frame(self):
+        """Index of the frame due now, or None when it was already rendered."""
+        idx = self.index_for_time(self.session_time())
+        if idx < 0 or idx == self.last_index: return None
+        if idx > self.last_index >= 0: self.frames_skipped += idx - self.last_index - 1
+        self.last_index = idx
+        return idx
+
+    def frames_per_tick(self, tick_s):
+        """Expected index advance per timer tick at the current speed (at least 1), used to prefetch the right frames."""
+        return max(1, int(round(self.speed * tick_s / self.sample_step))) if self.sample_step > 0 else 1
+
+    def record_render_time(self, seconds):
+        self.last_render_time_s = seconds; self.frames_rendered += 1
+        self.avg_render_time_s = seconds if self.frames_rendered == 1 else 0.9 * self.avg_render_time_s + 0.1 * seconds
+
+    @property
+    def is_behind(self): return self.avg_render_time_s > self.frame_budget_s
+
+    def stats(self):
+        return {'speed': self.speed, 'session_time': self.session_time(), 'frames_rendered': self.frames_rendered,
+                'frames_skipped': self.frames_skipped, 'render_ms': self.avg_render_time_s * 1000.0,
+                'budget_ms': self.frame_budget_s * 1000.0}
+# --- END OF FILE playback.py ---
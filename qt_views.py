@@ -0,0 +1,168 @@
+# --- START OF FILE qt_views.py ---
+import logging
+
+from PyQt5.QtWidgets import QWidget, QVBoxLayout
+from vtkmodules.qt.QVTKRenderWindowInteractor import QVTKRenderWindowInteractor
+from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.figure import Figure
+from vedo import Plotter # Import base Plotter
+
+from frame_state import build_frame_state
+from perf_instrumentation import PERF
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Qt widgets backed by VTK/vedo and matplotlib. Kept out of main_qt_app so the window can appear
+# before these libraries are imported (main_qt_app imports this module once the data is loaded).
+
+class VedoQtCanvas(QVTKRenderWindowInteractor): # Same as before
+    def __init__(self, parent=None): 
+        super().__init__(parent)
+        # --- ADD THESE LINES ---
+        # Ensure the interactor and render window are initialized.
+        # This might be done implicitly by Plotter(qt_widget=self) later,
+        # but being explicit can sometimes help.
+        if self.GetRenderWindow() and self.GetRenderWindow().GetInteractor():
+            self.GetRenderWindow().GetInteractor().Initialize()
+            # self.Start() # Start is usually for the blocking event loop, not always needed here
+            # when Qt's event loop is primary. Try with and without self.Start().
+            # If self.Start() blocks, then it's not right here.
+        else:
+            logging.warning("VedoQtCanvas: RenderWindow or Interactor not immediately available after super().__init__")
+        # --- END ADD ---
+
+    def GetPlotter(self, **kwargs_for_plotter): 
+        plt = Plotter(qt_widget=self, **kwargs_for_plotter)
+        # After plotter is created, it has initialized the render window and interactor.
+        # It's good to ensure the interactor is started if not done automatically by Plotter.
+        # This is usually done by the Qt event loop when the widget is shown.
+        # if plt.interactor and not plt.interactor.GetInitialized(): # Check if already initialized
+        #     plt.interactor.Initialize()
+        #     # plt.interactor.Start() # Not here, Qt's loop runs it
+        return plt    
+    def closeEvent(self, event): self.Finalize(); super().closeEvent(event)
+
+class EmbeddedVedoMultiViewWidget(QWidget):
+    def __init__(self, processor_instance, GridVisualizerClass, BarVisualizerClass, parent_main_window, plotter_kwargs=None): # Added parent_main_window
+        super().__init__(parent_main_window) # Pass parent to QWidget
+        if plotter_kwargs is None: plotter_kwargs = {}
+        self.vlayout = QVBoxLayout(self); self.vlayout.setContentsMargins(0,0,0,0)
+        self.vedo_canvas = VedoQtCanvas(self); self.vlayout.addWidget(self.vedo_canvas)
+        
+        plotter_args_for_main = {'shape':(1,2), 'sharecam':False} 
+        if plotter_kwargs: plotter_args_for_main.update(plotter_kwargs)
+        # Use the plotter_kwargs from MainAppWindow to set title for the whole window
+        main_plotter_title = plotter_kwargs.get('title', "Dental Visualizations")
+        self.main_plotter = self.vedo_canvas.GetPlotter(title=main_plotter_title, **plotter_args_for_main) 
+        
+        if not self.main_plotter or len(self.main_plotter.renderers) < 2:
+            logging.error("Failed to create main Vedo Plotter with 2 sub-renderers."); return
+
+        self.grid_visualizer = GridVisualizerClass(processor_instance, self.main_plotter, 0)
+        self.bar_visualizer = BarVisualizerClass(processor_instance, self.main_plotter, 1)
+        
+        # Link MainAppWindow to visualizers if they need to call its methods (like for graph updates)
+        # This replaces the set_animation_controller_for_graph_link
+        self.grid_visualizer.main_app_window_ref = parent_main_window
+        self.bar_visualizer.main_app_window_ref = parent_main_window
+
+
+        if hasattr(self.grid_visualizer, 'setup_scene'): self.grid_visualizer.setup_scene()
+        if hasattr(self.bar_visualizer, 'setup_scene'): self.bar_visualizer.setup_scene()
+        
+        # --- Add ONE mouse click callback to the main_plotter ---
+        logging.info(f"EMBEDDED_VEDO: Registering master click dispatcher to {self.main_plotter}")
+        self.main_plotter.add_callback('mouse click', self._dispatch_mouse_click) # ONLY THIS ONE
+        # ---
+
+        self.Render() # Initial render
+    
+    def _dispatch_mouse_click(self, event): # event is vedo.interaction.Event
+        if not event: return
+
+        picked_actor = event.actor
+        
+        # event.at gives the renderer index for subplot clicks
+        renderer_index_of_click = getattr(event, 'at', None)
+
+        logging.debug(f"DISPATCH_CLICK: Event received! Actor: {picked_actor.name if picked_actor else 'None'}. "
+                      f"Clicked Renderer Index (event.at): {renderer_index_of_click}.")
+        
+        if renderer_index_of_click is not None:
+            if renderer_index_of_click == self.grid_visualizer.renderer_index: # Assuming visualizers store their index
+                logging.debug("Dispatching click to Grid Visualizer (matched event.at).")
+                if hasattr(self.grid_visualizer, '_on_mouse_click'):
+                    self.grid_visualizer._on_mouse_click(event) # Pass original event
+                return 
+            elif renderer_index_of_click == self.bar_visualizer.renderer_index:
+                logging.debug("Dispatching click to 3D Bar Visualizer (matched event.at).")
+                if hasattr(self.bar_visualizer, '_on_mouse_click'):
+                    self.bar_visualizer._on_mouse_click(event) # Pass original event
+                return
+            # else: # Click was in a renderer index not assigned or out of bounds
+                # logging.warning(f"Click in renderer index {renderer_index_of_click}, but no visualizer assigned.")
+        
+        # Fallback if event.at was None (e.g. click outside any specific renderer viewport but still in window)
+        # OR if an actor was picked whose renderer couldn't be determined via event.at
+        # This part is less likely to be hit if event.at is reliable for subplots.
+        logging.info("Click not dispatched to a specific sub-renderer via event.at. Treating as general deselect.")
+        
+        # General deselect logic (as before, ensuring event.actor is None for visualizer handlers)
+        original_actor_for_fallback = event.actor 
+        event.actor = None 
+        if hasattr(self.grid_visualizer, '_on_mouse_click'):
+            self.grid_visualizer._on_mouse_click(event)
+        if hasattr(self.bar_visualizer, '_on_mouse_click'):
+            self.bar_visualizer._on_mouse_click(event)
+        event.actor = original_actor_for_fallback
+        
+
+    def compute_frame_state(self, time_index):
+        """Pure: FrameState for time_index with every view's own state precomputed (runs on the producer thread)."""
+        frame_state = build_frame_state(self.grid_visualizer.processor, time_index)
+        frame_state.views['grid'] = self.grid_visualizer.compute_frame_state(frame_state)
+        frame_state.views['bar'] = self.bar_visualizer.compute_frame_state(frame_state)
+        return frame_state
+
+    def update_views(self, timestamp, frame_state=None): # frame_state: optional prefetched FrameState for timestamp
+        # Grid visualizer (Renderer 0)
+        if self.grid_visualizer and hasattr(self.grid_visualizer, 'animate'):
+            self.main_plotter.at(0) # Activate renderer 0
+            with PERF.span('grid.animate'): self.grid_visualizer.animate(timestamp, frame_state)
+        
+        # Bar visualizer (Renderer 1)
+        if self.bar_visualizer and hasattr(self.bar_visualizer, 'animate'):
+            self.main_plotter.at(1) # Activate renderer 1
+            with PERF.span('bar.animate'): self.bar_visualizer.animate(timestamp, frame_state)
+        
+        with PERF.span('vtk.render'):
+            if hasattr(self.vedo_canvas, 'Render'): self.vedo_canvas.Render() # Render the whole QVTK widget
+            elif self.main_plotter: self.main_plotter.render()
+
+            if self.vedo_canvas and hasattr(self.vedo_canvas, 'GetRenderWindow') and self.vedo_canvas.GetRenderWindow():
+                # logging.debug(f"EMBEDDED: Calling Render on vedo_canvas for {self.main_plotter.title}")
+                self.vedo_canvas.GetRenderWindow().Render() # More direct VTK render call
+
+    def get_frame_as_array(self, timestamp, frame_state=None): # This screenshots the WHOLE Vedo window
+        self.update_views(timestamp, frame_state) # Ensure both views are up-to-date for the timestamp
+        return self.capture_array()
+
+    def capture_array(self):
+        """Screenshot of the window as last rendered (the caller has just run update_views)."""
+        if self.main_plotter:
+            with PERF.span('vedo.screenshot'): return self.main_plotter.screenshot(asarray=True)
+        return None
+    
+    def Render(self): # Expose Render method of the canvas
+        if hasattr(self.vedo_canvas, 'Render'): self.vedo_canvas.Render()
+        elif self.main_plotter: self.main_plotter.render()
+
+    def get_grid_visualizer(self): return self.grid_visualizer
+    def get_bar_visualizer(self): return self.bar_visualizer
+
+
+class MatplotlibCanvas(FigureCanvas): # ... (same as before) ...
+    def __init__(self, parent=None, width=5, height=4, dpi=100):
+        self.fig = Figure(figsize=(width, height), dpi=dpi); self.axes = self.fig.add_subplot(111)
+        super().__init__(self.fig); self.setParent(parent)
+# --- END OF FILE qt_views.py ---
@@ -0,0 +1,73 @@
+# --- START OF FILE sensor_geometry.py ---
+import logging
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class SensorGridGeometry:
+    """Sensor points of one tooth laid out as a rows x cols grid, sensor ids in row-major order (row 0 at the top).
+
+    Positions are normalized to the tooth cell: x and y in [-0.5, 0.5], sensor centres at the middle of their sub-cell.
+    """
+    def __init__(self, rows, cols):
+        self.rows = max(1, int(rows)); self.cols = max(1, int(cols))
+
+    @property
+    def num_sensors(self): return self.rows * self.cols
+
+    @classmethod
+    def from_sensor_count(cls, num_sensors):
+        """Most square rows x cols grid holding exactly num_sensors (4 -> 2x2, 16 -> 4x4, 256 -> 16x16, 8 -> 2x4)."""
+        num_sensors = max(1, int(num_sensors))
+        rows = max(r for r in range(1, int(np.sqrt(num_sensors)) + 1) if num_sensors % r == 0)
+        return cls(rows, num_sensors // rows)
+
+    def normalized_positions(self):
+        """(num_sensors, 2) sensor centres in cell units, in sensor order."""
+        r, c = np.divmod(np.arange(self.num_sensors), self.cols)
+        return np.column_stack(((c + 0.5) / self.cols - 0.5, 0.5 - (r + 0.5) / self.rows))
+
+    def lattice_sources(self):
+        """(lattice_rows, lattice_cols, sensor index per lattice point) for drawing the grid as quads.
+
+        The heatmap places one mesh point per sensor and interpolates between them; a single row or column
+        is doubled so the tooth still gets a quad.
+        """
+        lattice_rows, lattice_cols = max(self.rows, 2), max(self.cols, 2)
+        li, lj = np.meshgrid(np.minimum(np.arange(lattice_rows), self.rows - 1), np.minimum(np.arange(lattice_cols), self.cols - 1), indexing='ij')
+        return lattice_rows, lattice_cols, (li * self.cols + lj).ravel()
+
+    def __repr__(self): return f"SensorGridGeometry({self.rows}x{self.cols})"
+
+
+def tooth_geometries(processor):
+    """{tooth_id: SensorGridGeometry}; processor.sensor_geometries (e.g. from the sensor's configuration) wins over the count-based default."""
+    overrides = getattr(processor, 'sensor_geometries', None) or {}
+    counts = np.diff(np.append(processor.tooth_column_starts, len(processor.ordered_tooth_sensor_pairs)))
+    geometries = {}
+    for tooth_id, count in zip(processor.tooth_ids or [], counts):
+        geometry = overrides.get(tooth_id) or SensorGridGeometry.from_sensor_count(count)
+        if geometry.num_sensors != count:
+            logging.warning(f"Sensor geometry {geometry} of tooth {tooth_id} does not match its {count} sensors; using the default grid.")
+            geometry = SensorGridGeometry.from_sensor_count(count)
+        geometries[tooth_id] = geometry
+    return geometries
+
+
+def sensor_world_positions(processor, tooth_cell_definitions, geometries=None):
+    """(num_pairs, 2) layout coordinates of every force_matrix column, and a (num_pairs,) mask of columns placed in the layout."""
+    num_pairs = len(processor.ordered_tooth_sensor_pairs)
+    positions = np.zeros((num_pairs, 2), dtype=float); placed = np.zeros(num_pairs, dtype=bool)
+    geometries = geometries or tooth_geometries(processor)
+    col_starts = np.append(processor.tooth_column_starts, num_pairs)
+    column_range = {tid: (int(col_starts[i]), int(col_starts[i+1])) for i, tid in enumerate(processor.tooth_ids or [])}
+    for cell_prop in tooth_cell_definitions.values():
+        tooth_id = cell_prop['actual_id']
+        if tooth_id not in column_range: continue
+        start, stop = column_range[tooth_id]
+        cell_size = np.array((cell_prop['width'], cell_prop['height']), dtype=float)
+        positions[start:stop] = np.asarray(cell_prop['center'], dtype=float)[:2] + geometries[tooth_id].normalized_positions() * cell_size
+        placed[start:stop] = True
+    return positions, placed
+# --- END OF FILE sensor_geometry.py ---
@@ -0,0 +1,61 @@
+# --- START OF FILE series_lod.py ---
+import numpy as np
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class MinMaxPyramid:
+    """Multi-resolution min/max envelope of a time series, for drawing long sessions at pixel resolution.
+
+    values is either 1D (one series) or 2D with one column per series sharing the same times.
+    Level k summarises buckets of 2**k samples as two points, (bucket start, min) and (bucket end, max),
+    so a spike anywhere in a bucket still reaches its pixel column. Level 0 is the raw data.
+    Only full buckets are stored; the partial bucket at the end of a query is reduced on the fly.
+    """
+    def __init__(self, times, values):
+        self.times = np.asarray(times, dtype=float)
+        self.values = np.asarray(values, dtype=float)
+        self.levels = [] # levels[k-1] -> (xs (2*n_buckets,), ys (2*n_buckets, ...)) for bucket size 2**k
+        mins = maxs = self.values
+        bucket = 1
+        while len(mins) >= 2:
+            n_pairs = len(mins) // 2
+            mins = np.fmin(mins[0:2*n_pairs:2], mins[1:2*n_pairs:2]) # fmin/fmax skip NaN gaps
+            maxs = np.fmax(maxs[0:2*n_pairs:2], maxs[1:2*n_pairs:2])
+            bucket *= 2
+            starts = np.arange(n_pairs) * bucket
+            xs = np.empty(2*n_pairs, dtype=float)
+            xs[0::2] = self.times[starts]; xs[1::2] = self.times[starts + bucket - 1]
+            ys = np.empty((2*n_pairs,) + self.values.shape[1:], dtype=float)
+            ys[0::2] = mins; ys[1::2] = maxs
+            self.levels.append((xs, ys))
+        logging.debug(f"MinMaxPyramid: {len(self.times)} samples, {len(self.levels)} levels.")
+
+    def level_for_view(self, x_min, x_max, width_px):
+        """Coarsest level that still gives at least two points per pixel when [x_min, x_max] spans width_px."""
+        if width_px <= 0 or len(self.times) == 0: return 0
+        n_in_view = np.searchsorted(self.times, x_max, side='right') - np.searchsorted(self.times, x_min, side='left')
+        samples_per_px = n_in_view / width_px
+        if samples_per_px < 2: return 0
+        return min(int(np.log2(samples_per_px)), len(self.levels))
+
+    def series_up_to(self, end_idx, level, columns=None):
+        """(xs, ys) covering samples [:end_idx] at the given level; O(end_idx / 2**level) points.
+
+        For 2D values, columns selects the series to return (ys is then (n, len(columns))).
+        """
+        end_idx = int(min(max(end_idx, 0), len(self.times)))
+        if level <= 0 or end_idx < 2:
+            return self.times[:end_idx], (self.values[:end_idx] if columns is None else self.values[:end_idx, columns])
+        bucket = 1 << level; n_full = end_idx // bucket
+        xs, ys = self.levels[level-1]
+        xs, ys = xs[:2*n_full], ys[:2*n_full]
+        if columns is not None: ys = ys[:, columns]
+        tail_start = n_full * bucket
+        if tail_start < end_idx: # Partial last bucket: at most 2**level samples, reduced here
+            tail = self.values[tail_start:end_idx] if columns is None else self.values[tail_start:end_idx, columns]
+            xs = np.concatenate((xs, self.times[[tail_start, end_idx-1]]))
+            ys = np.concatenate((ys, np.stack((np.fmin.reduce(tail, axis=0), np.fmax.reduce(tail, axis=0)))))
+        return xs, ys
+# --- END OF FILE series_lod.py ---
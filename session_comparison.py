@@ -0,0 +1,102 @@
+# --- START OF FILE session_comparison.py ---
+import logging
+import numpy as np
+
+from frame_state import FrameState, frame_states_from_rows
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def detect_bite_onset(processor, threshold_fraction=0.1, min_duration_s=0.05):
+    """Timestamp where the summed arch force first rises above threshold_fraction of its 99th percentile and stays there
+    for min_duration_s (the first timestamp when it never does)."""
+    if processor.force_matrix is None: processor.create_force_matrix()
+    times = processor.timestamps_array
+    if len(times) == 0: return 0.0
+    totals = np.empty(len(times), dtype=float)
+    for r0 in range(0, len(times), processor.CHUNK_ROWS):
+        totals[r0:r0+processor.CHUNK_ROWS] = np.nansum(np.asarray(processor.force_matrix[r0:r0+processor.CHUNK_ROWS], dtype=float), axis=1)
+    above = totals >= threshold_fraction * np.percentile(totals, 99)
+    dt = float(np.median(np.diff(times))) if len(times) > 1 else 1.0
+    run = max(1, int(np.ceil(min_duration_s / max(dt, 1e-9))))
+    sustained = np.flatnonzero(np.convolve(above, np.ones(run, dtype=int), mode='valid') == run) if len(above) >= run else []
+    return float(times[sustained[0]]) if len(sustained) else float(times[0])
+
+
+def _nearest_indices(sorted_times, query):
+    """Index of the nearest sorted_times sample for every query time (vectorized get_time_index)."""
+    i = np.clip(np.searchsorted(sorted_times, query), 1, max(len(sorted_times) - 1, 1))
+    return np.where(query - sorted_times[i-1] <= sorted_times[i] - query, i - 1, i) if len(sorted_times) > 1 else np.zeros(len(query), dtype=np.intp)
+
+
+class ComparisonFrame:
+    """Both sessions' FrameStates for one aligned frame, plus their difference (b - a) in the same sensor order."""
+    __slots__ = ('time_index', 'time', 'a', 'b', 'diff', 'totals')
+
+    def __init__(self, time_index, time, a, b, diff, totals):
+        self.time_index = time_index; self.time = time # Seconds from bite onset
+        self.a = a; self.b = b; self.diff = diff
+        self.totals = totals # (2,) arch totals of a and b
+
+
+class SessionPairCache:
+    """Two sessions with the same sensor layout on one timeline, aligned on bite onset. Built once, read by every view.
+
+    The timeline runs over both sessions' aligned ranges with the finer sample period; index_a/index_b map every aligned
+    frame to the nearest sample of each session (valid_a/valid_b = False outside its recording, drawn as no force).
+    Both force matrices are only referenced; the per-tooth average series of both are resampled onto the timeline once
+    for the graph.
+    """
+    def __init__(self, processor_a, processor_b, labels=('Pre', 'Post'), onset_a=None, onset_b=None):
+        self.a, self.b = processor_a, processor_b; self.labels = tuple(labels)
+        for p in (self.a, self.b):
+            if p.force_matrix is None: p.create_force_matrix()
+        if self.a.ordered_tooth_sensor_pairs != self.b.ordered_tooth_sensor_pairs:
+            raise ValueError("Sessions use different sensor layouts (teeth or sensor points); they cannot be compared frame by frame.")
+        self.onset_a = detect_bite_onset(self.a) if onset_a is None else float(onset_a)
+        self.onset_b = detect_bite_onset(self.b) if onset_b is None else float(onset_b)
+        rel_a = self.a.timestamps_array - self.onset_a; rel_b = self.b.timestamps_array - self.onset_b
+        step = min(float(np.median(np.diff(rel)) if len(rel) > 1 else 1.0) for rel in (rel_a, rel_b))
+        start, stop = min(rel_a[0], rel_b[0]), max(rel_a[-1], rel_b[-1])
+        self.times = start + step * np.arange(int(np.floor((stop - start) / step + 1e-9)) + 1) # Aligned timeline (s from onset)
+        self.timestamps = self.times.tolist()
+        self.index_a = _nearest_indices(rel_a, self.times); self.index_b = _nearest_indices(rel_b, self.times)
+        self.valid_a = (self.times >= rel_a[0] - step / 2) & (self.times <= rel_a[-1] + step / 2)
+        self.valid_b = (self.times >= rel_b[0] - step / 2) & (self.times <= rel_b[-1] + step / 2)
+        self.max_force_overall = max(self.a.max_force_overall, self.b.max_force_overall)
+        self.a.max_force_overall = self.b.max_force_overall = self.max_force_overall # Same colour and bar scale in both sessions' views
+        self.tooth_ids = list(self.a.tooth_ids or [])
+        # (T, 2 x teeth): a's teeth then b's, on the aligned timeline; samples outside a recording read as 0
+        averages = [np.where(valid[:, None], p.get_tooth_average_matrix()[index], 0.0)
+                    for p, index, valid in ((self.a, self.index_a, self.valid_a), (self.b, self.index_b, self.valid_b))]
+        self.tooth_average_matrix = np.hstack(averages)
+        self._empty_row = np.full(len(self.a.ordered_tooth_sensor_pairs), np.nan)
+        logging.info(f"Session pair: onsets {self.onset_a:.2f}s / {self.onset_b:.2f}s, {len(self.times)} aligned frames at {step*1000:.0f} ms.")
+
+    def frame(self, time_index):
+        """ComparisonFrame for aligned frame time_index: both rows go through one vectorized (2, sensors) pass."""
+        ia, ib = int(self.index_a[time_index]), int(self.index_b[time_index])
+        rows = np.vstack((self.a.force_matrix[ia] if self.valid_a[time_index] else self._empty_row,
+                          self.b.force_matrix[ib] if self.valid_b[time_index] else self._empty_row)).astype(float)
+        ts = (float(self.a.timestamps_array[ia]), float(self.b.timestamps_array[ib]))
+        cof_counts = (self.a.get_cof_count_up_to_timestamp(ts[0]) if self.valid_a[time_index] else 0,
+                      self.b.get_cof_count_up_to_timestamp(ts[1]) if self.valid_b[time_index] else 0)
+        state_a, state_b = frame_states_from_rows(self.a, rows, ts, (ia, ib), cof_counts)
+        time = float(self.times[time_index])
+        diff = FrameState(time_index, time, state_b.forces - state_a.forces, state_b.tooth_totals - state_a.tooth_totals,
+                          state_b.percentages - state_a.percentages, state_b.tooth_averages - state_a.tooth_averages, 0)
+        return ComparisonFrame(time_index, time, state_a, state_b, diff, np.array((state_a.forces.sum(), state_b.forces.sum())))
+
+
+class ComparisonGraphSource:
+    """Processor-shaped view of a SessionPairCache for GraphVisualizerQt: every tooth twice ('<id> <label>'), on the aligned timeline."""
+    def __init__(self, cache):
+        self.cache = cache
+        self.timestamps = cache.timestamps; self.timestamps_array = cache.times
+        self.tooth_ids = [f"{tid} {label}" for label in cache.labels for tid in cache.tooth_ids] # Column order of tooth_average_matrix
+        self.force_matrix = cache.tooth_average_matrix; self.max_force_overall = cache.max_force_overall
+
+    def series_ids(self, tooth_id): return [f"{tooth_id} {label}" for label in self.cache.labels]
+
+    def get_tooth_average_matrix(self): return self.cache.tooth_average_matrix
+# --- END OF FILE session_comparison.py ---
@@ -0,0 +1,120 @@
+# --- START OF FILE tooth_numbering.py ---
+import logging
+from collections import namedtuple
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+UNIVERSAL = 'universal' # 1-16 maxillary from the patient's right third molar, 17-32 mandibular from the left third molar
+FDI = 'fdi'             # Quadrant digit (1 upper right, 2 upper left, 3 lower left, 4 lower right) + position 1-8 from the midline
+NUMBERINGS = (UNIVERSAL, FDI)
+
+# arch: 'upper' (maxillary) / 'lower' (mandibular); side: patient's 'R' / 'L'; index: 1 (central incisor) .. 8 (third molar)
+ToothPosition = namedtuple('ToothPosition', 'arch side index')
+ANTERIOR_MAX_INDEX = 3 # Incisors and canines
+_FDI_QUADRANTS = {1: ('upper', 'R'), 2: ('upper', 'L'), 3: ('lower', 'L'), 4: ('lower', 'R')}
+_QUADRANT_OF = {v: k for k, v in _FDI_QUADRANTS.items()}
+BALANCE_COLUMNS = ('upper_L', 'upper_R', 'lower_L', 'lower_R', 'anterior', 'posterior')
+
+
+def detect_numbering(tooth_ids):
+    """FDI when every id is a valid FDI code (11-18, 21-28, 31-38, 41-48), Universal when every id is 1-32, else None."""
+    ids = [int(t) for t in tooth_ids]
+    if not ids: return None
+    if all(t // 10 in _FDI_QUADRANTS and 1 <= t % 10 <= 8 for t in ids): return FDI
+    if all(1 <= t <= 32 for t in ids): return UNIVERSAL
+    return None
+
+
+def tooth_position(tooth_id, numbering):
+    """ToothPosition of tooth_id in the given numbering; ValueError for ids outside it."""
+    t = int(tooth_id)
+    if numbering == FDI:
+        if t // 10 not in _FDI_QUADRANTS or not 1 <= t % 10 <= 8: raise ValueError(f"{t} is not an FDI tooth number")
+        return ToothPosition(*_FDI_QUADRANTS[t // 10], t % 10)
+    if numbering == UNIVERSAL:
+        if not 1 <= t <= 32: raise ValueError(f"{t} is not a Universal tooth number")
+        if t <= 8: return ToothPosition('upper', 'R', 9 - t)
+        if t <= 16: return ToothPosition('upper', 'L', t - 8)
+        if t <= 24: return ToothPosition('lower', 'L', 25 - t)
+        return ToothPosition('lower', 'R', t - 24)
+    raise ValueError(f"Unknown tooth numbering: {numbering}")
+
+
+def position_to_number(position, numbering):
+    arch, side, index = position
+    if numbering == FDI: return _QUADRANT_OF[(arch, side)] * 10 + index
+    if numbering == UNIVERSAL: return {('upper', 'R'): 9 - index, ('upper', 'L'): 8 + index, ('lower', 'L'): 25 - index, ('lower', 'R'): 24 + index}[(arch, side)]
+    raise ValueError(f"Unknown tooth numbering: {numbering}")
+
+
+def universal_to_fdi(tooth_id): return position_to_number(tooth_position(tooth_id, UNIVERSAL), FDI)
+def fdi_to_universal(tooth_id): return position_to_number(tooth_position(tooth_id, FDI), UNIVERSAL)
+
+
+def tooth_label(tooth_id, numbering, display_numbering=None):
+    """Label of a data tooth id in display_numbering (the data's own numbering when None or unknown)."""
+    if numbering is None or display_numbering in (None, numbering): return str(tooth_id)
+    return str(position_to_number(tooth_position(tooth_id, numbering), display_numbering))
+
+
+def tooth_positions(tooth_ids, numbering):
+    """[ToothPosition] for tooth_ids, or None when the numbering is unknown."""
+    if numbering is None: return None
+    return [tooth_position(t, numbering) for t in tooth_ids]
+
+
+def spans_both_arches(positions):
+    return positions is not None and {p.arch for p in positions} == {'upper', 'lower'}
+
+
+def processor_arch_config(processor):
+    """(numbering, positions aligned with processor.tooth_ids or None, dual-arch layout?) from the processor's settings.
+
+    processor.tooth_numbering (None = detect from the ids) and processor.arch_layout ('auto' = dual when both arches have teeth,
+    'dual', 'single') are read when present.
+    """
+    tooth_ids = processor.tooth_ids or []
+    numbering = getattr(processor, 'tooth_numbering', None) or detect_numbering(tooth_ids)
+    try: positions = tooth_positions(tooth_ids, numbering)
+    except ValueError as e: logging.warning(f"Tooth numbering '{numbering}' does not fit the data ({e}); arch positions unknown."); numbering = positions = None
+    arch_layout = getattr(processor, 'arch_layout', 'auto')
+    dual = positions is not None and (arch_layout == 'dual' or (arch_layout == 'auto' and spans_both_arches(positions)))
+    return numbering, positions, dual
+
+
+def dual_arch_centers(positions, arch_width, arch_depth, arch_gap):
+    """(n, 2) cell centres on two facing parabolas: maxillary above with incisors at the top, mandibular mirrored below.
+
+    The patient's left is +x (as in the single-arch layout). Each tooth keeps its fixed slot, so missing teeth leave gaps.
+    """
+    half_w = arch_width / 2.0; k = arch_depth / half_w**2
+    x = np.array([(1.0 if p.side == 'L' else -1.0) * (p.index - 0.5) / 8.0 * half_w for p in positions])
+    arch_sign = np.array([1.0 if p.arch == 'upper' else -1.0 for p in positions])
+    return np.column_stack((x, arch_sign * (arch_gap / 2.0 + arch_depth - k * x**2)))
+
+
+def balance_weights(positions):
+    """(n_teeth, len(BALANCE_COLUMNS)) 0/1 matrix: tooth_totals @ W gives the force of each arch half and of the anterior/posterior region."""
+    W = np.zeros((len(positions), len(BALANCE_COLUMNS)))
+    for i, p in enumerate(positions):
+        W[i, BALANCE_COLUMNS.index(f"{p.arch}_{p.side}")] = 1.0
+        W[i, 4 if p.index <= ANTERIOR_MAX_INDEX else 5] = 1.0
+    return W
+
+
+def balance_percentages(tooth_totals, weights):
+    """Arch-wise L/R shares (% of that arch) and anterior/posterior shares (% of all teeth) from one matmul."""
+    s = np.asarray(tooth_totals, dtype=float) @ weights
+    upper, lower, total = s[0] + s[1], s[2] + s[3], s[4] + s[5]
+    pct = lambda part, whole: 100.0 * part / whole if whole > 1e-6 else 0.0
+    return {'upper': (pct(s[0], upper), pct(s[1], upper)), 'lower': (pct(s[2], lower), pct(s[3], lower)),
+            'anterior': pct(s[4], total), 'posterior': pct(s[5], total)}
+
+
+def format_balance(balance, arches_present=('upper', 'lower')):
+    """One-line readout, e.g. 'Upper L 48% R 52% | Lower L 45% R 55% | Ant 31% Post 69%'."""
+    parts = [f"{arch.capitalize()} L {balance[arch][0]:.0f}% R {balance[arch][1]:.0f}%" for arch in arches_present]
+    parts.append(f"Ant {balance['anterior']:.0f}% Post {balance['posterior']:.0f}%")
+    return " | ".join(parts)
+# --- END OF FILE tooth_numbering.py ---
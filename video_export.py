@@ -0,0 +1,352 @@
+# --- START OF FILE video_export.py ---
+import sys
+import os
+import time
+import argparse
+import logging
+import queue
+import threading
+import shutil
+import subprocess
+import tempfile
+import multiprocessing
+import numpy as np
+import cv2
+from perf_instrumentation import PERF
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Composite video layout shared by the Qt recorder and the offscreen exporter: vedo multiview on top, graph below
+VIDEO_CANVAS_WIDTH = 1920; VIDEO_CANVAS_HEIGHT = 1080
+VIDEO_VEDO_AREA_FRACTION = 0.65
+VIDEO_BACKGROUND_GRAY = 210
+
+
+def compose_video_frame(frame_vedo, frame_graph, canvas=None, canvas_width=VIDEO_CANVAS_WIDTH, canvas_height=VIDEO_CANVAS_HEIGHT):
+    """Composites the vedo multiview (top) and graph (bottom) frames into canvas (allocated when None) and returns it.
+
+    frame_vedo is an RGB vedo screenshot and frame_graph is BGR (GraphVisualizerQt.capture_buffer); the canvas is BGR, as
+    cv2.VideoWriter and the frame feed expect.
+    """
+    if canvas is None: canvas = np.empty((canvas_height, canvas_width, 3), dtype=np.uint8)
+    h_vedo_area = int(canvas_height * VIDEO_VEDO_AREA_FRACTION)
+    vedo_area, graph_area = canvas[0:h_vedo_area], canvas[h_vedo_area:canvas_height] # Row slices: contiguous, usable as cv2 dst
+    with PERF.span('video.resize'):
+        if frame_vedo is not None:
+            cv2.resize(frame_vedo, (canvas_width, h_vedo_area), dst=vedo_area)
+            cv2.cvtColor(vedo_area, cv2.COLOR_RGB2BGR, dst=vedo_area) # Once, on the resized area, in place
+        else: vedo_area[:] = VIDEO_BACKGROUND_GRAY
+        if frame_graph is not None: cv2.resize(frame_graph, (canvas_width, canvas_height - h_vedo_area), dst=graph_area)
+        else: graph_area[:] = VIDEO_BACKGROUND_GRAY
+    return canvas
+
+
+class _CapturedFrame:
+    """Pool slot: the captured inputs of one video frame. The graph buffer is reused across frames."""
+    def __init__(self):
+        self.frame_vedo = None; self.frame_graph = None; self.metrics = None
+
+    def store(self, frame_vedo, frame_graph):
+        self.frame_vedo = frame_vedo # vedo screenshots are fresh arrays, kept by reference
+        if frame_graph is None: self.frame_graph = None; return
+        if self.frame_graph is None or self.frame_graph.shape != frame_graph.shape: self.frame_graph = np.empty_like(frame_graph)
+        np.copyto(self.frame_graph, frame_graph) # The graph capture buffer is overwritten by the next capture
+
+
+class AsyncFrameWriter:
+    """Composites and encodes video frames on a worker thread so the caller only pays for the capture.
+
+    Captured frames go through a bounded pool of preallocated slots. When every slot is in use, submit()
+    either drops the frame (drop_when_full=True, never stalls the caller) or waits for the writer.
+    With a frame_feed (frame_feed.FrameFeedPublisher) each frame is composed straight into the feed's shared memory
+    (the same BGR canvas the video gets) and published with its metrics; video_writer may then be None (feed only) or be attached later.
+    """
+    def __init__(self, video_writer, canvas_width=VIDEO_CANVAS_WIDTH, canvas_height=VIDEO_CANVAS_HEIGHT, max_queue=8, drop_when_full=True,
+                 frame_feed=None):
+        self.video_writer = video_writer; self.frame_feed = frame_feed
+        self.canvas_width = canvas_width; self.canvas_height = canvas_height
+        self.drop_when_full = drop_when_full
+        self._free_slots = queue.Queue()
+        for _ in range(max(1, int(max_queue))): self._free_slots.put(_CapturedFrame())
+        self._pending = queue.Queue()
+        self._canvas = np.empty((canvas_height, canvas_width, 3), dtype=np.uint8) # Only touched by the worker
+        self.frames_submitted = 0; self.frames_written = 0; self.frames_dropped = 0; self.max_queue_depth = 0
+        self._thread = threading.Thread(target=self._run, name="AsyncFrameWriter", daemon=True)
+        self._thread.start()
+
+    @property
+    def queue_depth(self): return self._pending.qsize()
+
+    def submit(self, frame_vedo, frame_graph, metrics=None):
+        """Queues one frame (and its frame_feed.FeedMetrics) for composition/encoding; returns False if it was dropped."""
+        try: slot = self._free_slots.get(block=not self.drop_when_full)
+        except queue.Empty:
+            self.frames_dropped += 1
+            logging.debug(f"AsyncFrameWriter: queue full, frame dropped ({self.frames_dropped} total).")
+            return False
+        slot.store(frame_vedo, frame_graph); slot.metrics = metrics
+        self._pending.put(slot); self.frames_submitted += 1
+        self.max_queue_depth = max(self.max_queue_depth, self._pending.qsize())
+        return True
+
+    def _run(self):
+        while True:
+            slot = self._pending.get()
+            if slot is None: break
+            try:
+                feed = self.frame_feed
+                canvas = feed.begin_frame() if feed is not None else self._canvas
+                compose_video_frame(slot.frame_vedo, slot.frame_graph, canvas, self.canvas_width, self.canvas_height)
+                video_writer = self.video_writer
+                if video_writer is not None:
+                    with PERF.span('video.write'): video_writer.write(canvas)
+                if feed is not None:
+                    with PERF.span('feed.publish'): feed.commit(slot.metrics)
+                self.frames_written += 1
+            except Exception as e:
+                logging.error(f"AsyncFrameWriter: failed to write frame: {e}")
+            finally:
+                slot.frame_vedo = None; self._free_slots.put(slot)
+
+    def stats(self):
+        return {'submitted': self.frames_submitted, 'written': self.frames_written, 'dropped': self.frames_dropped,
+                'queue_depth': self.queue_depth, 'max_queue_depth': self.max_queue_depth}
+
+    def close(self, timeout=None):
+        """Writes every queued frame, stops the worker and returns the final counters (the cv2 writer is not released)."""
+        if self._thread.is_alive():
+            self._pending.put(None); self._thread.join(timeout)
+        stats = self.stats()
+        logging.info(f"AsyncFrameWriter closed: {stats}")
+        return stats
+
+
+class OffscreenVideoExporter:
+    """Renders the grid view, 3D bar view and force graph without a window and writes the composite video.
+
+    The vedo plotter is created with offscreen=True and the graph draws on a plain Agg canvas, so no Qt
+    event loop or display is needed (a VTK build with EGL/OSMesa offscreen support is required on
+    display-less machines). Frames are produced back to back, as fast as rendering and encoding allow.
+    """
+    def __init__(self, processor, graph_tooth_ids=None, canvas_width=VIDEO_CANVAS_WIDTH, canvas_height=VIDEO_CANVAS_HEIGHT, dpi=100):
+        # Imported here so the compositor above stays usable without vedo/matplotlib being loaded
+        from vedo import Plotter
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from graph_visualization_qt import GraphVisualizerQt
+        from dental_arch_grid_visualization_qt import DentalArchGridVisualizerQt
+        from dental_arch_3d_bar_visualization_qt import DentalArch3DBarVisualizerQt
+
+        self.processor = processor
+        if self.processor.force_matrix is None: self.processor.create_force_matrix()
+        self.canvas_width = canvas_width; self.canvas_height = canvas_height
+        h_vedo_area = int(canvas_height * VIDEO_VEDO_AREA_FRACTION)
+
+        # Vedo views rendered directly at their composite size, so the top area needs no rescale
+        self.plotter = Plotter(shape=(1,2), sharecam=False, offscreen=True, size=(canvas_width, h_vedo_area), title="Dental Visualizations")
+        self.grid_visualizer = DentalArchGridVisualizerQt(self.processor, self.plotter, 0)
+        self.bar_visualizer = DentalArch3DBarVisualizerQt(self.processor, self.plotter, 1)
+        self.grid_visualizer.setup_scene(); self.bar_visualizer.setup_scene()
+
+        fig = Figure(figsize=(canvas_width / dpi, (canvas_height - h_vedo_area) / dpi), dpi=dpi)
+        FigureCanvasAgg(fig); ax = fig.add_subplot(111)
+        self.graph_visualizer = GraphVisualizerQt(self.processor)
+        self.graph_visualizer.set_figure_axes(fig, ax)
+        self.graph_visualizer.enable_blit(True) # Agg supports restore_region/draw_artist, so only the lines are redrawn per frame
+        self.graph_visualizer.create_graph_figure()
+        tooth_ids = self.processor.tooth_ids or []
+        self.graph_tooth_ids = list(graph_tooth_ids) if graph_tooth_ids is not None else list(tooth_ids[:2])
+        self.graph_visualizer.plot_tooth_lines(self.graph_tooth_ids)
+
+        self._canvas = np.empty((canvas_height, canvas_width, 3), dtype=np.uint8) # Reused for every frame
+
+    def frame_timestamps(self, start_time=None, end_time=None, stride=1):
+        """Timestamps to export: every stride-th processor timestamp within [start_time, end_time]."""
+        ts = self.processor.timestamps_array
+        if len(ts) == 0: return ts
+        i0 = 0 if start_time is None else int(np.searchsorted(ts, start_time, side='left'))
+        i1 = len(ts) if end_time is None else int(np.searchsorted(ts, end_time, side='right'))
+        return ts[i0:i1:max(1, int(stride))]
+
+    def render_frame(self, timestamp):
+        """Updates all three views to timestamp and returns the composited BGR canvas (reused between calls)."""
+        self.plotter.at(0); self.grid_visualizer.animate(timestamp)
+        self.plotter.at(1); self.bar_visualizer.animate(timestamp)
+        self.plotter.render()
+        frame_vedo = self.plotter.screenshot(asarray=True)
+        frame_graph = self.graph_visualizer.get_frame_as_array(timestamp, self.graph_tooth_ids)
+        return compose_video_frame(frame_vedo, frame_graph, self._canvas, self.canvas_width, self.canvas_height)
+
+    def export(self, output_filename, start_time=None, end_time=None, stride=1, fps=10, progress_every=100):
+        """Writes the frames for the selected time range; returns a summary dict (frames, seconds, fps)."""
+        timestamps = self.frame_timestamps(start_time, end_time, stride)
+        if len(timestamps) == 0:
+            logging.error("Offscreen export: no timestamps in the requested range."); return {'frames': 0, 'seconds': 0.0, 'fps': 0.0}
+        logging.info(f"Offscreen export: {len(timestamps)} frames ({timestamps[0]:.2f}s to {timestamps[-1]:.2f}s, stride {stride}) -> {output_filename}")
+        return self.write_frames(output_filename, timestamps, fps, progress_every)
+
+    def write_frames(self, output_filename, timestamps, fps=10, progress_every=100):
+        """Renders and encodes exactly the given timestamps, in order."""
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        video_writer = cv2.VideoWriter(output_filename, fourcc, float(fps), (self.canvas_width, self.canvas_height))
+        if not video_writer.isOpened():
+            logging.error(f"Could not open video writer for {output_filename}"); return {'frames': 0, 'seconds': 0.0, 'fps': 0.0}
+        t_start = time.perf_counter(); frames_written = 0
+        try:
+            for timestamp in timestamps:
+                video_writer.write(self.render_frame(timestamp)); frames_written += 1
+                if progress_every and frames_written % progress_every == 0:
+                    elapsed = time.perf_counter() - t_start
+                    logging.info(f"Offscreen export: {frames_written}/{len(timestamps)} frames, {frames_written / elapsed:.1f} frames/s")
+        finally:
+            video_writer.release()
+        elapsed = time.perf_counter() - t_start
+        summary = {'frames': frames_written, 'seconds': elapsed, 'fps': frames_written / elapsed if elapsed > 0 else 0.0}
+        logging.info(f"Offscreen export done: {frames_written} frames in {elapsed:.2f}s ({summary['fps']:.1f} frames/s).")
+        return summary
+
+    def close(self):
+        if self.plotter: self.plotter.close(); self.plotter = None
+
+
+# Processor attributes that shape the views (layout, numbering, sensor grids); copied into every export worker
+PROCESSOR_VIEW_SETTINGS = ('sensor_geometries', 'tooth_numbering', 'display_numbering', 'arch_layout')
+
+
+def _render_shard(shard):
+    """Worker entry point (spawned process): renders one contiguous run of timestamps into its own video file."""
+    import matplotlib; matplotlib.use('Agg')
+    from data_processing import DataProcessor
+    force_matrix = np.load(shard['force_matrix_path'], mmap_mode='r') # Read-only view shared through the page cache
+    processor = DataProcessor.from_force_matrix(force_matrix, shard['timestamps'], shard['ordered_tooth_sensor_pairs'], shard['max_force_overall'])
+    for name, value in shard['view_settings'].items(): setattr(processor, name, value)
+    exporter = OffscreenVideoExporter(processor, graph_tooth_ids=shard['graph_tooth_ids'])
+    try:
+        summary = exporter.write_frames(shard['output'], shard['frame_timestamps'], shard['fps'], progress_every=0)
+    finally:
+        exporter.close()
+    summary['output'] = shard['output']; summary['index'] = shard['index']
+    return summary
+
+
+def concat_video_shards(shard_files, output_filename, fps=10):
+    """Joins shard videos in order: ffmpeg stream copy when available, otherwise decodes and re-encodes with cv2."""
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg:
+        list_path = output_filename + ".shards.txt"
+        with open(list_path, 'w') as f:
+            for shard_file in shard_files: f.write(f"file '{os.path.abspath(shard_file)}'\n")
+        try:
+            subprocess.run([ffmpeg, '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', list_path, '-c', 'copy', output_filename], check=True)
+            return True
+        except (subprocess.CalledProcessError, OSError) as e:
+            logging.warning(f"ffmpeg concat failed ({e}), re-encoding shards with OpenCV instead.")
+        finally:
+            if os.path.exists(list_path): os.remove(list_path)
+    else:
+        logging.warning("ffmpeg not found; shards are re-encoded with OpenCV (not lossless).")
+    video_writer = None
+    try:
+        for shard_file in shard_files:
+            capture = cv2.VideoCapture(shard_file)
+            ok, frame = capture.read()
+            while ok:
+                if video_writer is None:
+                    video_writer = cv2.VideoWriter(output_filename, cv2.VideoWriter_fourcc(*'mp4v'), float(fps), (frame.shape[1], frame.shape[0]))
+                video_writer.write(frame); ok, frame = capture.read()
+            capture.release()
+    finally:
+        if video_writer is not None: video_writer.release()
+    return video_writer is not None
+
+
+def export_sharded(processor, output_filename, start_time=None, end_time=None, stride=1, fps=10, workers=None, graph_tooth_ids=None):
+    """Splits the selected timeline into one contiguous shard per worker process, renders them in parallel and concatenates in order.
+
+    The force matrix is written once to a .npy file and memory-mapped read-only by every worker; each
+    worker builds its own offscreen plotter and Agg figure.
+    """
+    if processor.force_matrix is None: processor.create_force_matrix()
+    ts = processor.timestamps_array
+    i0 = 0 if start_time is None else int(np.searchsorted(ts, start_time, side='left'))
+    i1 = len(ts) if end_time is None else int(np.searchsorted(ts, end_time, side='right'))
+    frame_timestamps = ts[i0:i1:max(1, int(stride))]
+    if len(frame_timestamps) == 0:
+        logging.error("Sharded export: no timestamps in the requested range."); return {'frames': 0, 'seconds': 0.0, 'fps': 0.0}
+    workers = max(1, min(int(workers or os.cpu_count() or 1), len(frame_timestamps)))
+    tooth_ids = processor.tooth_ids or []
+    graph_tooth_ids = list(graph_tooth_ids) if graph_tooth_ids is not None else list(tooth_ids[:2])
+
+    t_start = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="dental_export_") as tmp_dir:
+        force_matrix_path = os.path.join(tmp_dir, "force_matrix.npy")
+        np.save(force_matrix_path, np.ascontiguousarray(processor.force_matrix)) # Keeps the processor's dtype (float32)
+        shards = [{'index': i, 'output': os.path.join(tmp_dir, f"shard_{i:03d}.mp4"), 'frame_timestamps': chunk,
+                   'force_matrix_path': force_matrix_path, 'timestamps': ts, 'ordered_tooth_sensor_pairs': processor.ordered_tooth_sensor_pairs,
+                   'max_force_overall': processor.max_force_overall, 'graph_tooth_ids': graph_tooth_ids, 'fps': fps,
+                   'view_settings': {name: getattr(processor, name) for name in PROCESSOR_VIEW_SETTINGS}}
+                  for i, chunk in enumerate(np.array_split(frame_timestamps, workers))]
+        logging.info(f"Sharded export: {len(frame_timestamps)} frames in {workers} shards -> {output_filename}")
+        # spawn: every worker gets a fresh VTK/OpenGL context instead of a forked copy of the parent's
+        with multiprocessing.get_context('spawn').Pool(processes=workers) as pool:
+            results = sorted(pool.map(_render_shard, shards), key=lambda r: r['index'])
+        frames_written = sum(r['frames'] for r in results)
+        if not concat_video_shards([r['output'] for r in results if r['frames'] > 0], output_filename, fps): frames_written = 0
+    elapsed = time.perf_counter() - t_start
+    summary = {'frames': frames_written, 'seconds': elapsed, 'fps': frames_written / elapsed if elapsed > 0 else 0.0, 'workers': workers}
+    logging.info(f"Sharded export done: {frames_written} frames in {elapsed:.2f}s with {workers} workers ({summary['fps']:.1f} frames/s).")
+    return summary
+
+
+def load_processor(csv_path=None, simulate_duration=10.0, num_teeth=16, num_sensor_points_per_tooth=4):
+    """DataProcessor for a recorded CSV session, or for simulated data when no CSV is given."""
+    import pandas as pd
+    from data_processing import DataProcessor
+    if csv_path:
+        data = pd.read_csv(csv_path)
+    else:
+        from data_acquisition import SensorDataReader
+        data = SensorDataReader().simulate_data(duration=simulate_duration, num_teeth=num_teeth, num_sensor_points_per_tooth=num_sensor_points_per_tooth)
+    processor = DataProcessor(data); processor.create_force_matrix()
+    return processor
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Export the composite dental force video offscreen (no window needed).")
+    parser.add_argument('-o', '--output', default="composite_dental_animation.mp4", help="Output video file.")
+    parser.add_argument('--csv', default=None, help="Recorded session CSV (timestamp, tooth_id, sensor_point_id, force, contact_time). Simulated data when omitted.")
+    parser.add_argument('--simulate-duration', type=float, default=10.0, help="Seconds of simulated data when no CSV is given.")
+    parser.add_argument('--sensors', type=int, default=4, help="Sensor points per tooth of the simulated data.")
+    parser.add_argument('--num-teeth', type=int, default=16, help="Teeth in the simulated data (32 = both arches, Universal numbering).")
+    parser.add_argument('--numbering', choices=('universal', 'fdi'), default=None, help="Tooth numbering of the labels (default: as recorded).")
+    parser.add_argument('--start', type=float, default=None, help="First timestamp to export (s).")
+    parser.add_argument('--end', type=float, default=None, help="Last timestamp to export (s).")
+    parser.add_argument('--stride', type=int, default=1, help="Export every Nth timestamp.")
+    parser.add_argument('--fps', type=float, default=10.0, help="Frame rate written into the video.")
+    parser.add_argument('--workers', type=int, default=1, help="Render in N parallel processes (0 = one per CPU core).")
+    parser.add_argument('--teeth', type=int, nargs='*', default=None, help="Tooth ids to plot on the graph (default: first two).")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    import matplotlib; matplotlib.use('Agg') # No Qt/display for the graph
+    processor = load_processor(args.csv, args.simulate_duration, num_teeth=args.num_teeth, num_sensor_points_per_tooth=args.sensors)
+    processor.display_numbering = args.numbering
+    if not processor.timestamps: logging.error("No timestamps. Exiting."); return 1
+    if args.workers != 1:
+        summary = export_sharded(processor, args.output, args.start, args.end, args.stride, args.fps,
+                                 workers=args.workers or None, graph_tooth_ids=args.teeth)
+    else:
+        exporter = OffscreenVideoExporter(processor, graph_tooth_ids=args.teeth)
+        try:
+            summary = exporter.export(args.output, args.start, args.end, args.stride, args.fps)
+        finally:
+            exporter.close()
+    print(f"Exported {summary['frames']} frames to {os.path.abspath(args.output)} in {summary['seconds']:.2f}s ({summary['fps']:.1f} frames/s)")
+    return 0 if summary['frames'] > 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+# --- END OF FILE video_export.py ---